@@ -0,0 +1,229 @@
+'''
+RamanCal batch
+headless command line front end of RamanCal_core, no QApplication is created
+
+examples
+    python RamanCal_batch.py "data/*.txt" Wavelength_Ref_Ne.txt --section "for 1800g633nm" --pixels 101 180 240 338 377
+    python RamanCal_batch.py data/ Wavenumbers_CHX.txt --mode shift --laser 632.82 --pixels ... --lamp data/chx.txt
+    python RamanCal_batch.py data/ Wavelength_Ref_Ne.txt --pixels ... --workers 64 --chunksize 16
+    python RamanCal_batch.py data/ Wavelength_Ref_Ne.txt       # no --pixels: peaks are detected and matched
+    python RamanCal_batch.py data/ Wavelength_Ref_Ne.txt --lamp lamp.txt --cache ~/.ramancal --config 1200g633nm
+    python RamanCal_batch.py data/ Wavelength_Ref_Ne.txt --profile profile.json --cprofile run.prof
+'''
+#----------------
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import RamanCal_core as core
+import RamanCal_cache
+import RamanCal_refs
+import RamanCal_profile as profile
+#----------------
+def find_spectra(sources,pattern='*.txt'):
+    '''expand directories and glob patterns into a sorted list of spectrum files'''
+    paths=[]
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(glob.glob(os.path.join(source,pattern)))
+        else:
+            paths.extend(glob.glob(source))
+    # outputs of previous runs are not spectra
+    paths=[path for path in paths if not path.endswith('.cal')]
+    return sorted(set(paths))
+
+def calibrate_one(task):
+    '''
+    worker of run(), task is the argument tuple of core.calibrate_file
+    returns (path,calibration or None,written paths or error message), never raises for bad spectra
+    '''
+    spectrum_file_path=task[0]
+    try:
+        with profile.stage('file'):
+            cal,written=core.calibrate_file(*task)
+    except (IOError,ValueError,IndexError) as err:
+        return (spectrum_file_path,None,str(err))
+    return (spectrum_file_path,cal,written)
+
+def calibrate_profiled(task):
+    '''calibrate_one in a worker process with profiling on, returns the result and the stats of this task'''
+    profile.reset()
+    result=calibrate_one(task)
+    return result,profile.snapshot()
+
+def iter_results(tasks,workers=1,chunksize=None):
+    '''
+    calibrate tasks in a process pool, results come back in task order
+    workers=1 runs in this process, workers=None uses all cores
+    tasks are handed out chunksize at a time to keep the pickling overhead low
+    '''
+    if workers==1:
+        for task in tasks:
+            yield calibrate_one(task)
+        return
+    tasks=list(tasks)
+    if workers is None:
+        workers=os.cpu_count() or 1
+    if chunksize is None: # about 4 chunks per worker balances load against overhead
+        chunksize=max(1,len(tasks)//(4*workers))
+    if profile.enabled: # workers profile too and send their stats back with each result
+        with ProcessPoolExecutor(max_workers=workers,initializer=profile.enable,initargs=(profile.memory,)) as executor:
+            for result,stats in executor.map(calibrate_profiled,tasks,chunksize=chunksize):
+                profile.merge(stats)
+                yield result
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(calibrate_one,tasks,chunksize=chunksize):
+            yield result
+
+def rejected_note(calibration):
+    '''log suffix counting the pairs a robust fit left out'''
+    if calibration.rejected is None or not calibration.rejected.any():
+        return ''
+    return "\t{0} of {1} pairs rejected".format(calibration.rejected.sum(),calibration.rejected.size)
+
+def run(spectrum_paths,ref_file_name,pixel_guesses,section=None,mode='wavelength',laser_wavelength=None,
+        window=10,units=('nm','wavenumber','eV'),lamp_file_path=None,workers=1,chunksize=None,
+        cache_dir=None,config=None,model_options=None,uncertainty=None,preprocess=None,max_age=None,refit=False,
+        log=print):
+    '''
+    calibrate every spectrum, returns list of (path,calibration or None,written paths or error message)
+    in the order of spectrum_paths
+    with lamp_file_path the calibration is done once on the lamp and applied to all spectra,
+    if the lamp fails that is the only result;
+    with cache_dir and config (e.g. '1200g633nm') as well, a cached lamp calibration is reused if it was fitted
+    from the same lamp file, unchanged, and the same reference lines, and is at most max_age seconds old;
+    refit=True fits the lamp again and replaces the cached entry
+    model_options selects the dispersion model, see core.calibrate
+    uncertainty ('linear' or 'montecarlo') adds 1 sigma columns to the outputs, see core.save_cal
+    preprocess (RamanCal_preprocess.Pipeline) cleans every spectrum before its peaks are fitted
+    '''
+    if pixel_guesses is None: # automatic matching only needs the sorted values
+        ref_array=RamanCal_refs.library_values(ref_file_name,section)
+    else: # file order pairs with the pixel guesses
+        ref_array=[value for name,value in core.load_ref_entries(ref_file_name,section)]
+    if pixel_guesses is not None and len(ref_array)!=len(pixel_guesses):
+        raise ValueError("%d pixel guesses for %d reference lines"%(len(pixel_guesses),len(ref_array)))
+    calibration=None
+    store=None
+    if cache_dir is not None and config is not None and lamp_file_path is not None:
+        key=RamanCal_cache.calibration_key(config,laser_wavelength,model_options)
+        store=RamanCal_cache.CalibrationStore(cache_dir)
+        source=RamanCal_cache.lamp_source(lamp_file_path,ref_file_name,section)
+        calibration=None if refit else store.get(key,max_age,source)
+        if calibration is not None:
+            log("cached calibration {0}: slope {1} intercept {2}".format(key,calibration.slope,calibration.intercept))
+    if lamp_file_path is not None and calibration is None:
+        lamp,calibration,written=calibrate_one((lamp_file_path,pixel_guesses,ref_array,mode,laser_wavelength,window,units,
+                                                None,model_options,uncertainty,preprocess))
+        if calibration is None: # nothing to apply, the spectra are not attempted
+            log("failed: lamp {0}\t{1}".format(lamp_file_path,written))
+            return [(lamp_file_path,None,written)]
+        log("lamp calibrated: slope {0} intercept {1}{2}".format(calibration.slope,calibration.intercept,rejected_note(calibration)))
+        if store is not None:
+            store.put(key,calibration,source)
+    tasks=[(spectrum_file_path,pixel_guesses,ref_array,mode,laser_wavelength,window,units,calibration,model_options,
+            uncertainty,preprocess)
+           for spectrum_file_path in spectrum_paths]
+    results=[]
+    for spectrum_file_path,cal,written in iter_results(tasks,workers,chunksize):
+        if cal is None:
+            log("failed: {0}\t{1}".format(spectrum_file_path,written))
+        else:
+            log("calibrated: {0}\t{1}{2}".format(spectrum_file_path," ".join(written),rejected_note(cal)))
+        results.append((spectrum_file_path,cal,written))
+    return results
+
+def add_model_arguments(parser):
+    '''dispersion model options, shared with RamanCal_watch'''
+    parser.add_argument('--model',choices=['linear','polynomial','grating'],default='linear',help="dispersion model")
+    parser.add_argument('--order',type=int,default=2,help="polynomial order")
+    parser.add_argument('--groove-density',type=float,default=None,help="grating grooves per mm, for --model grating")
+    parser.add_argument('--included-angle',type=float,default=0.0,help="spectrograph included angle (deg)")
+    parser.add_argument('--pixel-width',type=float,default=0.026,help="detector pixel width (mm)")
+    parser.add_argument('--robust',action='store_true',help="reject outlying pixel/reference pairs (RANSAC and sigma clipping)")
+
+def model_options_from(args):
+    '''model_options of core.calibrate from the add_model_arguments options, None for a plain linear fit'''
+    model_options=None
+    if args.model=='polynomial':
+        model_options={'model':'polynomial','order':args.order}
+    if args.model=='grating':
+        if args.groove_density is None:
+            raise ValueError("--groove-density is needed for the grating model")
+        model_options={'model':'grating','groove_density':args.groove_density,
+                       'included_angle':np.radians(args.included_angle),'pixel_width':args.pixel_width}
+    if args.robust:
+        model_options=dict(model_options or {},robust=True)
+    return model_options
+
+def make_parser():
+    parser=argparse.ArgumentParser(description="Headless spectral calibration")
+    parser.add_argument('spectra',nargs='+',help="spectrum files, directories or glob patterns")
+    parser.add_argument('ref_file',help="reference wavelength/Raman shift file, e.g. Wavelength_Ref_Ne.txt")
+    parser.add_argument('--section',default=None,help="use only the lines under this header, e.g. 'for 1200g633nm'")
+    parser.add_argument('--pixels',type=float,nargs='+',default=None,
+                        help="approximate pixel of each reference line, in file order; omit to detect and match automatically")
+    parser.add_argument('--window',type=float,default=10,help="half width of the fitting range in pixels")
+    parser.add_argument('--mode',choices=['wavelength','shift'],default='wavelength',
+                        help="reference lines are wavelengths (nm) or Raman shifts (cm-1)")
+    parser.add_argument('--laser',type=float,default=632.82,help="Raman pump wavelength (nm)")
+    add_model_arguments(parser)
+    parser.add_argument('--units',nargs='+',choices=['nm','wavenumber','eV','axes','axes_npy','npz'],default=['nm','wavenumber','eV'],
+                        help="'axes' writes nm, wavenumber and eV columns into one _axes.cal, 'axes_npy' into one _axes.npy, "
+                             "'npz' axes and calibration into one _cal.npz")
+    parser.add_argument('--uncertainty',choices=['linear','montecarlo'],default=None,
+                        help="add a 1 sigma column per axis, propagated from the fit covariance")
+    parser.add_argument('--preprocess',nargs='+',default=None,metavar='STEP',
+                        help="clean spectra before fitting, e.g. despike baseline:lam=1e6 dark:dark=dark.npy (RamanCal_preprocess)")
+    parser.add_argument('--lamp',default=None,help="calibrate once on this spectrum and apply to all")
+    parser.add_argument('--pattern',default='*.txt',help="file pattern used inside directories")
+    parser.add_argument('--workers',type=int,default=1,help="number of worker processes, 0 for all cores")
+    parser.add_argument('--cache',default=None,help="calibration store directory, used with --lamp and --config")
+    parser.add_argument('--config',default=None,help="instrument configuration key, e.g. 1200g633nm")
+    parser.add_argument('--max-age',type=float,default=None,help="seconds a cached calibration stays valid")
+    parser.add_argument('--refit',action='store_true',help="fit the lamp again and replace the cached calibration")
+    parser.add_argument('--chunksize',type=int,default=None,help="spectra handed to a worker at a time")
+    parser.add_argument('--profile',default=None,help="time load/fit/calibrate/export per stage, JSON report to this file")
+    parser.add_argument('--profile-memory',action='store_true',help="with --profile, also trace allocation peaks (slower)")
+    parser.add_argument('--cprofile',default=None,help="cProfile the run into this pstats file")
+    return parser
+
+def main(argv=None):
+    args=make_parser().parse_args(argv)
+    paths=find_spectra(args.spectra,args.pattern)
+    if args.lamp is not None:
+        paths=[path for path in paths if os.path.abspath(path)!=os.path.abspath(args.lamp)]
+    if not paths and args.lamp is None:
+        print("No spectrum found")
+        return 1
+    try:
+        model_options=model_options_from(args)
+    except ValueError as err:
+        print(err)
+        return 1
+    preprocess=None
+    if args.preprocess:
+        import RamanCal_preprocess
+        try:
+            preprocess=RamanCal_preprocess.Pipeline.from_specs(args.preprocess)
+        except (ValueError,TypeError,IOError) as err: # unknown step or option, unreadable dark frame
+            print(err)
+            return 1
+    if args.profile is not None:
+        profile.enable(args.profile_memory)
+    with profile.cprofile(args.cprofile) if args.cprofile is not None else profile.stage('run'):
+        results=run(paths,args.ref_file,args.pixels,args.section,args.mode,args.laser,
+                    args.window,args.units,args.lamp,args.workers or None,args.chunksize,
+                    args.cache,args.config,model_options,args.uncertainty,preprocess,args.max_age,args.refit)
+    if args.profile is not None:
+        print(profile.format_report())
+        print("profile:\t"+profile.save(args.profile))
+    failed=sum(1 for item in results if item[1] is None)
+    print("{0} calibrated, {1} failed".format(len(results)-failed,failed))
+    return 1 if failed else 0
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+'''
+RamanCal bench
+headless benchmark of the load, fit, calibrate and export paths
+
+Synthetic lamp spectra are generated from the bundled Wavelength_Ref_* tables
+(Gaussian lines on a flat background with noise) at several detector sizes,
+written as text files into a temporary directory, then every stage is timed per spectrum.
+Reported per stage: throughput (spectra/s), latency percentiles (ms) and peak traced memory (MB),
+the memory pass runs separately so tracemalloc does not distort the timings.
+The startup case times a fresh interpreter importing RamanCal_07 and the engine and making one
+calibration, and lists the heavy modules (Qt, lmfit, scipy.stats, ...) that got loaded on the way.
+
+    python RamanCal_bench.py                                    # Ne/Ar/Xe, 512 to 16384 pixels
+    python RamanCal_bench.py --sizes 1024 --count 50 --json now.json
+    python RamanCal_bench.py --json now.json --baseline before.json --threshold 1.25   # exit 1 on regression
+'''
+#----------------
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+import RamanCal_core as core
+#----------------
+here=os.path.dirname(os.path.abspath(__file__))
+lamp_files={'Ne':'Wavelength_Ref_Ne.txt','Ar':'Wavelength_Ref_Ar.txt','Xe':'Wavelength_Ref_Xe.txt'}
+laser_wavelength=632.82
+
+def lamp_lines(lamp):
+    '''unique reference wavelengths of a bundled lamp table'''
+    entries=core.load_ref_entries(os.path.join(here,lamp_files[lamp]))
+    return np.unique([value for name,value in entries])
+
+def synthetic_lamp(lines,npixel,seed=0,sigma=1.5,noise=5.0):
+    '''
+    lamp spectrum covering all lines on npixel pixels
+    returns xdata,ydata,true slope,true intercept
+    '''
+    rng=np.random.default_rng(seed)
+    span=lines.max()-lines.min()
+    slope=span*1.1/npixel
+    intercept=lines.min()-0.05*span+rng.uniform(-0.5,0.5)*slope
+    xdata=np.arange(npixel,dtype=float)
+    ydata=200+rng.normal(0,noise,npixel)
+    centers=(lines-intercept)/slope
+    amplitudes=rng.uniform(300,3000,lines.size)
+    for center,amplitude in zip(centers,amplitudes):
+        near=slice(max(int(center-8*sigma),0),min(int(center+8*sigma)+1,npixel))
+        ydata[near]+=amplitude*np.exp(-0.5*(xdata[near]-center)**2/sigma**2)
+    return xdata,ydata,slope,intercept
+
+def isolated(lines,slope,window):
+    '''lines whose fitting windows do not overlap their neighbours'''
+    pixels=(lines-lines.min())/slope
+    gap=np.diff(pixels)
+    left=np.concatenate([[np.inf],gap])
+    right=np.concatenate([gap,[np.inf]])
+    return (left>2*window)&(right>2*window)
+
+def percentiles(latency):
+    latency=np.asarray(latency)*1e3
+    return {'p50_ms':float(np.percentile(latency,50)),'p95_ms':float(np.percentile(latency,95)),
+            'p99_ms':float(np.percentile(latency,99)),'mean_ms':float(latency.mean())}
+
+def measure(stage,count,repeat_memory=True):
+    '''
+    stage(i) is one unit of work on spectrum i
+    returns throughput, latency percentiles and peak traced memory of one extra call
+    '''
+    latency=[]
+    start=time.perf_counter()
+    for i in range(count):
+        t0=time.perf_counter()
+        stage(i)
+        latency.append(time.perf_counter()-t0)
+    total=time.perf_counter()-start
+    result=dict(percentiles(latency),throughput=count/total if total>0 else float('inf'),count=count)
+    if repeat_memory:
+        tracemalloc.start()
+        stage(0)
+        result['peak_MB']=tracemalloc.get_traced_memory()[1]/2**20
+        tracemalloc.stop()
+    return result
+
+def bench_case(lamp,npixel,count,directory,window=8,lmfit=True,workers=()):
+    '''all stages for one lamp and detector size, returns {stage: result}'''
+    lines=lamp_lines(lamp)
+    spectra=[]
+    paths=[]
+    for i in range(count):
+        xdata,ydata,slope,intercept=synthetic_lamp(lines,npixel,seed=i)
+        path=os.path.join(directory,'{0}_{1}_{2}.txt'.format(lamp,npixel,i))
+        np.savetxt(path,np.column_stack([xdata,ydata]))
+        spectra.append((xdata,ydata,slope,intercept))
+        paths.append(path)
+    keep=isolated(lines,spectra[0][2],window)
+    used=lines[keep]
+    guesses=[np.round((used-s[3])/s[2]) for s in spectra]
+    shifts=1e7/laser_wavelength-1e7/used
+    fitted=[core.fit_peaks(s[0],s[1],g,window) for s,g in zip(spectra,guesses)]
+    calibration=core.calibrate_wavelength(fitted[0],used,laser_wavelength)
+    npy_paths=[]
+    for path,s in zip(paths,spectra):
+        npy_paths.append(path[:-4]+'.npy')
+        np.save(npy_paths[-1],np.column_stack([s[0],s[1]]))
+
+    results={}
+    results['load_text']=measure(lambda i:core.load_spectrum(paths[i]),count)
+    results['load_npy']=measure(lambda i:core.load_spectrum(npy_paths[i]),count)
+    results['fit_batch']=measure(lambda i:core.fit_peaks(spectra[i][0],spectra[i][1],guesses[i],window),count)
+    import RamanCal_preprocess
+    pipeline=RamanCal_preprocess.default_pipeline()
+    results['preprocess']=measure(lambda i:pipeline(spectra[i][1]),count)
+    if lmfit:
+        results['fit_lmfit']=measure(lambda i:core.fit_peaks(spectra[i][0],spectra[i][1],guesses[i],window,'lmfit'),
+                                     min(count,5))
+    results['calibrate_linear']=measure(lambda i:core.calibrate_wavelength(fitted[i],used,laser_wavelength),count)
+    results['calibrate_shift']=measure(lambda i:core.calibrate_shift(fitted[i],shifts,laser_wavelength),count)
+    results['calibrate_poly3']=measure(lambda i:core.calibrate_polynomial(fitted[i],used,3),count)
+
+    def export_text(i):
+        fresh=core.Calibration(calibration.slope,calibration.intercept,laser_wavelength)
+        for unit in ['nm','wavenumber','eV']:
+            core.save_cal(paths[i],spectra[i][0],fresh,unit)
+    def export_axes(i):
+        fresh=core.Calibration(calibration.slope,calibration.intercept,laser_wavelength)
+        core.save_cal(paths[i],spectra[i][0],fresh,'axes_npy')
+    results['export_text']=measure(export_text,count)
+    results['export_npy']=measure(export_axes,count)
+    results['end_to_end']=measure(lambda i:core.calibrate_file(paths[i],guesses[i],used,'wavelength',laser_wavelength,
+                                                                 window,('nm','wavenumber','eV')),count)
+    for n in workers:
+        import RamanCal_batch
+        tasks=[(path,g,used,'wavelength',laser_wavelength,window,('nm',)) for path,g in zip(paths,guesses)]
+        start=time.perf_counter()
+        list(RamanCal_batch.iter_results(tasks,n))
+        total=time.perf_counter()-start
+        results['batch_workers_{0}'.format(n)]={'throughput':count/total,'count':count}
+    return results
+
+startup_code='''
+import sys,json,time
+start=time.perf_counter()
+import RamanCal_07,RamanCal_core
+RamanCal_core.calibrate_wavelength([101.2,523.9,672.4],[626.6495,630.47889,633.44278],632.82).axes(range(1024))
+heavy=['guidata','guiqwt','lmfit','scipy.stats','scipy.signal','scipy.sparse','scipy.special']
+print(json.dumps({'seconds':time.perf_counter()-start,'loaded':[name for name in heavy if name in sys.modules]}))
+'''
+
+def bench_startup(count=5):
+    '''headless import plus one calibration in fresh interpreters, wall time including interpreter start'''
+    latency=[]
+    inside=[]
+    for i in range(count):
+        t0=time.perf_counter()
+        output=subprocess.check_output([sys.executable,'-c',startup_code],cwd=here)
+        latency.append(time.perf_counter()-t0)
+        inside.append(json.loads(output.decode().strip().splitlines()[-1]))
+    result=dict(percentiles(latency),throughput=count/sum(latency),count=count)
+    result['import_calibrate_ms']=float(np.median([item['seconds'] for item in inside]))*1e3
+    result['loaded']=inside[-1]['loaded']
+    return {'import_calibrate':result}
+
+def compare(report,baseline,threshold):
+    '''p50 latencies slower than threshold x baseline, as readable lines'''
+    regressions=[]
+    for case,stages in report['cases'].items():
+        for stage,result in stages.items():
+            old=baseline.get('cases',{}).get(case,{}).get(stage)
+            if old is None or 'p50_ms' not in result or 'p50_ms' not in old:
+                continue
+            if result['p50_ms']>threshold*old['p50_ms']:
+                regressions.append("{0} {1}: p50 {2:.3f} ms, baseline {3:.3f} ms".format(case,stage,result['p50_ms'],old['p50_ms']))
+    return regressions
+
+def print_report(report):
+    print("{0:<14}{1:<20}{2:>12}{3:>10}{4:>10}{5:>10}{6:>10}".format('case','stage','spectra/s','p50 ms','p95 ms','p99 ms','peak MB'))
+    for case,stages in report['cases'].items():
+        for stage,result in stages.items():
+            print("{0:<14}{1:<20}{2:>12.1f}{3:>10}{4:>10}{5:>10}{6:>10}".format(case,stage,result['throughput'],
+                  *["{0:.3f}".format(result[key]) if key in result else '-' for key in ['p50_ms','p95_ms','p99_ms','peak_MB']]))
+
+def make_parser():
+    parser=argparse.ArgumentParser(description="Benchmark RamanCal load/fit/calibrate/export")
+    parser.add_argument('--lamps',nargs='+',choices=sorted(lamp_files),default=['Ne','Ar','Xe'])
+    parser.add_argument('--sizes',type=int,nargs='+',default=[512,2048,16384],help="detector sizes in pixels")
+    parser.add_argument('--count',type=int,default=20,help="spectra per case")
+    parser.add_argument('--workers',type=int,nargs='*',default=[],help="also time the process pool with these worker counts")
+    parser.add_argument('--no-lmfit',action='store_true',help="skip the per-peak lmfit stage")
+    parser.add_argument('--no-startup',action='store_true',help="skip the import/startup case")
+    parser.add_argument('--json',default=None,help="write the report to this file")
+    parser.add_argument('--baseline',default=None,help="earlier --json report to compare against")
+    parser.add_argument('--threshold',type=float,default=1.25,help="slowdown factor counted as regression")
+    return parser
+
+def main(argv=None):
+    args=make_parser().parse_args(argv)
+    directory=tempfile.mkdtemp(prefix='ramancal_bench_')
+    report={'numpy':np.__version__,'python':sys.version.split()[0],'cases':{}}
+    try:
+        if not args.no_startup:
+            report['cases']['startup']=bench_startup()
+        for lamp in args.lamps:
+            for npixel in args.sizes:
+                case='{0}_{1}'.format(lamp,npixel)
+                report['cases'][case]=bench_case(lamp,npixel,args.count,directory,lmfit=not args.no_lmfit,
+                                                 workers=args.workers)
+    finally:
+        shutil.rmtree(directory,ignore_errors=True)
+    print_report(report)
+    if 'startup' in report['cases']:
+        startup=report['cases']['startup']['import_calibrate']
+        print("startup: import and one calibration {0:.1f} ms in the interpreter, modules loaded: {1}".format(
+              startup['import_calibrate_ms'],", ".join(startup['loaded']) or 'none of the heavy ones'))
+    if args.json is not None:
+        with open(args.json,'w') as f:
+            json.dump(report,f,indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions=compare(report,json.load(f),args.threshold)
+        for line in regressions:
+            print("regression: "+line)
+        return 1 if regressions else 0
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+'''
+RamanCal cache
+persistent store of calibrations keyed by instrument configuration
+
+Keys follow the section headers of the reference files, grating and center wavelength
+like "1200g633nm", plus the Raman pump wavelength: "1200g633nm_632.82nm", plus the model options
+of the fit: "1200g633nm_632.82nm_model-polynomial_order-3" (calibration_key).
+Every entry is one JSON file <key>.json holding Calibration.to_dict(), the creation time and the source
+of the fit (lamp file with its mtime and size, reference file and section, see lamp_source).
+    - entries older than max_age seconds, or written by another Calibration.version, are stale
+    - entries fitted from another lamp file, another version of it or other reference lines are misses
+    - beyond max_entries the least recently used entries are deleted (file mtime is the access time)
+
+    store=CalibrationStore('~/.ramancal')
+    key=config_key(1200,633,632.82)
+    source=lamp_source('lamp.txt','Wavelength_Ref_Ne.txt','for 1200g633nm')
+    calibration=store.get(key,source=source)
+    if calibration is None:
+        calibration=...                 # fit the lamp spectrum
+        store.put(key,calibration,source)
+'''
+#----------------
+import os
+import re
+import json
+import time
+import tempfile
+import RamanCal_core as core
+#----------------
+config_regexp=re.compile(r'(?P<grating>\d+)\s*g\s*(?P<center>\d+\.?\d*)\s*nm')
+
+def config_key(grating,center_wavelength,laser_wavelength=None):
+    '''e.g. (1200,633,632.82) -> "1200g633nm_632.82nm"'''
+    key="{0:g}g{1:g}nm".format(float(grating),float(center_wavelength))
+    if laser_wavelength is not None:
+        key=key+"_{0:g}nm".format(float(laser_wavelength))
+    return key
+
+def calibration_key(config,laser_wavelength=None,model_options=None):
+    '''
+    store key of a configuration like "1200g633nm", the pump wavelength and the model options of core.calibrate,
+    a cached linear fit is no answer to a polynomial or robust request
+    '''
+    grating_center=parse_config(config)
+    if grating_center is None:
+        raise ValueError("Configuration should look like 1200g633nm: "+str(config))
+    key=config_key(grating_center[0],grating_center[1],laser_wavelength)
+    if model_options:
+        key=key+'_'+'_'.join('{0}-{1}'.format(name,model_options[name]) for name in sorted(model_options))
+    return key
+
+def parse_config(text):
+    '''(grating,center wavelength) from a section header like "for 1200g633nm" or "HeNe, 1200g660nm", else None'''
+    hit=config_regexp.search(text)
+    if hit is None:
+        return None
+    return float(hit.group('grating')),float(hit.group('center'))
+
+def lamp_source(lamp_file_path,ref_file_name=None,section=None):
+    '''what a cached lamp calibration was fitted from; the lamp's mtime and size stand for its content'''
+    info=os.stat(lamp_file_path)
+    return {'lamp':os.path.abspath(lamp_file_path),'lamp_mtime':info.st_mtime,'lamp_size':info.st_size,
+            'ref':None if ref_file_name is None else os.path.abspath(ref_file_name),'section':section}
+
+class CalibrationStore():
+    def __init__(self,directory,max_entries=256,max_age=None):
+        self.directory=os.path.expanduser(directory)
+        self.max_entries=max_entries
+        self.max_age=max_age # seconds, None keeps entries until evicted
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def path(self,key):
+        if not re.match(r'^[\w.\-]+$',key):
+            raise ValueError("Invalid calibration key: "+str(key))
+        return os.path.join(self.directory,key+'.json')
+
+    def keys(self):
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def get(self,key,max_age=None,source=None):
+        '''
+        cached Calibration, None when missing, stale or, with source (lamp_source), fitted from something else;
+        a hit counts as a use for LRU
+        '''
+        path=self.path(key)
+        try:
+            with open(path) as f:
+                record=json.load(f)
+            calibration=core.Calibration.from_dict(record['calibration'])
+            created=float(record['created'])
+        except (IOError,ValueError,KeyError,TypeError): # missing, damaged or other version
+            return None
+        max_age=self.max_age if max_age is None else max_age
+        if max_age is not None and time.time()-created>max_age:
+            return None
+        if source is not None and record.get('source')!=source:
+            return None
+        os.utime(path,None)
+        return calibration
+
+    def put(self,key,calibration,source=None):
+        '''
+        write atomically through a temporary file of its own, so concurrent writers never share one,
+        then evict least recently used entries beyond max_entries
+        '''
+        path=self.path(key)
+        record={'key':key,'created':time.time(),'source':source,'calibration':calibration.to_dict()}
+        with tempfile.NamedTemporaryFile('w',dir=self.directory,prefix=key+'.',suffix='.tmp',delete=False) as f:
+            temporary=f.name
+            try:
+                json.dump(record,f)
+            except BaseException:
+                f.close()
+                os.remove(temporary)
+                raise
+        os.replace(temporary,path)
+        self.evict()
+        return path
+
+    def delete(self,key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        '''entries another process deletes or evicts meanwhile are skipped'''
+        used=[]
+        for key in self.keys():
+            path=os.path.join(self.directory,key+'.json')
+            try:
+                used.append((os.path.getmtime(path),path))
+            except OSError:
+                continue
+        if len(used)<=self.max_entries:
+            return
+        used.sort()
+        for mtime,path in used[:len(used)-self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def purge_stale(self):
+        '''delete every entry get() would refuse, returns the deleted keys'''
+        stale=[key for key in self.keys() if self.get(key) is None]
+        for key in stale:
+            self.delete(key)
+        return stale
@@ -0,0 +1,367 @@
+'''
+RamanCal ccd
+row-resolved calibration of 2D detector frames (imaging spectrographs) and smile correction
+
+Lines of a slit image are curved across the detector rows, so one slope/intercept per frame is
+off at the top and bottom rows. Here a 2D lamp frame (rows,pixels) is calibrated as a whole:
+    1. reference lines are matched on a band of central rows (RamanCal_match) or given as pixel guesses
+    2. every line is fitted on every row in one batched fit (core.fit_stack on rows*lines windows),
+       a second pass re-centres the windows on the smoothed line shape
+    3. a smooth surface nm(pixel,row)=sum C[j,k]*t**j*s**k, t and s the centred pixel and row,
+       is fitted to all centroids by weighted least squares with sigma clipping
+Science frames are put onto one common axis by a Rectifier: the pixel position of every grid point
+on every row is solved once (vectorized Newton), a frame is then two gathers and a weighted sum.
+
+    surface=calibrate_frame(lamp_frame,ref_values=lines)
+    rectify=Rectifier(surface,frame.shape)          # grid: the centre row's axis unless given
+    straight=rectify(frame)                          # (rows,grid), also works on stacks (n,rows,pixels)
+    surface.row_calibration(100)                     # PolynomialCalibration of one row
+
+    python RamanCal_ccd.py lamp_frame.npy --ref Wavelength_Ref_Ne.txt --section "for 1200g633nm" --science frame.npy
+'''
+#----------------
+import sys
+import json
+import argparse
+import numpy as np
+import RamanCal_core as core
+import RamanCal_io
+#----------------
+def load_frame(path):
+    '''(rows,pixels) detector frame, spectral axis last; any format RamanCal_io reads'''
+    frame=RamanCal_io.load_array(path)
+    try:
+        if frame.ndim!=2:
+            raise ValueError("Expected a 2D detector frame: "+str(path))
+        return np.asarray(frame,dtype=float)
+    finally:
+        RamanCal_io.close_array(frame)
+
+def nanometer_from(values,unit,laser_wavelength=None):
+    '''inverse of Calibration.from_nanometer'''
+    values=np.asarray(values,dtype=float)
+    if unit=='nm':
+        return values
+    if unit=='wavenumber':
+        if laser_wavelength is None:
+            raise ValueError("Raman pump wavelength is needed for wavenumber axis")
+        return 10.0**7/(10.0**7/float(laser_wavelength)-values)
+    if unit=='eV':
+        return core.h*core.c/(values*core.J2eV)
+    raise ValueError("Unknown unit: "+str(unit))
+
+def reference_pairs(frame,ref_values,mode='wavelength',laser_wavelength=None,band=None,**kwargs):
+    '''
+    pixel_array and matched reference lines in nm, detected on the mean of the central rows
+    band=(first,last) rows to average, by default the middle eighth of the frame
+    '''
+    import RamanCal_match
+    rows=frame.shape[0]
+    if band is None:
+        band=(rows//2-max(rows//16,1),rows//2+max(rows//16,1))
+    ydata=np.mean(frame[band[0]:band[1]],axis=0)
+    pixel_array,ref_array=RamanCal_match.auto_pairs(np.arange(frame.shape[1]),ydata,ref_values,mode,laser_wavelength,**kwargs)
+    if mode=='shift':
+        ref_array=core.shift_to_wavelength(ref_array,laser_wavelength)
+    return pixel_array,ref_array
+
+def _fit_windows(frame,rows,centers,window,max_iter):
+    '''fit one Gaussian per (row,line) around centers (rows,lines), all in one fit_stack call'''
+    npixel=frame.shape[1]
+    size=2*int(window)+1
+    start=np.clip(np.rint(centers).astype(int)-int(window),0,npixel-size)
+    index=start[...,None]+np.arange(size) # (rows,lines,size)
+    y=frame[rows[:,None,None],index]
+    params,stderr,redchi=core.fit_stack(index.reshape(-1,size),y.reshape(-1,size),np.ones((index.size//size,size),dtype=bool),
+                                        max_iter)
+    shape=centers.shape
+    fitted=params[:,0].reshape(shape)
+    error=stderr[:,0].reshape(shape)
+    bad=~np.isfinite(fitted)|~np.isfinite(error)|(error>window/2.0)|(fitted<start)|(fitted>start+size-1)
+    fitted[bad]=np.nan
+    error[bad]=np.nan
+    return fitted,error
+
+def row_centroids(frame,pixel_guesses,window=10,rows=None,passes=2,trend_order=2,max_iter=100):
+    '''
+    centroid of every line on every row, (rows,lines) with NaN where the fit failed, and its std error
+    pixel_guesses: line positions on the central rows; rows: row indices to fit, default all
+    later passes centre the windows on a polynomial of trend_order through each line's centroids over the rows,
+    so lines curving further than window are still followed to the frame edges
+    '''
+    frame=np.asarray(frame,dtype=float)
+    rows=np.arange(frame.shape[0]) if rows is None else np.asarray(rows,dtype=int)
+    pixel_guesses=np.asarray(pixel_guesses,dtype=float)
+    centers=np.broadcast_to(pixel_guesses,(rows.size,pixel_guesses.size))
+    for iteration in range(passes):
+        fitted,error=_fit_windows(frame,rows,centers,window,max_iter)
+        if iteration==passes-1:
+            break
+        centers=np.array(centers,dtype=float)
+        for line in range(pixel_guesses.size):
+            good=np.isfinite(fitted[:,line])
+            if good.sum()>trend_order:
+                centers[:,line]=np.polyval(np.polyfit(rows[good],fitted[good,line],trend_order),rows)
+    return fitted,error
+
+class DispersionSurface():
+    '''
+    nm(pixel,row)=sum coefficients[j,k]*t**j*s**k with t=(pixel-pixel_center)/pixel_scale, s=(row-row_center)/row_scale
+    pixel_array/row_array/ref_array are the centroids used, report is the fit summary
+    '''
+    version=1
+
+    def __init__(self,coefficients,pixel_center=0.0,pixel_scale=1.0,row_center=0.0,row_scale=1.0,laser_wavelength=None,
+                 pixel_array=None,row_array=None,ref_array=None,report='',covariance=None,mode='wavelength'):
+        self.coefficients=np.asarray(coefficients,dtype=float)
+        self.pixel_center=float(pixel_center)
+        self.pixel_scale=float(pixel_scale)
+        self.row_center=float(row_center)
+        self.row_scale=float(row_scale)
+        self.laser_wavelength=laser_wavelength
+        self.pixel_array=pixel_array
+        self.row_array=row_array
+        self.ref_array=ref_array
+        self.report=report
+        size=self.coefficients.size
+        self.covariance=np.full((size,size),np.nan) if covariance is None else np.asarray(covariance,dtype=float)
+        self.mode=mode
+
+    from_nanometer=core.Calibration.from_nanometer
+
+    def options(self):
+        return {'pixel_center':self.pixel_center,'pixel_scale':self.pixel_scale,'row_center':self.row_center,
+                'row_scale':self.row_scale}
+
+    def to_dict(self):
+        def as_list(array):
+            return None if array is None else np.asarray(array,dtype=float).tolist()
+        return {'version':self.version,'model':'surface','coefficients':self.coefficients.tolist(),'options':self.options(),
+                'covariance':self.covariance.tolist(),'laser_wavelength':self.laser_wavelength,'mode':self.mode,
+                'pixel_array':as_list(self.pixel_array),'row_array':as_list(self.row_array),
+                'ref_array':as_list(self.ref_array),'report':self.report}
+
+    @classmethod
+    def from_dict(cls,fields):
+        if fields.get('version')!=cls.version:
+            raise ValueError("Surface record version {0}, expected {1}".format(fields.get('version'),cls.version))
+        def as_array(values):
+            return None if values is None else np.array(values,dtype=float)
+        return cls(fields['coefficients'],laser_wavelength=fields['laser_wavelength'],pixel_array=as_array(fields['pixel_array']),
+                   row_array=as_array(fields['row_array']),ref_array=as_array(fields['ref_array']),report=fields['report'],
+                   covariance=fields['covariance'],mode=fields['mode'],**fields['options'])
+
+    def row_coefficients(self,rows):
+        '''power series in t of every row, (rows,pixel order+1)'''
+        s=(np.asarray(rows,dtype=float)-self.row_center)/self.row_scale
+        return np.vander(np.atleast_1d(s),self.coefficients.shape[1],increasing=True).dot(self.coefficients.T)
+
+    def nanometer(self,pixels,rows):
+        '''nm at matching (broadcast) arrays of pixels and rows'''
+        t=(np.asarray(pixels,dtype=float)-self.pixel_center)/self.pixel_scale
+        s=(np.asarray(rows,dtype=float)-self.row_center)/self.row_scale
+        t,s=np.broadcast_arrays(t,s)
+        return np.polynomial.polynomial.polyval2d(t,s,self.coefficients)
+
+    def axis_map(self,shape,unit='nm'):
+        '''calibrated axis of every row of a (rows,pixels) frame, as one (rows,pixels) array'''
+        rows,npixel=shape
+        t=(np.arange(npixel)-self.pixel_center)/self.pixel_scale
+        nm=self.row_coefficients(np.arange(rows)).dot(np.vander(t,self.coefficients.shape[0],increasing=True).T)
+        return self.from_nanometer(nm,unit)
+
+    def row_calibration(self,row):
+        '''the surface along one row, as a core.PolynomialCalibration'''
+        return core.PolynomialCalibration(self.row_coefficients(row)[0],self.pixel_center,self.pixel_scale,
+                                          self.laser_wavelength,mode=self.mode)
+
+    def smile(self,wavelength,rows):
+        '''pixel position of a wavelength on every row, relative to the centre row'''
+        positions=self.pixel_positions(np.full((np.size(rows),1),float(wavelength)),rows)[:,0]
+        return positions-self.pixel_positions(np.array([[float(wavelength)]]),[self.row_center])[0,0]
+
+    def pixel_positions(self,nm,rows,tol=1e-6,max_iter=20):
+        '''
+        pixel where the surface reaches nm on each row; nm is (rows,K), solved by Newton for all entries together
+        starting from the tangent line of each row
+        '''
+        a=self.row_coefficients(rows)[:,None,:] # (rows,1,order+1)
+        nm=np.asarray(nm,dtype=float)
+        slope=a[...,1] if a.shape[-1]>1 else np.ones_like(a[...,0])
+        t=(nm-a[...,0])/slope
+        derivative=a[...,1:]*np.arange(1,a.shape[-1])
+        for iteration in range(max_iter):
+            value=np.zeros_like(t)
+            for coefficient in a[...,::-1].transpose(2,0,1): # Horner
+                value=value*t+coefficient
+            gradient=np.zeros_like(t)
+            for coefficient in derivative[...,::-1].transpose(2,0,1):
+                gradient=gradient*t+coefficient
+            step=(value-nm)/gradient
+            t-=step
+            if np.nanmax(np.abs(step))*self.pixel_scale<tol:
+                break
+        return t*self.pixel_scale+self.pixel_center
+
+def fit_surface(centroids,rows,ref_nm,pixel_order=3,row_order=2,weights=None,clip=3.0,max_iter=5,
+                laser_wavelength=None,mode='wavelength'):
+    '''
+    weighted least squares surface through centroids (rows,lines) of lines at ref_nm (lines,) on rows (rows,)
+    weights (rows,lines), e.g. 1/stderr**2; NaN centroids are left out, points beyond clip*rms are rejected
+    '''
+    centroids=np.asarray(centroids,dtype=float)
+    rows=np.asarray(rows,dtype=float)
+    ref_nm=np.asarray(ref_nm,dtype=float)
+    row_grid=np.broadcast_to(rows[:,None],centroids.shape)
+    ref_grid=np.broadcast_to(ref_nm[None,:],centroids.shape)
+    weight_grid=np.ones(centroids.shape) if weights is None else np.asarray(weights,dtype=float)
+    use=np.isfinite(centroids)&np.isfinite(weight_grid)&(weight_grid>0)
+    pixel,row,nm,weight=centroids[use],row_grid[use],ref_grid[use],weight_grid[use]
+    weight=weight/np.median(weight)
+    size=(pixel_order+1)*(row_order+1)
+    if pixel.size<=size:
+        raise ValueError("Need more than {0} line centroids for a ({1},{2}) surface".format(size,pixel_order,row_order))
+    pixel_center,pixel_scale=pixel.mean(),max(np.ptp(pixel)/2,1.0)
+    row_center,row_scale=rows.mean(),max(np.ptp(rows)/2,1.0)
+    design=np.polynomial.polynomial.polyvander2d((pixel-pixel_center)/pixel_scale,(row-row_center)/row_scale,
+                                                  [pixel_order,row_order])
+    keep=np.ones(pixel.size,dtype=bool)
+    for iteration in range(max_iter):
+        root=np.sqrt(weight[keep])
+        Q,R=np.linalg.qr(design[keep]*root[:,None])
+        coefficients=np.linalg.solve(R,Q.T.dot(nm[keep]*root))
+        residual=nm-design.dot(coefficients)
+        rms=np.sqrt(np.average(residual[keep]**2,weights=weight[keep]))
+        within=np.abs(residual)<=clip*rms if clip else keep
+        if np.array_equal(within,keep) or within.sum()<=size:
+            break
+        keep=within
+    dof=keep.sum()-size
+    variance=(weight[keep]*residual[keep]**2).sum()/dof if dof>0 else np.nan
+    R_inverse=np.linalg.inv(R)
+    covariance=variance*R_inverse.dot(R_inverse.T)
+    report="Calibration result (2D surface, pixel order {0}, row order {1}):\n".format(pixel_order,row_order)
+    report=report+"t = (pixel - {0})/{1}, s = (row - {2})/{3}\n".format(pixel_center,pixel_scale,row_center,row_scale)
+    report=report+"centroids used: {0} of {1}\nrms residual (nm): {2}\n".format(keep.sum(),use.sum(),rms)
+    surface=DispersionSurface(coefficients.reshape(pixel_order+1,row_order+1),pixel_center,pixel_scale,row_center,row_scale,
+                              laser_wavelength,pixel[keep],row[keep],nm[keep],'',covariance,mode)
+    edges=np.array([rows.min(),rows.max()])
+    report=report+"smile at the edge rows (pixels):\n"+"".join("{0}: {1:.3f} {2:.3f}\n".format(value,*surface.smile(value,edges))
+                                                             for value in ref_nm)
+    surface.report=report
+    return surface
+
+def calibrate_frame(frame,ref_values=None,pixel_guesses=None,ref_array=None,mode='wavelength',laser_wavelength=None,
+                    window=10,pixel_order=3,row_order=2,row_step=1,clip=3.0,**kwargs):
+    '''
+    DispersionSurface of a 2D lamp frame
+    lines come from ref_values, matched automatically on the central rows, or from pixel_guesses with their ref_array
+    (nm for mode 'wavelength', cm-1 for 'shift'); row_step>1 fits every row_step-th row only
+    '''
+    frame=np.asarray(frame,dtype=float)
+    if pixel_guesses is None:
+        if ref_values is None:
+            raise ValueError("Need reference lines or pixel guesses with their reference values")
+        pixel_guesses,ref_nm=reference_pairs(frame,ref_values,mode,laser_wavelength,**kwargs)
+    else:
+        pixel_guesses,ref_nm=np.asarray(pixel_guesses,dtype=float),np.asarray(ref_array,dtype=float)
+        if mode=='shift':
+            ref_nm=core.shift_to_wavelength(ref_nm,laser_wavelength)
+    rows=np.arange(0,frame.shape[0],row_step)
+    centroids,error=row_centroids(frame,pixel_guesses,window,rows)
+    with np.errstate(divide='ignore'):
+        weights=1.0/error**2
+    return fit_surface(centroids,rows,ref_nm,pixel_order,row_order,weights,clip,laser_wavelength=laser_wavelength,mode=mode)
+
+class Rectifier():
+    '''
+    smile correction of (rows,pixels) frames onto one axis shared by all rows
+    grid: axis in unit, by default the centre row's own axis, so spectra keep their sampling
+    the fractional source pixel of every (row,grid point) is solved once, frames are then interpolated linearly;
+    grid points a row does not reach come out NaN
+    '''
+    def __init__(self,surface,shape,grid=None,unit='nm'):
+        self.surface=surface
+        self.shape=tuple(shape)
+        self.unit=unit
+        rows,npixel=self.shape
+        if grid is None:
+            grid=surface.from_nanometer(surface.nanometer(np.arange(npixel),round(surface.row_center)),unit)
+        self.grid=np.asarray(grid,dtype=float)
+        nm=nanometer_from(self.grid,unit,surface.laser_wavelength)
+        position=surface.pixel_positions(np.broadcast_to(nm,(rows,nm.size)),np.arange(rows))
+        self.valid=np.isfinite(position)&(position>=0)&(position<=npixel-1)
+        position=np.where(self.valid,position,0.0)
+        left=np.minimum(np.floor(position).astype(np.intp),npixel-2)
+        self.weight=position-left
+        self.index=left+np.arange(rows)[:,None]*npixel # into the flattened frame
+        self.right=self.index+1
+
+    def __call__(self,frames):
+        frames=np.asarray(frames)
+        if frames.shape[-2:]!=self.shape:
+            raise ValueError("Frame shape {0} does not match the calibration {1}".format(frames.shape[-2:],self.shape))
+        dtype=frames.dtype if frames.dtype in (np.float32,np.float64) else np.dtype(float)
+        flat=frames.reshape(frames.shape[:-2]+(-1,)).astype(dtype,copy=False)
+        weight=self.weight.astype(dtype,copy=False)
+        left=np.take(flat,self.index,axis=-1)
+        result=np.take(flat,self.right,axis=-1)
+        result-=left
+        result*=weight
+        result+=left
+        result[...,~self.valid]=np.nan
+        return result
+
+def make_parser():
+    parser=argparse.ArgumentParser(description="Calibrate every row of a 2D lamp frame and straighten science frames")
+    parser.add_argument('lamp',help="2D lamp frame (rows,pixels)")
+    parser.add_argument('--ref',default=None,help="reference wavelength/Raman shift file, lines matched automatically")
+    parser.add_argument('--section',default=None)
+    parser.add_argument('--pixels',nargs='+',type=float,default=None,help="line positions on the central rows instead of matching")
+    parser.add_argument('--values',nargs='+',type=float,default=None,help="reference values of --pixels")
+    parser.add_argument('--mode',choices=['wavelength','shift'],default='wavelength')
+    parser.add_argument('--laser',type=float,default=632.82,help="Raman pump wavelength (nm)")
+    parser.add_argument('--window',type=int,default=10,help="fit half width (pixels)")
+    parser.add_argument('--orders',nargs=2,type=int,default=[3,2],metavar=('PIXEL','ROW'),help="surface polynomial orders")
+    parser.add_argument('--row-step',type=int,default=1,help="fit every n-th row only")
+    parser.add_argument('--save',default=None,help="surface as JSON")
+    parser.add_argument('--science',nargs='+',default=[],help="frames to straighten, written as <name>_rect.npz")
+    parser.add_argument('--unit',choices=['nm','wavenumber','eV'],default='nm')
+    parser.add_argument('--grid',nargs=3,type=float,default=None,metavar=('START','STOP','STEP'),
+                        help="common axis in --unit, default the centre row's axis")
+    return parser
+
+def main(argv=None):
+    args=make_parser().parse_args(argv)
+    lamp=load_frame(args.lamp)
+    if args.pixels is not None:
+        if args.values is None or len(args.values)!=len(args.pixels):
+            print("Need one --values entry per --pixels entry")
+            return 1
+        surface=calibrate_frame(lamp,pixel_guesses=args.pixels,ref_array=args.values,mode=args.mode,laser_wavelength=args.laser,
+                                window=args.window,pixel_order=args.orders[0],row_order=args.orders[1],row_step=args.row_step)
+    elif args.ref is not None:
+        import RamanCal_refs
+        surface=calibrate_frame(lamp,RamanCal_refs.library_values(args.ref,args.section),mode=args.mode,laser_wavelength=args.laser,
+                                window=args.window,pixel_order=args.orders[0],row_order=args.orders[1],row_step=args.row_step)
+    else:
+        print("Need --ref, or --pixels with --values")
+        return 1
+    surface.laser_wavelength=args.laser
+    print(surface.report)
+    if args.save is not None:
+        with open(args.save,'w') as f:
+            json.dump(surface.to_dict(),f,indent=1)
+    grid=None if args.grid is None else core.uniform_grid(*args.grid)
+    rectifier=None
+    for path in args.science:
+        frame=load_frame(path)
+        if rectifier is None or rectifier.shape!=frame.shape:
+            rectifier=Rectifier(surface,frame.shape,grid,args.unit)
+        out_path=path[:-4]+'_rect.npz'
+        np.savez(out_path,spectra=rectifier(frame),grid=rectifier.grid)
+        print("written: "+out_path)
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+'''
+RamanCal container
+one binary file per run: calibrated axes, calibration and optionally the calibrated spectra
+
+The container is a plain .npz (zip of .npy members), readable with np.load:
+    xdata         pixel axis (float64)
+    axes          (3,pixels) nm, wavenumber (cm-1), eV (float64)
+    sigma         (3,pixels) 1 sigma of the axes (float64), optional
+    coefficients  model coefficients (float64)
+    covariance    their covariance (float64)
+    calibration   Calibration.to_dict() as JSON text, rebuilt by load_container
+    metadata      JSON text of user fields
+    spectra       (spectra,pixels) in the chosen dtype, optional
+    grid          axis of the spectra columns when they were resampled onto a common axis (float64), optional
+Only the spectra take the chosen dtype, the axes keep full precision whatever it is.
+Members are written straight into the zip, spectra may come block by block (RamanCal_stream.calibrate_blocks),
+so a run never has to sit in memory. compress=True deflates the members (lossless, slower);
+uncompressed spectra are memory-mapped by load_container, so reading costs what the disk does.
+
+    save_container('run_cal.npz',calibration,xdata,spectra,dtype=np.float32)
+    run=load_container('run_cal.npz')
+    run['calibration'].slope,run['spectra'][10]
+'''
+#----------------
+import os
+import json
+import zipfile
+import numpy as np
+import RamanCal_core as core
+import RamanCal_io
+#----------------
+def _write_member(archive,name,array):
+    with archive.open(name+'.npy','w',force_zip64=True) as f:
+        np.lib.format.write_array(f,np.asanyarray(array),allow_pickle=False)
+
+def _write_blocks(archive,name,blocks,shape,dtype):
+    '''
+    spectra as (start,block) pairs written one after the other, no full array in memory
+    the blocks must fill shape exactly, the header is written before them
+    '''
+    header={'descr':np.lib.format.dtype_to_descr(np.dtype(dtype)),'fortran_order':False,'shape':tuple(shape)}
+    rows=0
+    with archive.open(name+'.npy','w',force_zip64=True) as f:
+        np.lib.format.write_array_header_2_0(f,header)
+        for start,block in blocks:
+            block=np.ascontiguousarray(block,dtype=dtype)
+            if block.ndim!=2 or block.shape[1:]!=tuple(shape[1:]) or rows+block.shape[0]>shape[0]:
+                raise ValueError("Block {0} at spectrum {1} does not fit {2} spectra of shape {3}".format(
+                                 block.shape,rows,name,tuple(shape)))
+            f.write(block.tobytes())
+            rows+=block.shape[0]
+    if rows!=shape[0]:
+        raise ValueError("{0} spectra written, {1} expected".format(rows,shape[0]))
+
+def save_container(path,calibration,xdata,spectra=None,dtype=np.float64,compress=False,uncertainty=None,
+                   metadata=None,shape=None,grid=None):
+    '''
+    write the container, returns path
+    spectra: array (spectra,pixels), or an iterable of (start,block) with shape=(spectra,pixels) given
+    dtype applies to the spectra only; axes, sigma, grid, coefficients and covariance are always float64
+    compress: True deflates at level 1 (fast), or a zlib level 1..9
+    uncertainty: 'linear' or 'montecarlo' stores sigma, see Calibration.uncertainty
+    grid: common axis the spectra were resampled onto, in place of the calibrated pixel axes
+    '''
+    xdata=np.asarray(xdata,dtype=float)
+    axes=calibration.axes(xdata)
+    compression=zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    level=None if not compress else 1 if compress is True else int(compress)
+    try:
+        _write_archive(path,calibration,xdata,axes,spectra,dtype,compression,level,uncertainty,metadata,shape,grid)
+    except BaseException: # no half-written container left behind
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
+
+def _write_archive(path,calibration,xdata,axes,spectra,dtype,compression,level,uncertainty,metadata,shape,grid):
+    with zipfile.ZipFile(path,'w',compression=compression,compresslevel=level,allowZip64=True) as archive:
+        _write_member(archive,'xdata',xdata)
+        _write_member(archive,'axes',np.asarray(axes.buffer,dtype=np.float64))
+        if uncertainty is not None:
+            _write_member(archive,'sigma',np.asarray(core.axes_sigma(calibration,xdata,uncertainty),dtype=np.float64))
+        _write_member(archive,'coefficients',np.asarray(calibration.coefficients,dtype=np.float64))
+        _write_member(archive,'covariance',np.asarray(calibration.covariance,dtype=np.float64))
+        _write_member(archive,'calibration',np.array(json.dumps(calibration.to_dict())))
+        _write_member(archive,'metadata',np.array(json.dumps(metadata or {})))
+        if grid is not None:
+            _write_member(archive,'grid',np.asarray(grid,dtype=np.float64))
+        if spectra is not None:
+            if shape is None:
+                _write_member(archive,'spectra',np.asarray(spectra).astype(dtype,copy=False))
+            else:
+                _write_blocks(archive,'spectra',spectra,shape,dtype)
+
+def load_container(path,mmap=True):
+    '''
+    dict with the members above, 'calibration' rebuilt as a Calibration and 'metadata' as a dict
+    with mmap uncompressed spectra come back as a read-only np.memmap
+    '''
+    result={}
+    with zipfile.ZipFile(path) as archive:
+        names=[name[:-4] for name in archive.namelist() if name.endswith('.npy')]
+    spectra=RamanCal_io.memmap_npz_member(path,'spectra') if mmap and 'spectra' in names else None
+    with np.load(path,allow_pickle=False) as npz:
+        for name in names:
+            if name=='spectra' and spectra is not None:
+                result[name]=spectra
+            else:
+                result[name]=npz[name]
+    result['calibration']=core.Calibration.from_dict(json.loads(str(result['calibration'])))
+    result['metadata']=json.loads(str(result['metadata']))
+    return result
@@ -0,0 +1,951 @@
+'''
+RamanCal core
+GUI-free calibration engine shared by RamanCal_07.py (GUI) and RamanCal_batch.py (CLI)
+
+Nothing in here touches Qt, so it can run on headless nodes.
+lmfit and scipy are imported by the functions that need them, so importing this module costs numpy only.
+Conventions follow the GUI:
+    pixel -> nm       slope*pixel+intercept
+    nm -> cm-1        1e7/laser_wavelength-1e7/wavelength
+    nm -> eV          h*c/wavelength/J2eV
+    output files      spectrum_file_path[:-4]+'_nm.cal' / '_wavenumber.cal' / '_eV.cal'
+'''
+#----------------
+import re
+import numpy as np
+import RamanCal_io
+import RamanCal_profile as profile
+#----------------
+h=6.626e-34 # unit: Js
+c=299792458e9 # unit: nm/s
+J2eV=1.60218e-19 # unit: J/eV
+
+# same pattern as func_add_cal_wvlen: "Ne 616.35939", "S -473.2"
+ref_entry_regexp=re.compile(r'(?P<name>.*)\s(?P<wavelength>-{0,1}\d*\.\d*)')
+cal_suffix={'nm':'_nm.cal','wavenumber':'_wavenumber.cal','eV':'_eV.cal','fit':'_fit.cal','axes':'_axes.cal','axes_npy':'_axes.npy',
+          'npz':'_cal.npz'}
+
+@profile.timed('load')
+def load_spectrum(spectrum_file_path):
+    '''
+    returns xdata,ydata
+    shape (n,2): 1st col is pixel, 2nd col is intensity; (2,n): the same as rows
+    1 column: intensity only, pixel index is used as xdata
+    the file format (text, .npy, HDF5, ...) is detected by RamanCal_io
+    '''
+    cache=RamanCal_io.load_array(spectrum_file_path)
+    try:
+        if cache.ndim==2 and cache.shape[1]==2:
+            return np.array(cache[:,0]),np.array(cache[:,1])
+        if cache.ndim==2 and cache.shape[0]==2:
+            return np.array(cache[0]),np.array(cache[1])
+        if cache.ndim==1:
+            return np.arange(cache.size),np.array(cache)
+    finally:
+        RamanCal_io.close_array(cache)
+    raise ValueError("Unsupported spectrum layout {0}, expected (n,), (n,2) or (2,n): {1}".format(cache.shape,spectrum_file_path))
+
+def parse_ref_rows(ref_entries):
+    '''
+    yields (row,section,name,value) for every numeric row of a reference file's lines
+    lines without a number, e.g. "for 1200g633nm", are section headers
+    '''
+    current_section=None
+    for row,entry in enumerate(ref_entries):
+        entry=entry.rstrip()
+        if entry=='':
+            continue
+        hit=ref_entry_regexp.match(entry)
+        if hit is None:
+            current_section=entry
+            continue
+        yield row,current_section,hit.group('name').strip(),float(hit.group('wavelength'))
+
+def load_ref_entries(ref_file_name,section=None):
+    '''
+    returns list of (name,value) from a reference wavelength/Raman shift file
+    with section given, only entries below that header (up to the next header) are kept
+    '''
+    with open(ref_file_name) as f:
+        rows=list(parse_ref_rows(f.readlines()))
+    return [(name,value) for row,current_section,name,value in rows if section is None or current_section==section]
+
+def cal_file_path(spectrum_file_path,unit):
+    '''spectrum file name with '.cal' extension, e.g. lamp.txt -> lamp_nm.cal'''
+    return spectrum_file_path[:-4]+cal_suffix[unit]
+
+#---peak fitting
+_peak_model=None
+def peak_model():
+    '''constant+Gaussian lmfit model, built once and reused for every fit'''
+    global _peak_model
+    if _peak_model is None:
+        from lmfit.models import ConstantModel,GaussianModel
+        _peak_model=ConstantModel(prefix='const_')+GaussianModel(prefix='gauss_')
+    return _peak_model
+
+@profile.timed('fit_lmfit')
+def fit_peak(xdata,ydata,low_bound,high_bound,iter_cb=None):
+    '''
+    fit constant+Gaussian inside (low_bound,high_bound), bounds may come reversed
+    returns lmfit ModelResult, peak location is result.params['gauss_center']
+    iter_cb(params,iteration,residual) is called by lmfit every iteration, returning True aborts the fit
+    '''
+    if low_bound>high_bound: # range item is 'polar'
+        low_bound,high_bound=high_bound,low_bound
+    with profile.stage('window'):
+        index=(xdata>low_bound)*(xdata<high_bound)
+        xdata_to_fit=xdata[index]
+        ydata_to_fit=ydata[index]
+    if xdata_to_fit.size<4:
+        raise ValueError("Too few points to fit in range %.2f - %.2f"%(low_bound,high_bound))
+
+    offset=np.median(ydata_to_fit)
+    peak=np.argmax(np.abs(ydata_to_fit-offset)) # negative peaks (FRIKES) work as well
+    sigma=max((high_bound-low_bound)/8,np.abs(np.diff(xdata_to_fit)).min())
+
+    pk_mdl=peak_model()
+    p0=pk_mdl.make_params()
+    p0['const_c'].set(value=offset)
+    p0['gauss_center'].set(value=xdata_to_fit[peak])
+    p0['gauss_sigma'].set(value=sigma)
+    p0['gauss_amplitude'].set(value=(ydata_to_fit[peak]-offset)*sigma*np.sqrt(2*np.pi))
+    result=pk_mdl.fit(ydata_to_fit,x=xdata_to_fit,params=p0,iter_cb=iter_cb)
+    profile.count('lmfit_evaluations',result.nfev)
+    return result
+
+def gaussian(xdata,parameters):
+    '''
+    offset+amp*exp(-(x-center)^2/(2 sigma^2))
+    parameters is (center,sigma,amp,offset), or an (N,4) array with xdata of shape (N,M)
+    '''
+    parameters=np.asarray(parameters,dtype=float)
+    center,sigma,amp,offset=[item[...,None] if parameters.ndim==2 else item for item in np.moveaxis(parameters,-1,0)]
+    return offset+amp*np.exp((-0.5)*(xdata-center)**2/sigma**2)
+
+@profile.timed('window')
+def window_stack(xdata,ydata,windows):
+    '''
+    cut N (low,high) windows out of a spectrum into padded (N,M) arrays
+    returns x,y,mask; mask is False on the padding
+    '''
+    xdata=np.asarray(xdata,dtype=float)
+    ydata=np.asarray(ydata,dtype=float)
+    windows=np.sort(np.asarray(windows,dtype=float).reshape(-1,2),axis=1) # range items can be 'polar'
+    if xdata.size>1 and xdata[0]>xdata[-1]: # descending pixel axis
+        xdata,ydata=xdata[::-1],ydata[::-1]
+    start=np.searchsorted(xdata,windows[:,0],side='right')
+    stop=np.searchsorted(xdata,windows[:,1],side='left')
+    length=np.maximum(stop-start,0)
+    if length.min()<4:
+        raise ValueError("Too few points to fit in range %.2f - %.2f"%tuple(windows[np.argmin(length)]))
+    index=start[:,None]+np.arange(length.max())
+    mask=index<stop[:,None]
+    index=np.minimum(index,xdata.size-1)
+    return xdata[index],ydata[index],mask
+
+def fit_gaussians(xdata,ydata,windows,max_iter=100,tol=1e-10):
+    '''
+    fit constant+Gaussian in N windows of one spectrum at once, see fit_stack
+    returns params (N,4) as (center,sigma,amp,offset), their std errors (N,4) and reduced chi-square (N,)
+    '''
+    x,y,mask=window_stack(xdata,ydata,windows)
+    return fit_stack(x,y,mask,max_iter,tol)
+
+@profile.timed('fit_batch')
+def fit_stack(x,y,mask,max_iter=100,tol=1e-10):
+    '''
+    batched Levenberg-Marquardt of constant+Gaussian on (N,M) windows, mask False on padding
+    the residual and its analytic Jacobian are evaluated for all windows as (N,M) arrays,
+    the 4x4 normal equations are solved together with np.linalg.solve
+    '''
+    x=np.asarray(x,dtype=float)
+    y=np.asarray(y,dtype=float)
+    profile.count('peaks',x.shape[0])
+    weight=mask.astype(float)
+    npoint=mask.sum(axis=1)
+    # initial guess: extreme point above the median, negative peaks (FRIKES) work as well
+    if mask.all():
+        offset=np.median(y,axis=1)
+    else:
+        offset=np.nanmedian(np.where(mask,y,np.nan),axis=1)
+    peak=np.argmax(np.abs(y-offset[:,None])*weight,axis=1)
+    rows=np.arange(x.shape[0])
+    dx=np.abs(np.diff(x,axis=1)).max(axis=1)
+    span=np.ptp(np.where(mask,x,x[:,:1]),axis=1)
+    p=np.column_stack([x[rows,peak],np.maximum(span/8,dx),y[rows,peak]-offset,offset])
+
+    def residual_and_jacobian(p,index=slice(None)):
+        center,sigma,amp=p[:,0,None],p[:,1,None],p[:,2,None]
+        u=(x[index]-center)/sigma
+        g=np.exp(-0.5*u**2)
+        r=(p[:,3,None]+amp*g-y[index])*weight[index]
+        J=np.stack([amp*g*u/sigma,amp*g*u**2/sigma,g,np.ones_like(g)],axis=-1)*weight[index][...,None]
+        return r,J
+
+    r,J=residual_and_jacobian(p)
+    cost=np.einsum('nm,nm->n',r,r)
+    lam=np.full(x.shape[0],1e-3)
+    active=np.arange(x.shape[0]) # windows still iterating, the converged ones drop out of the work
+    for iteration in range(max_iter):
+        Ja,ra=J[active],r[active]
+        JT=Ja.transpose(0,2,1)
+        JTJ=np.matmul(JT,Ja)
+        JTr=np.matmul(JT,ra[...,None])
+        A=JTJ+lam[active,None,None]*JTJ*np.eye(4)+1e-12*np.eye(4)
+        step=np.linalg.solve(A,-JTr)[...,0]
+        r_new,J_new=residual_and_jacobian(p[active]+step,active)
+        cost_new=np.einsum('nm,nm->n',r_new,r_new)
+        better=cost_new<cost[active]
+        moved=active[better]
+        p[moved]+=step[better]
+        r[moved],J[moved]=r_new[better],J_new[better]
+        converged=better&((cost[active]-cost_new)<=tol*(cost[active]+tol))
+        cost[moved]=cost_new[better]
+        lam[active]=np.where(better,lam[active]/10,lam[active]*10)
+        active=active[~converged&(lam[active]<1e10)]
+        if not active.size:
+            break
+    p[:,1]=np.abs(p[:,1])
+    dof=np.maximum(npoint-4,1)
+    redchi=cost/dof
+    JTJ=np.matmul(J.transpose(0,2,1),J)
+    with np.errstate(invalid='ignore'):
+        covariance=np.linalg.pinv(JTJ)*redchi[:,None,None]
+        stderr=np.sqrt(np.diagonal(covariance,axis1=1,axis2=2))
+    return p,stderr,redchi
+
+def fit_peaks(xdata,ydata,pixel_guesses,window=10,method='batch'):
+    '''
+    fit one peak per guessed pixel within +-window, returns array of peak locations
+    method 'batch' fits all peaks together with fit_gaussians, 'lmfit' fits them one by one with fit_peak
+    '''
+    pixel_guesses=np.asarray(pixel_guesses,dtype=float)
+    if method=='batch':
+        windows=np.column_stack([pixel_guesses-window,pixel_guesses+window])
+        return fit_gaussians(xdata,ydata,windows)[0][:,0]
+    if method=='lmfit':
+        centers=[fit_peak(xdata,ydata,guess-window,guess+window).params['gauss_center'].value for guess in pixel_guesses]
+        return np.array(centers)
+    raise ValueError("Unknown fitting method: "+str(method))
+
+#---calibration
+def shift_to_wavelength(shift_array,laser_wavelength):
+    '''Raman shift (cm-1) -> absolute wavelength (nm), inverse of Calibration.wavenumber'''
+    return 1.0/(1.0/float(laser_wavelength)-np.asarray(shift_array,dtype=float)*1e-7)
+
+class Calibration():
+    '''
+    linear pixel -> nm map, optionally with the Raman pump wavelength
+    pixel_array/ref_array are the points used (ref in nm for mode 'wavelength', cm-1 for 'shift'),
+    covariance is the covariance of coefficients, (slope,intercept) here, report is the text shown in the GUI
+    other dispersion models subclass it and override nanometer()
+    '''
+    version=2 # bump when the to_dict layout changes
+    model='linear'
+
+    def __init__(self,slope,intercept,laser_wavelength=None,pixel_array=None,ref_array=None,report='',
+                 covariance=None,mode='wavelength'):
+        self.slope=float(slope)
+        self.intercept=float(intercept)
+        self.laser_wavelength=laser_wavelength
+        self.pixel_array=pixel_array
+        self.ref_array=ref_array
+        self.report=report
+        self.covariance=np.full((2,2),np.nan) if covariance is None else np.asarray(covariance,dtype=float)
+        self.mode=mode
+        self.rejected=None # mask of the input points left out by calibrate_robust
+        self._axes=None # (key,CalibratedAxes) of the last detector asked for
+
+    @property
+    def coefficients(self):
+        return np.array([self.slope,self.intercept])
+
+    def options(self):
+        '''fixed model settings that are not fitted'''
+        return {}
+
+    @classmethod
+    def from_coefficients(cls,coefficients,options,**common):
+        return cls(coefficients[0],coefficients[1],**common)
+
+    def to_dict(self):
+        '''plain types only, json.dumps-able'''
+        def as_list(array):
+            return None if array is None else np.asarray(array,dtype=float).tolist()
+        return {'version':self.version,'model':self.model,'coefficients':as_list(self.coefficients),
+                'options':self.options(),'covariance':self.covariance.tolist(),
+                'laser_wavelength':self.laser_wavelength,'mode':self.mode,'pixel_array':as_list(self.pixel_array),
+                'ref_array':as_list(self.ref_array),'report':self.report}
+
+    @staticmethod
+    def from_dict(fields):
+        '''rebuild the Calibration subclass named in fields['model']'''
+        if fields.get('version')!=Calibration.version:
+            raise ValueError("Calibration record version {0}, expected {1}".format(fields.get('version'),Calibration.version))
+        def as_array(values):
+            return None if values is None else np.array(values,dtype=float)
+        cls=calibration_models[fields['model']]
+        return cls.from_coefficients(fields['coefficients'],fields['options'],
+                                     laser_wavelength=fields['laser_wavelength'],pixel_array=as_array(fields['pixel_array']),
+                                     ref_array=as_array(fields['ref_array']),report=fields['report'],
+                                     covariance=fields['covariance'],mode=fields['mode'])
+
+    def nanometer(self,xdata):
+        return self.slope*np.asarray(xdata)+self.intercept
+
+    def jacobian(self,xdata):
+        '''d nm/d coefficients, (pixels,coefficients)'''
+        xdata=np.asarray(xdata,dtype=float)
+        return np.column_stack([xdata,np.ones_like(xdata)])
+
+    def nanometer_draws(self,xdata,draws):
+        '''nm for every row of coefficient draws (draws,coefficients) -> (draws,pixels); exact for models linear in them'''
+        return np.asarray(draws).dot(self.jacobian(xdata).T)
+
+    def from_nanometer(self,nm,unit):
+        '''nm array -> unit, the same conversions as CalibratedAxes'''
+        if unit=='nm':
+            return nm
+        if unit=='wavenumber':
+            if self.laser_wavelength is None:
+                raise ValueError("Raman pump wavelength is needed for wavenumber axis")
+            return 10.0**7/float(self.laser_wavelength)-10.0**7/nm
+        if unit=='eV':
+            return h*c/nm/J2eV
+        raise ValueError("Unknown unit: "+str(unit))
+
+    def uncertainty(self,xdata,unit='nm',method='linear',draws=2000,seed=0,block=4096):
+        '''
+        1 sigma of the calibrated axis at every pixel from the coefficient covariance
+        unit is one unit or a tuple of units (rows of the result)
+        'linear': diagonal of J*C*J^T for the nm Jacobian J, carried to cm-1/eV by the derivative of the conversion
+        'montecarlo': `draws` coefficient sets from N(coefficients,C) evaluated as one matrix product per block of pixels
+        NaN where the covariance is unknown (two points, or a calibration typed in by hand)
+        '''
+        units=(unit,) if isinstance(unit,str) else tuple(unit)
+        xdata=np.asarray(xdata,dtype=float)
+        sigma=np.full((len(units),xdata.size),np.nan)
+        for name in units:
+            if name=='wavenumber' and self.laser_wavelength is None:
+                raise ValueError("Raman pump wavelength is needed for wavenumber axis")
+        if not np.all(np.isfinite(self.covariance)):
+            return sigma[0] if isinstance(unit,str) else sigma
+        if method=='linear':
+            jacobian=self.jacobian(xdata)
+            sigma_nm=np.sqrt(np.maximum(np.einsum('ij,jk,ik->i',jacobian,self.covariance,jacobian),0.0))
+            nm=self.nanometer(xdata)
+            derivative={'nm':1.0,'wavenumber':10.0**7/nm**2,'eV':h*c/J2eV/nm**2}
+            for row,name in enumerate(units):
+                sigma[row]=derivative[name]*sigma_nm
+        elif method=='montecarlo':
+            rng=np.random.default_rng(seed)
+            samples=rng.multivariate_normal(np.asarray(self.coefficients,dtype=float),self.covariance,draws)
+            for start in range(0,xdata.size,block):
+                nm=self.nanometer_draws(xdata[start:start+block],samples)
+                for row,name in enumerate(units):
+                    sigma[row,start:start+block]=self.from_nanometer(nm,name).std(axis=0,ddof=1)
+        else:
+            raise ValueError("Unknown uncertainty method: "+str(method))
+        return sigma[0] if isinstance(unit,str) else sigma
+
+    def wavenumber(self,xdata,laser_wavelength=None):
+        if laser_wavelength is None:
+            laser_wavelength=self.laser_wavelength
+        if laser_wavelength is None:
+            raise ValueError("Raman pump wavelength is needed for wavenumber axis")
+        return 10.0**7/float(laser_wavelength)-10.0**7/self.nanometer(xdata)
+
+    def eV(self,xdata):
+        return h*c/self.nanometer(xdata)/J2eV
+
+    def axes(self,xdata):
+        '''
+        CalibratedAxes of xdata, built once and handed out again while the pixel axis,
+        the coefficients and the pump wavelength stay the same
+        '''
+        xdata=np.asarray(xdata)
+        key=(tuple(self.coefficients),self.laser_wavelength,xdata.shape)
+        if self._axes is not None and self._axes[0]==key and np.array_equal(self._axes[1].xdata,xdata):
+            return self._axes[1]
+        axes=CalibratedAxes(self,xdata)
+        self._axes=(key,axes)
+        return axes
+
+    def axis(self,xdata,unit):
+        if unit=='nm':
+            return self.nanometer(xdata)
+        if unit=='wavenumber':
+            return self.wavenumber(xdata)
+        if unit=='eV':
+            return self.eV(xdata)
+        raise ValueError("Unknown unit: "+str(unit))
+
+class CalibratedAxes():
+    '''
+    nm, wavenumber (cm-1) and eV of every pixel, computed once into one (3,pixels) float64 buffer
+    nm/wavenumber/eV are views of its rows; wavenumber is NaN without a pump wavelength
+    treat as read-only, the same object serves every spectrum of the detector setup
+    '''
+    units=('nm','wavenumber','eV')
+
+    def __init__(self,calibration,xdata):
+        self.xdata=np.array(xdata)
+        self.laser_wavelength=calibration.laser_wavelength
+        self.buffer=np.empty((3,self.xdata.size))
+        self.nm,self.wavenumber,self.eV=self.buffer
+        self.nm[...]=calibration.nanometer(self.xdata)
+        if self.laser_wavelength is None:
+            self.wavenumber.fill(np.nan)
+        else:
+            np.divide(10.0**7,self.nm,out=self.wavenumber)
+            np.subtract(10.0**7/float(self.laser_wavelength),self.wavenumber,out=self.wavenumber)
+        np.divide(h*c/J2eV,self.nm,out=self.eV)
+
+    def axis(self,unit):
+        if unit not in self.units:
+            raise ValueError("Unknown unit: "+str(unit))
+        if unit=='wavenumber' and self.laser_wavelength is None:
+            raise ValueError("Raman pump wavelength is needed for wavenumber axis")
+        return getattr(self,unit)
+
+    def save_text(self,path,fmt="%.4e",sigma=None):
+        '''one row per pixel: nm wavenumber eV, then their 1 sigma when sigma (3,pixels) is given'''
+        header="nm wavenumber(cm-1) eV"
+        columns=self.buffer
+        if sigma is not None:
+            header=header+" sigma_nm sigma_wavenumber(cm-1) sigma_eV"
+            columns=np.vstack([self.buffer,sigma])
+        np.savetxt(path,columns.T,fmt=fmt,header=header+" laser_wavelength={0}".format(self.laser_wavelength))
+        return path
+
+    def save(self,path,sigma=None):
+        '''the whole (3,pixels) buffer as one binary .npy record, (6,pixels) with the 1 sigma rows'''
+        np.save(path,self.buffer if sigma is None else np.vstack([self.buffer,sigma]))
+        return path
+
+def _check_points(pixel_array,ref_array):
+    pixel_array=np.asarray(pixel_array,dtype=float)
+    ref_array=np.asarray(ref_array,dtype=float)
+    if pixel_array.size<=1 or ref_array.size<=1:
+        raise ValueError("Need at least two points to calibrate.")
+    if pixel_array.size!=ref_array.size:
+        raise ValueError("Pixel and wavelength lists differ in length")
+    return pixel_array,ref_array
+
+def linregress(x,y):
+    '''
+    slope,intercept,r value,two-sided p value,std err of slope, as scipy.stats.linregress
+    in numpy, scipy.special is loaded for the p value only (scipy.stats alone takes ~1 s to import)
+    '''
+    n=x.size
+    xmean=x.mean()
+    ymean=y.mean()
+    ssxm,ssxym,_,ssym=np.cov(x,y,bias=1).flat
+    if ssxm==0.0 or ssym==0.0:
+        r=np.nan if ssxym==0 else 0.0
+    else:
+        r=min(max(ssxym/np.sqrt(ssxm*ssym),-1.0),1.0)
+    slope=ssxym/ssxm
+    intercept=ymean-slope*xmean
+    if n==2: # two points: exact line
+        return slope,intercept,r,1.0 if y[0]==y[1] else 0.0,0.0
+    from scipy.special import stdtr
+    dof=n-2
+    tiny=1.0e-20
+    t=r*np.sqrt(dof/((1.0-r+tiny)*(1.0+r+tiny)))
+    p_value=2*stdtr(dof,-np.abs(t))
+    std_err=np.sqrt((1-r**2)*ssym/ssxm/dof)
+    return slope,intercept,r,p_value,std_err
+
+@profile.timed('calibrate')
+def calibrate_wavelength(pixel_array,wvlen_array,laser_wavelength=None):
+    '''linear regression of reference wavelengths (nm) against pixels'''
+    pixel_array,wvlen_array=_check_points(pixel_array,wvlen_array)
+    slope,intercept,r_value,p_value,std_err=linregress(pixel_array,wvlen_array)
+    cal_res="Calibration result:\n"+"slope: {0}\nintercept: {1}\nr value: {2}\np value: {3}\nstd err: {4}\n\n".format(slope,intercept,r_value,p_value,std_err)
+    cal_res=cal_res+"Pixel list:\n"+" ".join(str(item) for item in pixel_array)+'\n'
+    cal_res=cal_res+"Wavelength list:\n"+" ".join(str(item) for item in wvlen_array)+'\n'
+    # covariance of (slope,intercept) from the residual variance, undefined for two points
+    design=np.column_stack([pixel_array,np.ones_like(pixel_array)])
+    residual=wvlen_array-design.dot([slope,intercept])
+    dof=pixel_array.size-2
+    variance=residual.dot(residual)/dof if dof>0 else np.nan
+    covariance=variance*np.linalg.inv(design.T.dot(design))
+    return Calibration(slope,intercept,laser_wavelength,pixel_array,wvlen_array,cal_res,covariance)
+
+def cal_shift(x,k,b,l):
+    '''convert x(px) to y(cm-1) : px -> nm -> cm-1'''
+    y=1e-2*1e9*(1/l-1/(k*x+b))
+    return y
+
+@profile.timed('calibrate')
+def calibrate_shift(pixel_array,shift_array,laser_wavelength,iter_cb=None):
+    '''
+    fit slope and intercept (nm) to reference Raman shifts (cm-1) with the pump wavelength held fixed
+    iter_cb is passed to lmfit, see fit_peak
+    '''
+    pixel_array,shift_array=_check_points(pixel_array,shift_array)
+    from lmfit import Model
+    mdl=Model(cal_shift,prefix='cal_Shift_')
+    p0=mdl.make_params()
+    p0['cal_Shift_k'].set(value=1)
+    p0['cal_Shift_b'].set(value=1)
+    p0['cal_Shift_l'].set(value=float(laser_wavelength),vary=False)
+    result=mdl.fit(shift_array,x=pixel_array,params=p0,iter_cb=iter_cb)
+    if result.aborted:
+        raise ValueError("Calibration fit aborted")
+    p1=result.params
+    cal_res=result.fit_report()
+    cal_res=cal_res+"\nPixel list:\n"+" ".join(str(item) for item in pixel_array)+'\n'
+    cal_res=cal_res+"Raman shift list:\n"+" ".join(str(item) for item in shift_array)+'\n'
+    covariance=result.covar if result.covar is not None else None # lmfit order: k,b
+    return Calibration(p1['cal_Shift_k'].value,p1['cal_Shift_b'].value,float(laser_wavelength),pixel_array,shift_array,
+                       cal_res,covariance,'shift')
+
+class PolynomialCalibration(Calibration):
+    '''
+    nm = sum coefficients[k]*t**k with t=(pixel-center)/scale, centering keeps the fit well conditioned
+    slope/intercept hold the tangent line at the center pixel
+    '''
+    model='polynomial'
+
+    def __init__(self,coefficients,center=0.0,scale=1.0,laser_wavelength=None,pixel_array=None,ref_array=None,
+                 report='',covariance=None,mode='wavelength'):
+        self.poly_coefficients=np.asarray(coefficients,dtype=float)
+        self.center=float(center)
+        self.scale=float(scale)
+        slope=self.poly_coefficients[1]/self.scale if self.poly_coefficients.size>1 else 0.0
+        Calibration.__init__(self,slope,self.poly_coefficients[0]-slope*self.center,laser_wavelength,pixel_array,
+                             ref_array,report,None,mode)
+        size=self.poly_coefficients.size
+        self.covariance=np.full((size,size),np.nan) if covariance is None else np.asarray(covariance,dtype=float)
+
+    @property
+    def coefficients(self):
+        return self.poly_coefficients
+
+    def options(self):
+        return {'center':self.center,'scale':self.scale}
+
+    @classmethod
+    def from_coefficients(cls,coefficients,options,**common):
+        return cls(coefficients,options['center'],options['scale'],**common)
+
+    def design(self,xdata):
+        '''d nm/d coefficients, (pixels,order+1)'''
+        return np.vander((np.asarray(xdata,dtype=float)-self.center)/self.scale,self.poly_coefficients.size,increasing=True)
+
+    def jacobian(self,xdata):
+        return self.design(xdata)
+
+    def nanometer(self,xdata):
+        t=(np.asarray(xdata,dtype=float)-self.center)/self.scale
+        return np.polynomial.polynomial.polyval(t,self.poly_coefficients)
+
+def _weights(weights,size):
+    if weights is None:
+        return np.ones(size)
+    weights=np.asarray(weights,dtype=float)
+    if weights.shape!=(size,) or (weights<0).any():
+        raise ValueError("Need one non-negative weight per calibration point")
+    return weights
+
+@profile.timed('calibrate')
+def calibrate_polynomial(pixel_array,wvlen_array,order=2,weights=None,laser_wavelength=None):
+    '''
+    weighted least squares polynomial of the given order, solved in closed form through QR
+    weights multiply the squared residuals (1/sigma^2 of each line)
+    '''
+    pixel_array,wvlen_array=_check_points(pixel_array,wvlen_array)
+    if pixel_array.size<order+1:
+        raise ValueError("Need at least {0} points for a polynomial of order {1}".format(order+1,order))
+    weights=_weights(weights,pixel_array.size)
+    center=pixel_array.mean()
+    scale=max(np.ptp(pixel_array)/2,1.0)
+    design=np.vander((pixel_array-center)/scale,order+1,increasing=True)
+    root=np.sqrt(weights)
+    Q,R=np.linalg.qr(design*root[:,None])
+    coefficients=np.linalg.solve(R,Q.T.dot(wvlen_array*root))
+    residual=wvlen_array-design.dot(coefficients)
+    dof=pixel_array.size-order-1
+    variance=(weights*residual**2).sum()/dof if dof>0 else np.nan
+    R_inverse=np.linalg.inv(R)
+    covariance=variance*R_inverse.dot(R_inverse.T)
+    cal_res="Calibration result (polynomial, order {0}):\n".format(order)
+    cal_res=cal_res+"".join("a{0}: {1} +/- {2}\n".format(k,value,np.sqrt(covariance[k,k])) for k,value in enumerate(coefficients))
+    cal_res=cal_res+"t = (pixel - {0})/{1}\nrms residual (nm): {2}\n\n".format(center,scale,np.sqrt(np.mean(residual**2)))
+    cal_res=cal_res+"Pixel list:\n"+" ".join(str(item) for item in pixel_array)+'\n'
+    cal_res=cal_res+"Wavelength list:\n"+" ".join(str(item) for item in wvlen_array)+'\n'
+    return PolynomialCalibration(coefficients,center,scale,laser_wavelength,pixel_array,wvlen_array,cal_res,covariance)
+
+class GratingCalibration(Calibration):
+    '''
+    grating equation of a Czerny-Turner spectrograph with a tilted flat detector
+        m*nm = d*(sin(alpha)+sin(beta)),  d=1e6/groove_density (nm)
+        alpha = psi+included_angle/2,  beta = psi-included_angle/2+atan(u*cos(tilt)/(focal_length+u*sin(tilt)))
+        u = (pixel-center_pixel)*pixel_width
+    fitted parameters are (psi (rad),focal_length (mm),tilt (rad)); groove density (1/mm), diffraction order,
+    pixel width (mm, negative for a reversed detector) and included angle (rad) are fixed
+    slope/intercept hold the tangent line at the center pixel
+    '''
+    model='grating'
+
+    def __init__(self,parameters,groove_density,diffraction_order=1,pixel_width=0.026,included_angle=0.0,
+                 center_pixel=0.0,laser_wavelength=None,pixel_array=None,ref_array=None,report='',covariance=None,
+                 mode='wavelength'):
+        self.parameters=np.asarray(parameters,dtype=float)
+        self.groove_density=float(groove_density)
+        self.diffraction_order=int(diffraction_order)
+        self.pixel_width=float(pixel_width)
+        self.included_angle=float(included_angle)
+        self.center_pixel=float(center_pixel)
+        nm,jacobian,slope=self.evaluate(np.array([self.center_pixel]))
+        Calibration.__init__(self,slope[0],nm[0]-slope[0]*self.center_pixel,laser_wavelength,pixel_array,ref_array,
+                             report,None,mode)
+        self.covariance=np.full((3,3),np.nan) if covariance is None else np.asarray(covariance,dtype=float)
+
+    @property
+    def coefficients(self):
+        return self.parameters
+
+    def options(self):
+        return {'groove_density':self.groove_density,'diffraction_order':self.diffraction_order,
+                'pixel_width':self.pixel_width,'included_angle':self.included_angle,'center_pixel':self.center_pixel}
+
+    @classmethod
+    def from_coefficients(cls,coefficients,options,**common):
+        return cls(coefficients,**dict(options,**common))
+
+    def evaluate(self,xdata,parameters=None):
+        '''nm, analytic Jacobian d nm/d (psi,focal_length,tilt) and d nm/d pixel'''
+        psi,focal_length,tilt=self.parameters if parameters is None else parameters
+        spacing=1e6/self.groove_density/self.diffraction_order
+        u=(np.asarray(xdata,dtype=float)-self.center_pixel)*self.pixel_width
+        numerator=u*np.cos(tilt)
+        denominator=focal_length+u*np.sin(tilt)
+        norm=numerator**2+denominator**2
+        alpha=psi+self.included_angle/2
+        beta=psi-self.included_angle/2+np.arctan2(numerator,denominator)
+        nm=spacing*(np.sin(alpha)+np.sin(beta))
+        jacobian=np.column_stack([spacing*(np.cos(alpha)+np.cos(beta)),
+                                  spacing*np.cos(beta)*(-numerator/norm),
+                                  spacing*np.cos(beta)*(-u*focal_length*np.sin(tilt)-u**2)/norm])
+        slope=spacing*np.cos(beta)*focal_length*np.cos(tilt)/norm*self.pixel_width
+        return nm,jacobian,slope
+
+    def nanometer(self,xdata):
+        return self.evaluate(xdata)[0]
+
+    def jacobian(self,xdata):
+        return self.evaluate(xdata)[1]
+
+    def nanometer_draws(self,xdata,draws):
+        '''the grating equation is not linear in its parameters, evaluate all draws by broadcasting'''
+        return self.evaluate(xdata,np.asarray(draws,dtype=float).T[:,:,None])[0]
+
+@profile.timed('calibrate')
+def calibrate_grating(pixel_array,wvlen_array,groove_density,diffraction_order=1,pixel_width=0.026,
+                      included_angle=0.0,center_pixel=None,weights=None,laser_wavelength=None,
+                      fit_tilt=True,max_iter=20,tol=1e-12):
+    '''
+    fit the grating equation by Gauss-Newton with the analytic Jacobian, started from the linear fit
+    converges in a handful of iterations; fit_tilt=False keeps the detector square to the beam
+    '''
+    pixel_array,wvlen_array=_check_points(pixel_array,wvlen_array)
+    nfree=3 if fit_tilt else 2
+    if pixel_array.size<nfree:
+        raise ValueError("Need at least {0} points for the grating model".format(nfree))
+    weights=_weights(weights,pixel_array.size)
+    if center_pixel is None:
+        center_pixel=pixel_array.mean()
+    slope,intercept=np.polyfit(pixel_array,wvlen_array,1)
+    pixel_width=abs(pixel_width)*np.sign(slope) # reversed detector
+    spacing=1e6/groove_density/diffraction_order
+    center_nm=slope*center_pixel+intercept
+    psi=np.arcsin(center_nm/(2*spacing*np.cos(included_angle/2)))
+    focal_length=spacing*np.cos(psi-included_angle/2)*pixel_width/slope
+    calibration=GratingCalibration([psi,focal_length,0.0],groove_density,diffraction_order,pixel_width,
+                                   included_angle,center_pixel)
+    root=np.sqrt(weights)
+    for iteration in range(max_iter):
+        nm,jacobian,dispersion=calibration.evaluate(pixel_array)
+        residual=(wvlen_array-nm)*root
+        step=np.linalg.lstsq(jacobian[:,:nfree]*root[:,None],residual,rcond=None)[0]
+        calibration.parameters[:nfree]+=step
+        if np.all(np.abs(step)<=tol*(np.abs(calibration.parameters[:nfree])+tol)):
+            break
+    nm,jacobian,dispersion=calibration.evaluate(pixel_array)
+    residual=wvlen_array-nm
+    dof=pixel_array.size-nfree
+    variance=(weights*residual**2).sum()/dof if dof>0 else np.nan
+    covariance=np.zeros((3,3))
+    weighted=jacobian[:,:nfree]*root[:,None]
+    covariance[:nfree,:nfree]=variance*np.linalg.pinv(weighted.T.dot(weighted))
+    psi,focal_length,tilt=calibration.parameters
+    cal_res="Calibration result (grating equation, {0} iterations):\n".format(iteration+1)
+    cal_res=cal_res+"angle (deg): {0}\nfocal length (mm): {1}\ndetector tilt (deg): {2}\n".format(np.degrees(psi),focal_length,np.degrees(tilt))
+    cal_res=cal_res+"groove density: {0}\nrms residual (nm): {1}\n\n".format(groove_density,np.sqrt(np.mean(residual**2)))
+    cal_res=cal_res+"Pixel list:\n"+" ".join(str(item) for item in pixel_array)+'\n'
+    cal_res=cal_res+"Wavelength list:\n"+" ".join(str(item) for item in wvlen_array)+'\n'
+    return GratingCalibration(calibration.parameters,groove_density,diffraction_order,pixel_width,included_angle,
+                              center_pixel,laser_wavelength,pixel_array,wvlen_array,cal_res,covariance)
+
+calibration_models={'linear':Calibration,'polynomial':PolynomialCalibration,'grating':GratingCalibration}
+
+def calibrate(pixel_array,ref_array,mode='wavelength',laser_wavelength=None,model='linear',**options):
+    '''
+    mode is 'wavelength' (ref in nm) or 'shift' (ref in cm-1)
+    model is 'linear', 'polynomial' (options: order, weights) or 'grating' (options: groove_density, ...)
+    polynomial and grating fits with Raman shifts run in nm, through the pump wavelength
+    robust=True rejects outlying pairs first, see calibrate_robust
+    '''
+    if options.pop('robust',False):
+        return calibrate_robust(pixel_array,ref_array,mode,laser_wavelength,model,**options)
+    if mode not in ['wavelength','shift']:
+        raise ValueError("Unknown calibration mode: "+str(mode))
+    if mode=='shift' and laser_wavelength is None:
+        raise ValueError("Raman pump wavelength is needed to calibrate with Raman shift")
+    if model=='linear':
+        if mode=='wavelength':
+            return calibrate_wavelength(pixel_array,ref_array,laser_wavelength)
+        return calibrate_shift(pixel_array,ref_array,laser_wavelength)
+    if model not in ['polynomial','grating']:
+        raise ValueError("Unknown dispersion model: "+str(model))
+    wvlen_array=ref_array if mode=='wavelength' else shift_to_wavelength(ref_array,laser_wavelength)
+    fit={'polynomial':calibrate_polynomial,'grating':calibrate_grating}[model]
+    calibration=fit(pixel_array,wvlen_array,laser_wavelength=laser_wavelength,**options)
+    if mode=='shift':
+        calibration.ref_array=np.asarray(ref_array,dtype=float)
+        calibration.mode='shift'
+    return calibration
+
+def _subsets(count,size,hypotheses,rng):
+    '''(hypotheses,size) index sets: all combinations when there are few enough, random distinct ones otherwise'''
+    from math import comb
+    if comb(count,size)<=hypotheses:
+        from itertools import combinations
+        return np.array(list(combinations(range(count),size)),dtype=int).reshape(-1,size)
+    return np.argsort(rng.random((hypotheses,count)),axis=1)[:,:size]
+
+def _hypotheses(pixel_array,wvlen_array,model,subsets,options):
+    '''nm predicted at every point by the model through each subset, (hypotheses,points); failed fits dropped'''
+    if model in ['linear','polynomial']:
+        size=subsets.shape[1]
+        center=pixel_array.mean()
+        scale=max(np.ptp(pixel_array)/2,1.0)
+        t=(pixel_array-center)/scale
+        design=np.vander(t,size,increasing=True)
+        systems=design[subsets] # (hypotheses,size,size)
+        solvable=np.abs(np.linalg.det(systems))>1e-12
+        coefficients=np.linalg.solve(systems[solvable],wvlen_array[subsets[solvable]][...,None])[...,0]
+        return coefficients.dot(design.T)
+    options=dict(options,center_pixel=pixel_array.mean())
+    options.pop('weights',None)
+    predicted=[]
+    for subset in subsets:
+        try:
+            with np.errstate(invalid='ignore'):
+                calibration=calibrate_grating(pixel_array[subset],wvlen_array[subset],**options)
+        except (ValueError,np.linalg.LinAlgError):
+            continue
+        nm=calibration.nanometer(pixel_array)
+        if np.all(np.isfinite(nm)):
+            predicted.append(nm)
+    return np.array(predicted).reshape(-1,pixel_array.size)
+
+@profile.timed('ransac')
+def ransac_model(pixel_array,wvlen_array,model='linear',threshold=None,hypotheses=2000,seed=0,min_residual=0.1,**options):
+    '''
+    inlier mask of the best dispersion model through a minimal set of the points:
+    2 for a line, order+1 for a polynomial (exact Vandermonde solves, batched), 3 for the grating equation
+    (Gauss-Newton per set, at most grating_hypotheses sets); every hypothesis is scored on all points
+    as one (hypotheses,points) residual array
+    threshold (nm) scores by truncated squared residual (MSAC); None takes the least median of squares model
+    and derives the threshold from its robust scale, 2.5 sigma but at least min_residual pixels
+    '''
+    count=pixel_array.size
+    size={'linear':2,'polynomial':options.get('order',2)+1,'grating':3}[model]
+    if model=='grating':
+        hypotheses=min(hypotheses,options.pop('grating_hypotheses',200))
+    rng=np.random.default_rng(seed)
+    predicted=_hypotheses(pixel_array,wvlen_array,model,_subsets(count,size,hypotheses,rng),options)
+    if predicted.shape[0]==0:
+        return np.ones(count,dtype=bool)
+    squared=(wvlen_array[None,:]-predicted)**2
+    if threshold is None:
+        half=min(count//2+size-1,count-1) # h-th smallest residual, h=(n+p+1)/2
+        median=np.partition(squared,half,axis=1)[:,half]
+        best=np.argmin(median)
+        dispersion=abs(np.ptp(predicted[best])/np.ptp(pixel_array)) # nm per pixel
+        threshold=max(2.5*1.4826*(1+5.0/max(count-size,1))*np.sqrt(median[best]),min_residual*dispersion)
+    else:
+        best=np.argmin(np.minimum(squared,threshold**2).sum(axis=1))
+    return squared[best]<=threshold**2
+
+def ransac_line(pixel_array,wvlen_array,threshold=None,hypotheses=2000,seed=0,min_residual=0.1):
+    '''inlier mask of the best straight line through two of the points, see ransac_model'''
+    return ransac_model(pixel_array,wvlen_array,'linear',threshold,hypotheses,seed,min_residual)
+
+def _leverage(pixel_array,kept,size):
+    '''
+    x'(X'X)^-1 x of every pair for a polynomial with size terms fitted to the kept pairs,
+    the hat matrix diagonal for those; the grating equation is taken as its quadratic
+    '''
+    center=pixel_array[kept].mean()
+    scale=max(np.ptp(pixel_array)/2,1.0)
+    design=np.vander((pixel_array-center)/scale,size,increasing=True)
+    r=np.linalg.qr(design[kept],mode='r')
+    return np.sum(np.linalg.solve(r.T,design.T)**2,axis=0)
+
+def calibrate_robust(pixel_array,ref_array,mode='wavelength',laser_wavelength=None,model='linear',threshold=None,
+                     clip=3.0,hypotheses=2000,seed=0,max_iter=10,min_residual=0.1,**options):
+    '''
+    calibrate() with outlying pairs (wrong reference line, blended peak) rejected
+    RANSAC with the requested model (ransac_model) picks the first inliers, then the model is refitted and
+    every pair, rejected ones included, is tested again against it: pairs further than clip x residual
+    standard deviation are rejected, the others (re)admitted, until the set stops changing; the deviation is
+    scaled by the leverage of each pair, so lines far outside the kept ones (predicted, not fitted) are not
+    rejected for the extrapolation error
+    pairs within min_residual pixels of the fit are never rejected, so few exact points do not clip each other
+    residuals are in nm, Raman shifts are converted with the pump wavelength
+    the calibration's rejected attribute is the mask of rejected input points, listed in its report
+    '''
+    pixel_array,ref_array=_check_points(pixel_array,ref_array)
+    if mode=='shift' and laser_wavelength is None:
+        raise ValueError("Raman pump wavelength is needed to calibrate with Raman shift")
+    wvlen_array=ref_array if mode!='shift' else shift_to_wavelength(ref_array,laser_wavelength)
+    minimum={'linear':2,'polynomial':options.get('order',2)+1,'grating':3}.get(model,2)
+    kept=ransac_model(pixel_array,wvlen_array,model,threshold,hypotheses,seed,min_residual,**options)
+    if kept.sum()<minimum:
+        kept=np.ones(pixel_array.size,dtype=bool)
+    for iteration in range(max_iter):
+        calibration=calibrate(pixel_array[kept],ref_array[kept],mode,laser_wavelength,model,**options)
+        residual=wvlen_array-calibration.nanometer(pixel_array)
+        dof=kept.sum()-minimum
+        if dof<=0:
+            break
+        sigma=np.sqrt(np.sum(residual[kept]**2)/dof)
+        leverage=_leverage(pixel_array,kept,minimum)
+        spread=np.sqrt(np.where(kept,np.maximum(1-leverage,0),1+leverage)) # fitted or predicted residual scale
+        limit=np.maximum(clip*sigma*spread,min_residual*abs(calibration.slope))
+        new=np.abs(residual)<=limit
+        if new.sum()<minimum or np.array_equal(new,kept):
+            break
+        kept=new
+    else: # still changing, refit on the last set
+        calibration=calibrate(pixel_array[kept],ref_array[kept],mode,laser_wavelength,model,**options)
+    calibration.rejected=~kept
+    if calibration.rejected.any():
+        calibration.report=calibration.report+"Rejected (pixel, reference):\n"+"".join(
+            "{0} {1}\n".format(pixel,ref) for pixel,ref in zip(pixel_array[~kept],ref_array[~kept]))
+    return calibration
+
+#---display
+def decimate_minmax(xdata,ydata,low,high,width):
+    '''
+    points to draw for the x-range [low,high] on a plot `width` pixels wide
+    the range is cut into about width buckets and each keeps its min and max point in order,
+    so peaks and spikes survive while at most ~2*width points reach the plot
+    one point beyond each end is kept so the curve runs to the edges; small ranges come back as is
+    xdata must be monotonic
+    '''
+    xdata=np.asarray(xdata)
+    ydata=np.asarray(ydata)
+    width=max(int(width),1)
+    if xdata.size>1 and xdata[0]>xdata[-1]: # descending axis
+        index=xdata.size-1-decimate_index(xdata[::-1],ydata[::-1],low,high,width)[::-1]
+    else:
+        index=decimate_index(xdata,ydata,low,high,width)
+    return xdata[index],ydata[index]
+
+def decimate_index(xdata,ydata,low,high,width):
+    '''indices kept by decimate_minmax, for an ascending xdata'''
+    if low>high:
+        low,high=high,low
+    start=max(np.searchsorted(xdata,low,side='left')-1,0)
+    stop=min(np.searchsorted(xdata,high,side='right')+1,xdata.size)
+    count=stop-start
+    if count<=2*width:
+        return np.arange(start,stop)
+    size=count//width
+    nbucket=count//size
+    body=ydata[start:start+nbucket*size].reshape(nbucket,size)
+    base=start+np.arange(nbucket)*size
+    pairs=np.sort(np.column_stack([base+body.argmin(axis=1),base+body.argmax(axis=1)]),axis=1).ravel()
+    tail=start+nbucket*size
+    if tail<stop:
+        rest=ydata[tail:stop]
+        pairs=np.concatenate([pairs,np.sort([tail+rest.argmin(),tail+rest.argmax()])])
+    return np.concatenate([[start],pairs,[stop-1]])
+
+#---output
+def uniform_grid(start,stop,step):
+    '''common axis start, start+step, ... up to stop included, as the --grid START STOP STEP options mean it'''
+    return np.arange(start,stop+step/2.0,step)
+
+def axes_sigma(calibration,xdata,method='linear'):
+    '''(3,pixels) 1 sigma of nm, wavenumber and eV; the wavenumber row stays NaN without a pump wavelength, like the axis'''
+    units=[name for name in CalibratedAxes.units if name!='wavenumber' or calibration.laser_wavelength is not None]
+    sigma=np.full((3,np.size(xdata)),np.nan)
+    sigma[[CalibratedAxes.units.index(name) for name in units]]=calibration.uncertainty(xdata,units,method)
+    return sigma
+
+@profile.timed('export')
+def save_cal(spectrum_file_path,xdata,calibration,unit,uncertainty=None):
+    '''
+    write calibrated axis next to the spectrum file, returns the path written
+    unit 'nm', 'wavenumber' or 'eV' for one axis; 'axes' for all three as text columns, 'axes_npy' as one binary record,
+    'npz' for axes and calibration in one binary container (RamanCal_container)
+    the axes come from calibration.axes(), so saving several units computes them once
+    uncertainty 'linear' or 'montecarlo' adds the 1 sigma of every axis, see Calibration.uncertainty
+    '''
+    calibration_file_path=cal_file_path(spectrum_file_path,unit)
+    axes=calibration.axes(xdata)
+    if unit=='npz':
+        import RamanCal_container # imports this module itself
+        return RamanCal_container.save_container(calibration_file_path,calibration,xdata,uncertainty=uncertainty)
+    sigma=None
+    if unit in ['axes','axes_npy']:
+        if uncertainty is not None:
+            sigma=axes_sigma(calibration,xdata,uncertainty)
+        if unit=='axes': # nm, wavenumber and eV columns in one file
+            return axes.save_text(calibration_file_path,sigma=sigma)
+        return axes.save(calibration_file_path,sigma)
+    columns=axes.axis(unit)
+    if uncertainty is not None:
+        columns=np.column_stack([columns,calibration.uncertainty(xdata,unit,uncertainty)])
+    np.savetxt(calibration_file_path,columns,fmt="%.4e")
+    return calibration_file_path
+
+def save_fitting_results(spectrum_file_path,calibration):
+    calibration_file_path=cal_file_path(spectrum_file_path,'fit')
+    with open(calibration_file_path,'w') as f:
+        f.write(calibration.report)
+    return calibration_file_path
+
+def calibrate_file(spectrum_file_path,pixel_guesses,ref_array,mode='wavelength',laser_wavelength=None,
+                   window=10,units=('nm','wavenumber','eV'),calibration=None,model_options=None,uncertainty=None,
+                   preprocess=None):
+    '''
+    load -> (preprocess -> fit peaks -> calibrate) -> save, for one spectrum file
+    model_options selects the dispersion model, e.g. {'model':'polynomial','order':3}, see calibrate()
+    pixel_guesses=None detects the peaks and matches them to ref_array automatically (RamanCal_match)
+    with calibration given (e.g. from a lamp spectrum) fitting is skipped and it is applied as is
+    uncertainty adds 1 sigma columns to the outputs, see save_cal
+    preprocess cleans the spectrum before its peaks are fitted, e.g. a RamanCal_preprocess.Pipeline;
+    the outputs only hold axes, so it is not run when calibration is given
+    returns (calibration,list of written paths)
+    '''
+    xdata,ydata=load_spectrum(spectrum_file_path)
+    if calibration is None:
+        if preprocess is not None:
+            ydata=preprocess(ydata)
+        if pixel_guesses is None:
+            import RamanCal_match # imports this module itself
+            calibration=RamanCal_match.auto_calibrate(xdata,ydata,ref_array,mode,laser_wavelength,model_options)
+        else:
+            pixel_array=fit_peaks(xdata,ydata,pixel_guesses,window)
+            calibration=calibrate(pixel_array,ref_array,mode,laser_wavelength,**(model_options or {}))
+    written=[save_cal(spectrum_file_path,xdata,calibration,unit,uncertainty) for unit in units]
+    return calibration,written
@@ -0,0 +1,179 @@
+'''
+RamanCal drift
+drift tracking of a detector across a run from periodic lamp frames
+
+Each new lamp frame is compared with a stored reference frame instead of being fitted again:
+the detector is cut into segments, every segment is cross-correlated with the reference by FFT
+(all segments in one batched transform) and the correlation peak is interpolated to subpixel.
+A straight line through the segment shifts gives shift and stretch, a feature at reference pixel p
+now sits at p'=p+shift+stretch*(p-center), so the reference calibration is evaluated at p(p').
+When the warped frame no longer matches the reference (residual above refit_threshold, or a shift
+beyond max_shift) the frame is fitted from scratch and becomes the new reference.
+
+    tracker=DriftTracker(xdata,lamp_ydata,calibration,ref_values=lines)
+    for ydata in lamp_frames:
+        calibration,info=tracker.track(ydata)   # info: shift, stretch, residual, refit
+
+    python RamanCal_drift.py lamp_000.txt "run/lamp_*.txt" --ref Wavelength_Ref_Ne.txt --section "for 1200g633nm"
+'''
+#----------------
+import sys
+import glob
+import argparse
+import numpy as np
+import RamanCal_core as core
+#----------------
+def _normalize(ydata):
+    '''remove the median background and scale to unit norm along the last axis'''
+    ydata=np.asarray(ydata,dtype=float)
+    ydata=ydata-np.median(ydata,axis=-1,keepdims=True)
+    norm=np.sqrt(np.sum(ydata**2,axis=-1,keepdims=True))
+    return ydata/np.where(norm>0,norm,1.0)
+
+def segment_shifts(reference,frame,segments=4,max_shift=None):
+    '''
+    subpixel shift of every segment of frame against reference (index units, positive: features moved up)
+    returns shift, correlation peak height (0..1) and segment center index, all (segments,)
+    '''
+    npixel=reference.size
+    length=npixel//segments
+    starts=np.arange(segments)*length
+    index=starts[:,None]+np.arange(length)
+    a=_normalize(reference[index])
+    b=_normalize(frame[index])
+    size=2*length # zero padded, no wrap-around
+    correlation=np.fft.irfft(np.conj(np.fft.rfft(a,size))*np.fft.rfft(b,size),size)
+    correlation=np.fft.fftshift(correlation,axes=-1) # lag 0 at column length
+    lags=np.arange(size)-length
+    if max_shift is not None:
+        correlation[:,np.abs(lags)>max_shift]=-np.inf
+    peak=np.clip(np.argmax(correlation,axis=1),1,size-2)
+    rows=np.arange(segments)
+    left,center,right=correlation[rows,peak-1],correlation[rows,peak],correlation[rows,peak+1]
+    curvature=left-2*center+right
+    with np.errstate(invalid='ignore',divide='ignore'):
+        offset=np.where(np.isfinite(curvature)&(curvature<0),0.5*(left-right)/curvature,0.0)
+    return lags[peak]+np.clip(offset,-0.5,0.5),center,starts+(length-1)/2.0
+
+def remap_pixels(calibration,scale,offset):
+    '''calibration of the new frame: nm(p') of the old calibration at p=scale*p'+offset'''
+    common=dict(laser_wavelength=calibration.laser_wavelength,pixel_array=calibration.pixel_array,
+                ref_array=calibration.ref_array,report=calibration.report,mode=calibration.mode)
+    if calibration.model=='linear':
+        return core.Calibration(calibration.slope*scale,calibration.intercept+calibration.slope*offset,**common)
+    options=dict(calibration.options())
+    if calibration.model=='polynomial':
+        options['center']=(options['center']-offset)/scale
+        options['scale']=options['scale']/scale
+    elif calibration.model=='grating':
+        options['center_pixel']=(options['center_pixel']-offset)/scale
+        options['pixel_width']=options['pixel_width']*scale
+    else:
+        raise ValueError("Cannot remap calibration model: "+str(calibration.model))
+    return type(calibration).from_coefficients(calibration.coefficients,options,**common)
+
+class DriftTracker():
+    def __init__(self,xdata,ydata,calibration,ref_values=None,mode='wavelength',laser_wavelength=None,
+                 refit=None,segments=4,max_shift=50,min_peak=0.3,refit_threshold=0.3):
+        '''
+        xdata/ydata/calibration: reference lamp frame and its calibration
+        refit(xdata,ydata) -> Calibration is the full fit, by default RamanCal_match.auto_calibrate on ref_values
+        min_peak: segments correlating worse than this are left out of the shift/stretch line
+        refit_threshold: sqrt(1-r^2) of the warped frame against the reference above which the frame is refitted
+        '''
+        self.xdata=np.asarray(xdata,dtype=float)
+        self.step=(self.xdata[-1]-self.xdata[0])/(self.xdata.size-1) # x units per index
+        self.ref_values=ref_values
+        self.mode=mode
+        self.laser_wavelength=laser_wavelength
+        self.refit=refit
+        self.segments=segments
+        self.max_shift=max_shift
+        self.min_peak=min_peak
+        self.refit_threshold=refit_threshold
+        self.set_reference(ydata,calibration)
+
+    def set_reference(self,ydata,calibration):
+        self.reference=np.asarray(ydata,dtype=float)
+        self.reference_normalized=_normalize(self.reference)
+        self.calibration=calibration
+
+    def measure(self,ydata):
+        '''shift (x units at the detector center), stretch (relative) and residual of a frame'''
+        ydata=np.asarray(ydata,dtype=float)
+        shifts,peaks,centers=segment_shifts(self.reference,ydata,self.segments,self.max_shift)
+        good=peaks>=self.min_peak
+        if good.sum()>=2:
+            stretch,shift=np.polyfit(centers[good]-self.xdata.size/2.0,shifts[good],1,w=peaks[good])
+        elif good.any():
+            stretch,shift=0.0,float(np.average(shifts[good],weights=peaks[good]))
+        else:
+            return np.nan,np.nan,np.inf
+        # warp the frame back onto the reference indices and compare
+        index=np.arange(self.xdata.size,dtype=float)
+        moved=index+shift+stretch*(index-self.xdata.size/2.0)
+        inside=(moved>=0)&(moved<=self.xdata.size-1)
+        warped=_normalize(np.interp(moved[inside],index,ydata))
+        correlation=np.dot(warped,_normalize(self.reference[inside]))
+        residual=np.sqrt(max(1.0-correlation**2,0.0))
+        return shift*self.step,stretch,residual
+
+    def _refit(self,ydata):
+        if self.refit is not None:
+            return self.refit(self.xdata,ydata)
+        if self.ref_values is None:
+            raise ValueError("Frame drifted beyond tracking and no reference lines to refit with")
+        import RamanCal_match
+        calibration=RamanCal_match.auto_calibrate(self.xdata,ydata,self.ref_values,self.mode,self.laser_wavelength)
+        calibration.laser_wavelength=self.laser_wavelength
+        return calibration
+
+    def track(self,ydata):
+        '''
+        calibration of a new lamp frame and {'shift','stretch','residual','refit'}
+        a refitted frame becomes the new reference
+        '''
+        shift,stretch,residual=self.measure(ydata)
+        lost=not np.isfinite(shift) or (self.max_shift is not None and abs(shift/self.step)>=self.max_shift)
+        if lost or residual>self.refit_threshold:
+            calibration=self._refit(ydata)
+            self.set_reference(ydata,calibration)
+            return calibration,{'shift':shift,'stretch':stretch,'residual':residual,'refit':True}
+        # p'=p+shift+stretch*(p-center) in x units -> p=(p'-shift+stretch*center)/(1+stretch)
+        center=self.xdata[0]+self.step*self.xdata.size/2.0
+        scale=1.0/(1.0+stretch)
+        calibration=remap_pixels(self.calibration,scale,(stretch*center-shift)*scale)
+        return calibration,{'shift':shift,'stretch':stretch,'residual':residual,'refit':False}
+
+def make_parser():
+    parser=argparse.ArgumentParser(description="Track detector drift over lamp frames against a reference frame")
+    parser.add_argument('reference',help="reference lamp spectrum, calibrated automatically against --ref")
+    parser.add_argument('frames',nargs='+',help="later lamp spectra, files or glob patterns")
+    parser.add_argument('--ref',required=True,help="reference wavelength/Raman shift file")
+    parser.add_argument('--section',default=None)
+    parser.add_argument('--mode',choices=['wavelength','shift'],default='wavelength')
+    parser.add_argument('--laser',type=float,default=632.82,help="Raman pump wavelength (nm)")
+    parser.add_argument('--segments',type=int,default=4)
+    parser.add_argument('--max-shift',type=float,default=50,help="pixels")
+    parser.add_argument('--threshold',type=float,default=0.3,help="residual above which a frame is refitted")
+    return parser
+
+def main(argv=None):
+    args=make_parser().parse_args(argv)
+    import RamanCal_match
+    import RamanCal_refs
+    ref_values=RamanCal_refs.library_values(args.ref,args.section)
+    xdata,ydata=core.load_spectrum(args.reference)
+    calibration=RamanCal_match.auto_calibrate(xdata,ydata,ref_values,args.mode,args.laser)
+    calibration.laser_wavelength=args.laser
+    tracker=DriftTracker(xdata,ydata,calibration,ref_values,args.mode,args.laser,segments=args.segments,
+                         max_shift=args.max_shift,refit_threshold=args.threshold)
+    print("frame\tslope\tintercept\tshift\tstretch\tresidual\trefit")
+    for path in sorted(path for pattern in args.frames for path in glob.glob(pattern)):
+        calibration,info=tracker.track(core.load_spectrum(path)[1])
+        print("{0}\t{1}\t{2}\t{3:.4f}\t{4:.3e}\t{5:.4f}\t{6}".format(path,calibration.slope,calibration.intercept,
+              info['shift'],info['stretch'],info['residual'],info['refit']))
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,787 @@
+'''
+RamanCal gui
+Qt interface of RamanCal_07.py built with guidata and guiqwt
+
+Imported by RamanCal_07.SpectroCal() when the window is built, so scripts importing
+RamanCal_07 or the engine modules never load Qt.
+'''
+#----------------
+import re
+from guidata.qt.QtGui import QApplication,QWidget, QFileDialog,QPushButton,QMainWindow,QListWidget,QLabel, QTextBrowser,QLineEdit,QCheckBox#, QVBoxLayout, QHBoxLayout
+from guidata.qt.QtCore import QRect,QObject,QRunnable,QThreadPool,Signal
+#---Import plot widget base class
+from guiqwt.curve import CurvePlot
+from guiqwt.plot import PlotManager
+from guiqwt.builder import make
+#from guidata.configtools import get_icon
+#---
+import numpy as np
+import RamanCal_core as core # GUI-free load/fit/calibrate/save, also used by RamanCal_batch.py
+import RamanCal_match as match
+import RamanCal_refs as refs
+import RamanCal_session as session
+import RamanCal_profile as profile
+import RamanCal_preprocess as preprocess
+#----------------
+class WorkerSignals(QObject):
+    '''lives in the GUI thread, so slots connected to it run there'''
+    progress=Signal(str)
+    finished=Signal(object)
+    failed=Signal(str)
+
+class Worker(QRunnable):
+    '''
+    runs job(progress,cancelled) on a QThreadPool thread
+    progress(message) reports to the status bar, cancelled() is True once cancel() was called
+    '''
+    def __init__(self,job):
+        QRunnable.__init__(self)
+        self.job=job
+        self.signals=WorkerSignals()
+        self.cancel_requested=False
+    def cancel(self):
+        self.cancel_requested=True
+    def cancelled(self):
+        return self.cancel_requested
+    def run(self):
+        try:
+            result=self.job(self.signals.progress.emit,self.cancelled)
+        except Exception as err: # everything must go back to the GUI thread
+            message="Cancelled" if self.cancel_requested else str(err)
+            self.signals.failed.emit(message)
+            return
+        if self.cancel_requested:
+            self.signals.failed.emit("Cancelled")
+            return
+        self.signals.finished.emit(result)
+
+def lmfit_progress(progress,cancelled,label):
+    '''lmfit iter_cb: status bar update every 20 iterations, True aborts the fit after cancel'''
+    def iter_cb(params,iteration,residual,*args,**kws):
+        if iteration%20==0:
+            progress("{0}: iteration {1}".format(label,iteration))
+        return cancelled()
+    return iter_cb
+
+class interface():
+    def update_status_bar(self,message):
+        self.statusbar.showMessage(message)
+        
+    # per-stage timing of load/fit/calibrate/export, see RamanCal_profile
+    def func_profile_toggled(self,checked):
+        if checked:
+            profile.reset()
+            profile.enable()
+            self.update_status_bar("Profiling load, fit, calibrate and export")
+        else:
+            profile.disable()
+    def func_save_profile(self):
+        profile_file_name=str(QFileDialog.getSaveFileName())
+        if profile_file_name==u'':
+            return
+        profile.save(profile_file_name)
+        print(profile.format_report())
+        self.update_status_bar("profile report:\t"+profile_file_name)
+
+    # long jobs run on the thread pool, one at a time
+    def start_job(self,job,on_finished,message):
+        '''job(progress,cancelled) runs off the event loop, on_finished(result) runs back on it'''
+        if self.worker is not None:
+            self.update_status_bar("Busy, press cancel to stop the running job")
+            return
+        self.worker=Worker(job)
+        self.worker.signals.progress.connect(self.update_status_bar)
+        self.worker.signals.finished.connect(lambda result:self.job_done(on_finished,result))
+        self.worker.signals.failed.connect(self.job_failed)
+        self.cancel_button.setEnabled(True)
+        self.update_status_bar(message)
+        self.thread_pool.start(self.worker)
+    def job_done(self,on_finished,result):
+        self.worker=None
+        self.cancel_button.setEnabled(False)
+        on_finished(result)
+    def job_failed(self,message):
+        self.worker=None
+        self.cancel_button.setEnabled(False)
+        self.update_status_bar(message)
+    def func_cancel_job(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.update_status_bar("Cancelling...")
+        
+    def func_load_spectrum(self):
+        spectrum_file_path=QFileDialog.getOpenFileName() # file opening might fail
+        #self.spectrum_file_path=unicode(self.spectrum_file_path)
+        spectrum_file_path=str(spectrum_file_path)
+        print(spectrum_file_path)
+        def job(progress,cancelled):
+            try:
+                return spectrum_file_path,core.load_spectrum(spectrum_file_path) # throws exception if clicked 'cancel' in file dialog
+            except IOError as err: 
+                raise IOError("IOError occurred when reading calibration file: "+str(err))
+            except ValueError as err: # fixed: ref wavelength can go through
+                raise ValueError("ValueError occurred when reading calibration file: "+str(err))
+            except:
+                raise ValueError("Loading spectrum failed")
+        self.start_job(job,self.show_spectrum,"Loading "+spectrum_file_path)
+
+    def show_spectrum(self,result):
+        self.spectrum_file_path,(self.xdata,self.ydata)=result
+        self.spectrum_curve_plot.del_all_items()
+        self.fit_curve_item=None
+        try: # throws exception if text file format is wrong
+            self.spectrum_curve_item=make.curve(*self.decimated_spectrum(),color='k',linewidth=2)
+            self.spectrum_range_item=make.range(self.xdata[-1]/2,self.xdata[-1]/2+20)
+            self.spectrum_curve_plot.add_item(self.spectrum_curve_item)
+            self.spectrum_curve_plot.add_item(self.spectrum_range_item)
+            self.spectrum_curve_plot.do_autoscale()
+            message=self.spectrum_file_path+" is loaded successfully"
+            self.update_status_bar(message)
+        except IndexError as err: # need full capture of all kinds of errors
+            message="IndexError occurred when loading calibration spectrum: "+str(err)
+            self.update_status_bar(message)
+            return
+                
+    # level of detail: the curve holds min/max-decimated points of the visible range only
+    def decimated_spectrum(self,low=-np.inf,high=np.inf):
+        '''the curve peaks are fitted on, so the fit overlay lies on it'''
+        width=self.spectrum_curve_plot.canvas().width()
+        return core.decimate_minmax(self.xdata,self.fit_ydata(),low,high,width)
+    def fit_ydata(self):
+        '''ydata for peak fitting and matching, despiked and baseline-subtracted when "clean spectrum" is ticked'''
+        if not self.clean_checkbox.isChecked() or len(self.ydata)==0:
+            return self.ydata
+        if self.cleaned is None or self.cleaned[0] is not self.ydata: # once per loaded spectrum
+            self.cleaned=(self.ydata,preprocess.default_pipeline()(self.ydata))
+        return self.cleaned[1]
+    def func_clean_toggled(self,checked):
+        '''show the raw or cleaned curve, the overlay of a fit on the other one is dropped'''
+        if len(self.xdata)==0:
+            return
+        if self.fit_curve_item is not None:
+            self.spectrum_curve_plot.del_item(self.fit_curve_item)
+            self.fit_curve_item=None
+        self.spectrum_curve_item.set_data(*self.decimated_spectrum())
+        self.spectrum_curve_plot.do_autoscale()
+    def func_axis_changed(self,plot=None):
+        '''recompute the drawn points after zoom/pan'''
+        if self.xdata is [] or len(self.xdata)==0:
+            return
+        low,high=self.spectrum_curve_plot.get_axis_limits('bottom')
+        self.spectrum_curve_item.set_data(*self.decimated_spectrum(low,high))
+        self.spectrum_curve_plot.replot()
+                
+    def Gaussian(self,xdata,parameters):
+        return core.gaussian(xdata,parameters) # (center,sigma,amp,offset), batched version in core.fit_gaussians
+    def errfunc(self,parameters,xdata,ydata):
+        delta=self.Gaussian(xdata,parameters)-ydata
+        total_error=np.sum(delta**2)
+        return total_error       
+    def func_fit_spectrum(self):
+        if self.xdata is []: # check if spectrum is loaded
+            message="No calibration spectrum available"
+            self.update_status_bar(message)
+            return
+        try:
+            low_bound,high_bound=self.spectrum_range_item.get_range() # low and high bound might be reversed
+        except AttributeError as err: # happens when clicked without any spectrum loaded
+            message="AttributeError occurred when locating calibration peak: "+err.message
+            self.update_status_bar(message)
+            return
+        xdata,ydata=self.xdata,self.fit_ydata()
+        def job(progress,cancelled): # ValueError when range holds too few points
+            return core.fit_peak(xdata,ydata,low_bound,high_bound,lmfit_progress(progress,cancelled,"fitting peak"))
+        self.start_job(job,self.show_fit,"Fitting peak")
+
+    def show_fit(self,result):
+        xdata_to_fit=result.userkws['x']
+        y1=result.best_fit
+        p1=result.params
+
+        #self.fit_results.setText(unicode(result.fit_report(show_correl=False)))
+        self.fit_results.setText(str(result.fit_report(show_correl=False)))
+        
+        #fit0=make.curve(xdata_to_fit,y0,color='r',linewidth=2)
+        if self.fit_curve_item is None: # one overlay, replaced in place by later fits
+            self.fit_curve_item=make.curve(xdata_to_fit,y1,color='b',linewidth=2)
+            self.spectrum_curve_plot.add_item(self.fit_curve_item)
+        else:
+            self.fit_curve_item.set_data(xdata_to_fit,y1)
+        self.spectrum_curve_plot.replot()
+        self.peak_location_label.setText("Current peak location: %3.2f"%p1['gauss_center'].value) # assumes 512 pixels
+        self.update_status_bar("Peak fitted")
+        return
+        
+    def func_clear_spectrum(self):        
+        if self.xdata is []: # check if spectrum is loaded
+            message="No calibration spectrum available"
+            self.update_status_bar(message)
+            return
+        self.spectrum_curve_plot.del_all_items()
+        self.fit_curve_item=None
+        self.spectrum_curve_item=make.curve(*self.decimated_spectrum(),color='k',linewidth=2)
+        self.spectrum_curve_plot.add_item(self.spectrum_curve_item)
+        self.spectrum_range_item=make.range(self.xdata[-1]/2,self.xdata[-1]/2+20) # this item cannot be accessed by outside code, need to use self.blah
+        self.spectrum_curve_plot.add_item(self.spectrum_range_item)
+        self.spectrum_curve_plot.do_autoscale()
+
+    # functions on pixel list for calibration        
+    def func_add_cal_pixel(self):
+        text=self.peak_location_label.text()
+        regexp=r'.* (?P<num>\d*\.\d*)'
+        regexp=re.compile(regexp)
+        hit=regexp.match(text)
+        if hit is not None:
+            entry=hit.group("num")
+            self.cal_pixel_list.addItem(entry)
+            self.update_preview()
+        else:
+            message="Fail to extract peak location"
+            self.update_status_bar(message)
+            return            
+    def func_del_cal_pixel(self):
+        self.cal_pixel_list.takeItem(self.cal_pixel_list.currentRow())        
+        self.update_preview()
+    def func_clear_cal_pixel(self):
+        self.cal_pixel_list.clear()
+        self.update_preview()
+    
+    def func_load_ref_wvlen(self):
+        self.ref_wvlen_list.clear() # clear all previous content
+        ref_file_name=QFileDialog.getOpenFileName() # error handling, path input?
+        #ref_file_name=unicode(ref_file_name) # if clicked "cancel" in dialog, this gives u''
+        ref_file_name=str(ref_file_name) # if clicked "cancel" in dialog, this gives u''
+        if ref_file_name==u'': # value None didn't catch the 'cancel' case
+            message="No reference wavelength is loaded"
+            self.update_status_bar(message)
+            return
+        try:
+            f=open(ref_file_name)
+            ref_entries=f.readlines() # get rid of return at the end
+        except IOError as err:
+            message="IOError occurred when loading reference wavelength: "+err.message # no message with this error?
+            self.update_status_bar(message)
+            return
+        ref_entries=[item.rstrip() for item in ref_entries]
+        self.ref_wvlen_list.addItems(ref_entries)        
+        # parsed once here: list row -> value, no regex when lines are picked or matched
+        records,rows=refs.read_lines(ref_file_name)
+        self.ref_row_values=dict(zip(rows.tolist(),records['value'].tolist()))
+        self.ref_kind=refs.file_kind(ref_file_name)
+        self.update_preview()
+    
+    # functions on wavelength list for calibration
+    def func_add_cal_wvlen(self):
+        item=self.ref_wvlen_list.currentItem()
+        if item is None:
+            message='No reference wavelength is selected'
+            self.update_status_bar(message)
+            return
+        value=self.ref_row_values.get(self.ref_wvlen_list.currentRow())
+        if value is None: # section header or blank line
+            message="No wavelength entry is added:\t"+str(item.text())
+            self.update_status_bar(message)
+            return
+        self.cal_wvlen_list.addItem(str(value))
+        self.update_preview()
+            
+    def func_auto_match(self):
+        '''detect peaks and match them to the loaded reference list, fills both calibration lists'''
+        if self.xdata is []: # check if spectrum is loaded
+            message="No calibration spectrum available"
+            self.update_status_bar(message)
+            return
+        ref_values=list(self.ref_row_values.values())
+        if len(ref_values)<2:
+            message="No reference wavelength is loaded"
+            self.update_status_bar(message)
+            return
+        try:
+            laser_wavelength=float(self.laser_wavelength.text())
+        except ValueError:
+            self.update_status_bar("Raman pump wavelength is not a number")
+            return
+        xdata,ydata,mode=self.xdata,self.fit_ydata(),self.ref_kind # wavelengths or Raman shifts, from the file name
+        def job(progress,cancelled):
+            try:
+                return match.auto_pairs(xdata,ydata,ref_values,mode,laser_wavelength)
+            except ValueError as err:
+                raise ValueError("No consistent match between peaks and reference lines: "+str(err))
+        def on_finished(result):
+            pixel_array,ref_array=result
+            self.cal_pixel_list.clear()
+            self.cal_wvlen_list.clear()
+            self.cal_pixel_list.addItems(["%3.2f"%item for item in pixel_array])
+            self.cal_wvlen_list.addItems([str(item) for item in ref_array])
+            self.update_preview()
+            message="{0} peaks matched to reference lines".format(pixel_array.size)
+            self.update_status_bar(message)
+        self.start_job(job,on_finished,"Matching peaks to reference lines")
+
+    def func_del_cal_wvlen(self):
+        self.cal_wvlen_list.takeItem(self.cal_wvlen_list.currentRow())
+        self.update_preview()
+    def func_clear_cal_wvlen(self):
+        self.cal_wvlen_list.clear()
+        self.update_preview()
+
+    def update_preview(self):
+        '''
+        live linear fit of the pairs listed so far, kept in self.preview and shown in preview_label
+        calibration_results and the saved files only ever hold the fit of the calibrate buttons
+        the session only adds/removes the pairs that changed
+        '''
+        self.preview=None
+        self.preview_label.setText("Preview: needs 3 pairs")
+        count=min(self.cal_pixel_list.count(),self.cal_wvlen_list.count())
+        try:
+            pairs=[(float(self.cal_pixel_list.item(index).text()),float(self.cal_wvlen_list.item(index).text()))
+                   for index in range(count)]
+            laser_wavelength=float(self.laser_wavelength.text())
+        except ValueError:
+            return
+        if (self.session is None or self.session.mode!=self.ref_kind or
+            (self.ref_kind=='shift' and self.session.laser_wavelength!=laser_wavelength)):
+            center=len(self.xdata)/2.0 if len(self.xdata)>0 else 0.0
+            self.session=session.CalibrationSession(1,center,max(center,1.0),self.ref_kind,laser_wavelength)
+        self.session.sync(pairs)
+        if len(self.session)<3: # no residual left to judge with two points
+            return
+        try:
+            self.preview=self.session.calibration()
+        except (ValueError,np.linalg.LinAlgError):
+            return
+        pixel_array,ref_array,nm_array,weights=self.session.arrays()
+        rms=np.sqrt(np.mean((nm_array-self.preview.nanometer(pixel_array))**2))
+        self.preview_label.setText("Preview ({0} pairs): slope {1:.6g} nm/pixel, intercept {2:.6g} nm, rms residual {3:.3g} nm".format(
+            len(self.session),self.preview.slope,self.preview.intercept,rms))
+        
+    def func_calibrate_button(self):
+        if self.cal_pixel_list.count()<=1 or self.cal_wvlen_list.count()<=1:
+            message="Need at least two points to calibrate."
+            self.update_status_bar(message)
+            return None
+        if self.cal_pixel_list.count()!=self.cal_wvlen_list.count():
+            message="Pixel and wavelength lists differ in length"
+            self.update_status_bar(message)
+            return None
+            
+        pixel_list=[]
+        # below: from QListWidget to numpy array
+        for index in range(self.cal_pixel_list.count()):
+            pixel_list.append(self.cal_pixel_list.item(index))
+        #pixel_list=[unicode(item.text()) for item in pixel_list] # unicode() returns unicode string, item.text() returns Qstring object
+        pixel_list=[str(item.text()) for item in pixel_list] # unicode() returns unicode string, item.text() returns Qstring object
+        pixel_array=[float(item) for item in pixel_list] # float() takes single value, error occurs if letters are present
+        pixel_array=np.array(pixel_array)       
+#        print pixel_list
+        
+        wvlen_list=[]
+        for index in range(self.cal_wvlen_list.count()):
+            wvlen_list.append(self.cal_wvlen_list.item(index))
+        #wvlen_list=[unicode(item.text()) for item in wvlen_list]
+        wvlen_list=[str(item.text()) for item in wvlen_list]
+        wvlen_array=[float(item) for item in wvlen_list]
+        wvlen_array=np.array(wvlen_array)
+        
+        robust=self.robust_checkbox.isChecked()
+        def job(progress,cancelled): # RANSAC hypotheses can take a while, keep the window responsive
+            if robust:
+                return core.calibrate_robust(pixel_array,wvlen_array)
+            return core.calibrate_wavelength(pixel_array,wvlen_array)
+        def on_finished(calibration):
+            self.calibration=calibration
+            self.slope=self.calibration.slope
+            self.intercept=self.calibration.intercept
+            
+            if self.calibration.rejected is not None: # report lists the points kept and rejected
+                self.calibration_results.setText(self.calibration.report)
+                self.update_status_bar("Calibrated with wavelength, {0} of {1} points rejected".format(
+                    self.calibration.rejected.sum(),pixel_array.size))
+                return
+            cal_res=self.calibration.report.split("Pixel list:")[0]
+            cal_res=cal_res+"Pixel list:\n"+" ".join(pixel_list)+'\n'
+            cal_res=cal_res+"Wavelength list:\n"+" ".join(wvlen_list)+'\n'        
+            self.calibration_results.setText(cal_res)
+            self.update_status_bar("Calibrated with wavelength")
+        self.start_job(job,on_finished,"Calibrating with wavelength")
+        return None
+    
+    def func_calibrate_shift_button(self):
+        if self.cal_pixel_list.count()<=1 or self.cal_wvlen_list.count()<=1:
+            message="Cannot calibrate with less than two points"
+            self.update_status_bar(message)
+            return
+        if self.cal_pixel_list.count()!=self.cal_wvlen_list.count():
+            message="Pixel and wavelength lists differ in length"
+            self.update_status_bar(message)
+            return
+            
+        pixel_list=[]
+        # below: from QListWidget to numpy array
+        for index in range(self.cal_pixel_list.count()):
+            pixel_list.append(self.cal_pixel_list.item(index))
+        pixel_list=[str(item.text()) for item in pixel_list] # unicode() returns unicode string, item.text() returns Qstring object
+        pixel_array=[float(item) for item in pixel_list] # float() takes single value, error occurs if letters are present
+        pixel_array=np.array(pixel_array)       
+        #print pixel_list
+        shift_list=[]
+        for index in range(self.cal_wvlen_list.count()):
+            shift_list.append(self.cal_wvlen_list.item(index))
+        shift_list=[str(item.text()) for item in shift_list]
+        shift_array=[float(item) for item in shift_list]
+        shift_array=np.array(shift_array)
+        
+        laser_wavelength=float(self.laser_wavelength.text())
+        robust=self.robust_checkbox.isChecked()
+        def job(progress,cancelled):
+            if robust:
+                return core.calibrate_robust(pixel_array,shift_array,'shift',laser_wavelength)
+            return core.calibrate_shift(pixel_array,shift_array,laser_wavelength,
+                                        lmfit_progress(progress,cancelled,"calibrating"))
+        def on_finished(calibration):
+            self.calibration=calibration
+            self.slope=self.calibration.slope
+            self.intercept=self.calibration.intercept 
+            
+            if self.calibration.rejected is not None:
+                self.calibration_results.setText(self.calibration.report)
+                self.update_status_bar("Calibrated with Raman shift, {0} of {1} points rejected".format(
+                    self.calibration.rejected.sum(),pixel_array.size))
+                return
+            cal_res=self.calibration.report.split("\nPixel list:")[0]
+            cal_res=cal_res+"\nPixel list:\n"+" ".join(pixel_list)+'\n'
+            cal_res=cal_res+"Raman shift list:\n"+" ".join(shift_list)+'\n'        
+            self.calibration_results.setText(cal_res)    
+            self.update_status_bar("Calibrated with Raman shift")
+        self.start_job(job,on_finished,"Calibrating with Raman shift")
+        return None
+    
+    def func_save_fitting_results(self):
+        # need to have a valid calibration spectrum, use this name with '.cal' extension
+        try:
+            calibration_file_path=core.cal_file_path(self.spectrum_file_path,'fit')
+        except TypeError as err:# occurs when clicked without loading in spectrum
+            message="TypeError:\t"+err.message
+            self.update_status_bar(message)
+            return
+        with open(calibration_file_path,'w') as f:
+            f.write(self.calibration_results.toPlainText())
+        message="linear regression info:\t"+calibration_file_path
+        self.update_status_bar(message)
+        return None
+        
+    def current_calibration(self):
+        '''last calibration (any dispersion model), or a linear one from slope/intercept'''
+        if self.calibration is not None:
+            return self.calibration
+        return core.Calibration(self.slope,self.intercept)
+
+    def export_uncertainty(self):
+        '''uncertainty method for core.save_cal, None leaves the 1 sigma column out'''
+        return 'linear' if self.sigma_checkbox.isChecked() else None
+        
+    def func_save_cal_nanometer(self):
+        # need to have a valid calibration spectrum, use this name with '.cal' extension
+        try:
+            calibration_file_path=core.cal_file_path(self.spectrum_file_path,'nm')
+        except TypeError as err:# occurs when clicked without loading in spectrum
+            message="TypeError:\t"+err.message
+            self.update_status_bar(message)
+            return        
+        
+        core.save_cal(self.spectrum_file_path,self.xdata,self.current_calibration(),'nm',self.export_uncertainty())
+        message="calibrated to nanometer:\t"+calibration_file_path
+        self.update_status_bar(message)
+            
+    def func_save_cal_wavenumber(self):
+        # need to have a valid calibration spectrum, use this name with '.cal' extension
+        try:
+            calibration_file_path=core.cal_file_path(self.spectrum_file_path,'wavenumber')
+        except TypeError as err:# occurs when clicked without loading in spectrum
+            message="TypeError:\t"+err.message
+            self.update_status_bar(message)
+            return        
+        
+        # catch ValueErrors here
+        excitation_wvlen=float(self.laser_wavelength.text())
+        calibration=self.current_calibration()
+        calibration.laser_wavelength=excitation_wvlen
+        core.save_cal(self.spectrum_file_path,self.xdata,calibration,'wavenumber',self.export_uncertainty())
+        message="calibrated to wavenumber:\t"+calibration_file_path
+        self.update_status_bar(message)
+    
+    def func_save_cal_eV(self):
+        # need to have a valid calibration spectrum, use this name with '.cal' extension
+        try:
+            calibration_file_path=core.cal_file_path(self.spectrum_file_path,'eV')
+        except TypeError as err:# occurs when clicked without loading in spectrum
+            message="TypeError:\t"+err.message
+            self.update_status_bar(message)
+            return        
+        
+        core.save_cal(self.spectrum_file_path,self.xdata,self.current_calibration(),'eV',self.export_uncertainty())
+        message="calibrated to eV:\t"+calibration_file_path
+        self.update_status_bar(message)
+        
+    def set_interface_geometry(self):
+        '''
+        Full range: 1000x500
+        Window size: 1020x640
+        QRect(upperleft_x,upperleft_y,span_x,span_y)
+        '''
+        self.main_window.setGeometry(QRect(100,100,1040,605)) # upperleft x and y are arbitrary starting coord on screen
+        # cal spectrum and its associates
+        self.spectrum_curve_plot.setGeometry(QRect(20,20,600,300))
+        self.fit_button.setGeometry(QRect(20,340,100,50))
+        self.clear_button.setGeometry(QRect(20,395,100,50))
+        self.load_spectrum_button.setGeometry(QRect(20,450,100,50))
+        self.peak_location_label.setGeometry(QRect(140,340,200,20))
+        self.fit_results.setGeometry(QRect(140,360,240,140))        
+        self.cancel_button.setGeometry(QRect(340,338,40,22))
+        self.clean_checkbox.setGeometry(QRect(20,505,120,20))
+        self.profile_checkbox.setGeometry(QRect(140,505,100,20))
+        self.save_profile_button.setGeometry(QRect(240,503,100,24))
+
+        # cal pixel list and its associates
+        self.cal_pixel_list.setGeometry(QRect(640,20,100,180))        
+        self.add_cal_pixel_button.setGeometry(QRect(640,200,100,45))
+        self.del_cal_pixel_button.setGeometry(QRect(640,245,100,45))
+        self.clear_cal_pixel_button.setGeometry(QRect(640,290,100,45))        
+        # cal wavelength list and associates
+        self.cal_wvlen_list.setGeometry(QRect(760,20,100,180))
+        self.add_cal_wvlen_button.setGeometry(QRect(760,200,100,45))    
+        self.del_cal_wvlen_button.setGeometry(QRect(760,245,100,45))    
+        self.clear_cal_wvlen_button.setGeometry(QRect(760,290,100,45))        
+        
+        # ref wavelength list and loading button
+        self.ref_wvlen_list.setGeometry(QRect(880,20,140,370))
+        self.load_ref_wvlen_button.setGeometry(QRect(880,390,140,60))        
+        self.laser_label.setGeometry(QRect(880,450,140,25))
+        self.laser_wavelength.setGeometry(QRect(880,475,70,25))
+        self.auto_match_button.setGeometry(QRect(950,475,70,25))
+        self.robust_checkbox.setGeometry(QRect(880,500,140,20))
+        self.sigma_checkbox.setGeometry(QRect(640,500,220,20))
+        
+        # calibrate button
+        self.calibrate_button.setGeometry(QRect(640,345,110,50))
+        self.calibrate_shift_button.setGeometry(QRect(750,345,110,50))
+        self.save_fitting_results.setGeometry(QRect(640,400,110,50))
+        self.save_wavenumber.setGeometry(QRect(750,400,110,50))
+        self.save_nanometer.setGeometry(QRect(640,450,110,50))
+        self.save_eV.setGeometry(QRect(750,450,110,50))
+        self.calibration_results.setGeometry(QRect(420,345,210,160))
+        self.preview_label.setGeometry(QRect(20,530,840,20))
+        return None
+
+    def __init__(self):
+        self.main_window=QMainWindow()
+        
+        self.spectrum_file_path=None
+        self.xdata=[]
+        self.ydata=[]
+        self.cleaned=None # (ydata,cleaned ydata)
+        self.slope=None
+        self.intercept=None
+        self.calibration=None
+        self.ref_row_values={} # row of ref_wvlen_list -> reference value
+        self.ref_kind='wavelength' # 'shift' for Wavenumbers_* lists, sets the preview mode
+        self.session=None # CalibrationSession behind the live preview, see update_preview
+        self.preview=None # live fit of the listed pairs, never saved
+        self.thread_pool=QThreadPool.globalInstance()
+        self.worker=None # running Worker, see start_job
+        
+        self.ui=QWidget()
+        # spectrum display and peak fitting
+        self.spectrum_curve_plot=CurvePlot()
+        self.spectrum_curve_plot.setParent(self.ui)        
+        self.spectrum_curve_item=make.curve(self.xdata,self.ydata,color='k',linewidth=2)
+        self.spectrum_curve_plot.add_item(self.spectrum_curve_item)
+        self.fit_curve_item=None
+        self.spectrum_curve_plot.SIG_PLOT_AXIS_CHANGED.connect(self.func_axis_changed)
+        
+        self.load_spectrum_button=QPushButton()
+        self.load_spectrum_button.setText("Load spectrum")
+        self.load_spectrum_button.setParent(self.ui)
+        #self.ui.connect(self.load_spectrum_button,Signal("clicked()"),self.func_load_spectrum)
+        self.load_spectrum_button.clicked.connect(self.func_load_spectrum)
+ 
+        self.fit_button=QPushButton()
+        self.fit_button.setText("fit \npeak location")
+        self.fit_button.setParent(self.ui)
+        #self.ui.connect(self.fit_button,Signal("clicked()"),self.func_fit_spectrum)
+        self.fit_button.clicked.connect(self.func_fit_spectrum)
+        
+        self.clear_button=QPushButton()
+        self.clear_button.setText("reset spectrum")
+        self.clear_button.setParent(self.ui)        
+        #self.ui.connect(self.clear_button,Signal("clicked()"),self.func_clear_spectrum)
+        self.clear_button.clicked.connect(self.func_clear_spectrum)
+        
+        self.peak_location_label=QLabel()
+        self.peak_location_label.setText("Current peak location")
+        self.peak_location_label.setParent(self.ui)
+
+        self.fit_results=QTextBrowser()
+        self.fit_results.setParent(self.ui)
+        self.fit_results.setText("Peak fitting results")
+        
+        self.cancel_button=QPushButton()
+        self.cancel_button.setText("cancel")
+        self.cancel_button.setParent(self.ui)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.func_cancel_job)
+
+        self.clean_checkbox=QCheckBox()
+        self.clean_checkbox.setText("clean spectrum")
+        self.clean_checkbox.setToolTip("remove cosmic rays and baseline before fitting, the cleaned spectrum is shown")
+        self.clean_checkbox.setParent(self.ui)
+        self.clean_checkbox.toggled.connect(self.func_clean_toggled)
+
+        self.profile_checkbox=QCheckBox()
+        self.profile_checkbox.setText("profile")
+        self.profile_checkbox.setParent(self.ui)
+        self.profile_checkbox.toggled.connect(self.func_profile_toggled)
+
+        self.save_profile_button=QPushButton()
+        self.save_profile_button.setText("save profile")
+        self.save_profile_button.setParent(self.ui)
+        self.save_profile_button.clicked.connect(self.func_save_profile)
+        
+        # list of located pixels for calibration, and associates
+        self.cal_pixel_list=QListWidget()
+        self.cal_pixel_list.setParent(self.ui)        
+    
+        self.add_cal_pixel_button=QPushButton()
+        self.add_cal_pixel_button.setText("add to \ncal pixel")
+        self.add_cal_pixel_button.setParent(self.ui)
+        #self.ui.connect(self.add_cal_pixel_button,Signal("clicked()"),self.func_add_cal_pixel)
+        self.add_cal_pixel_button.clicked.connect(self.func_add_cal_pixel)
+        
+        self.del_cal_pixel_button=QPushButton()
+        self.del_cal_pixel_button.setText("delete \ncal pixel")
+        self.del_cal_pixel_button.setParent(self.ui)
+        #self.ui.connect(self.del_cal_pixel_button,Signal("clicked()"),self.func_del_cal_pixel)
+        self.del_cal_pixel_button.clicked.connect(self.func_del_cal_pixel)
+        
+        self.clear_cal_pixel_button=QPushButton()
+        self.clear_cal_pixel_button.setText("clear \ncal pixel")
+        self.clear_cal_pixel_button.setParent(self.ui)
+        #self.ui.connect(self.clear_cal_pixel_button,Signal("clicked()"),self.func_clear_cal_pixel)
+        self.clear_cal_pixel_button.clicked.connect(self.func_clear_cal_pixel)
+        
+        # list of reference wavelengths
+        self.ref_wvlen_list=QListWidget()
+        self.ref_wvlen_list.setParent(self.ui)
+      
+        self.load_ref_wvlen_button=QPushButton()
+        self.load_ref_wvlen_button.setText("Load reference\n Wavelength/\nRaman shift")
+        self.load_ref_wvlen_button.setParent(self.ui)
+        #self.ui.connect(self.load_ref_wvlen_button,Signal("clicked()"),self.func_load_ref_wvlen)    
+        self.load_ref_wvlen_button.clicked.connect(self.func_load_ref_wvlen)
+    
+        # selected wavelength for calibration, and associates
+        self.cal_wvlen_list=QListWidget()
+        self.cal_wvlen_list.setParent(self.ui)   
+     
+        self.add_cal_wvlen_button=QPushButton()
+        self.add_cal_wvlen_button.setText("add to \ncal reference")
+        self.add_cal_wvlen_button.setParent(self.ui)
+        #self.ui.connect(self.add_cal_wvlen_button,Signal("clicked()"),self.func_add_cal_wvlen)
+        self.add_cal_wvlen_button.clicked.connect(self.func_add_cal_wvlen)
+      
+        self.del_cal_wvlen_button=QPushButton()
+        self.del_cal_wvlen_button.setText("delete \ncal reference")
+        self.del_cal_wvlen_button.setParent(self.ui)
+        #self.ui.connect(self.del_cal_wvlen_button,Signal("clicked()"),self.func_del_cal_wvlen)
+        self.del_cal_wvlen_button.clicked.connect(self.func_del_cal_wvlen)
+        
+        self.clear_cal_wvlen_button=QPushButton()
+        self.clear_cal_wvlen_button.setText("clear \ncal reference")
+        self.clear_cal_wvlen_button.setParent(self.ui)
+        #self.ui.connect(self.clear_cal_wvlen_button,Signal("clicked()"),self.func_clear_cal_wvlen)
+        self.clear_cal_wvlen_button.clicked.connect(self.func_clear_cal_wvlen)
+
+        # calibration
+        self.calibrate_button=QPushButton()
+        self.calibrate_button.setText("Calibrate with\nWavelength")
+        self.calibrate_button.setParent(self.ui)
+        #self.ui.connect(self.calibrate_button,Signal("clicked()"),self.func_calibrate_button)
+        self.calibrate_button.clicked.connect(self.func_calibrate_button)
+        
+        self.calibrate_shift_button=QPushButton()
+        self.calibrate_shift_button.setText("Calibrate with\nRaman shift")
+        self.calibrate_shift_button.setParent(self.ui)
+        self.calibrate_shift_button.clicked.connect(self.func_calibrate_shift_button)        
+        
+        self.calibration_results=QTextBrowser()
+        self.calibration_results.setParent(self.ui)
+        self.calibration_results.setText("Calibration results here")
+
+        self.preview_label=QLabel()
+        self.preview_label.setParent(self.ui)
+        self.preview_label.setText("Preview: needs 3 pairs")
+        
+        self.laser_label=QLabel()
+        self.laser_label.setParent(self.ui)
+        self.laser_label.setText("Raman pump (nm)")        
+        
+        self.laser_wavelength=QLineEdit()
+        self.laser_wavelength.setParent(self.ui)
+        self.laser_wavelength.setText("632.82")
+        
+        self.auto_match_button=QPushButton()
+        self.auto_match_button.setText("auto match")
+        self.auto_match_button.setParent(self.ui)
+        self.auto_match_button.clicked.connect(self.func_auto_match)
+
+        self.robust_checkbox=QCheckBox()
+        self.robust_checkbox.setText("robust fit (reject outliers)")
+        self.robust_checkbox.setParent(self.ui)
+
+        self.sigma_checkbox=QCheckBox()
+        self.sigma_checkbox.setText("save with 1 sigma column")
+        self.sigma_checkbox.setParent(self.ui)
+        
+        self.save_fitting_results=QPushButton()
+        self.save_fitting_results.setText("Save cal - fit")
+        self.save_fitting_results.setParent(self.ui)
+        #self.ui.connect(self.save_fitting_results,Signal("clicked()"),self.func_save_fitting_results)
+        self.save_fitting_results.clicked.connect(self.func_save_fitting_results)
+                
+        self.save_wavenumber=QPushButton()
+        self.save_wavenumber.setText("Save cal - cm-1")
+        self.save_wavenumber.setParent(self.ui)
+        #self.ui.connect(self.save_wavenumber,Signal("clicked()"),self.func_save_cal_wavenumber)
+        self.save_wavenumber.clicked.connect(self.func_save_cal_wavenumber)
+
+        self.save_nanometer=QPushButton()
+        self.save_nanometer.setText("Save cal - nm")
+        self.save_nanometer.setParent(self.ui)
+        #self.ui.connect(self.save_nanometer,Signal("clicked()"),self.func_save_cal_nanometer)
+        self.save_nanometer.clicked.connect(self.func_save_cal_nanometer)
+        
+        self.save_eV=QPushButton()
+        self.save_eV.setText("Save cal - eV")
+        self.save_eV.setParent(self.ui)
+        #self.ui.connect(self.save_eV,Signal("clicked()"),self.func_save_cal_eV)
+        self.save_eV.clicked.connect(self.func_save_cal_eV)
+        
+        self.menubar=self.main_window.menuBar()
+        self.fileMenu=self.menubar.addMenu('File')
+        self.helpMenu=self.menubar.addMenu('Help')        
+        
+        self.toolbar=self.main_window.addToolBar("curve toolbar")
+        
+        self.statusbar=self.main_window.statusBar()
+        self.update_status_bar("Initiation has finished")
+    
+        self.manager=PlotManager(self.main_window)
+        self.manager.add_plot(self.spectrum_curve_plot)
+        self.manager.add_toolbar(self.toolbar)    
+        self.manager.register_all_curve_tools() # make range slide, enable RMB menu
+
+        self.main_window.setCentralWidget(self.ui) # single layer parent-children relationship
+        self.set_interface_geometry()
+        self.main_window.setWindowTitle("Raman Calibration Helper")
+   
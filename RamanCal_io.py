@@ -0,0 +1,191 @@
+'''
+RamanCal io
+spectrum file readers with a format registry, detection by the first bytes of the file
+
+    array=load_array(path)      # numpy array, np.memmap or h5py dataset
+    ...
+    close_array(array)          # closes the HDF5 file behind a dataset
+
+Binary formats are opened without reading the data: .npy, ENVI cubes and uncompressed .npz
+members come back as read-only np.memmap and HDF5 as an h5py dataset, so only the slices
+actually indexed are paged in. Multi-spectrum arrays keep the spectral axis last.
+Text goes through the C parser of np.loadtxt, np.genfromtxt is the fallback for ragged files.
+
+New formats: register_format(name,sniff,loader) with sniff(header_bytes,path)->bool
+and loader(path)->array; later registrations are tried first.
+'''
+#----------------
+import os
+import numpy as np
+#----------------
+header_size=512
+formats=[] # (name,sniff,loader), tried in order
+
+def register_format(name,sniff,loader):
+    '''add a reader in front of the registry, so it overrides the built-in ones'''
+    formats.insert(0,(name,sniff,loader))
+
+def read_header(path,size=header_size):
+    with open(path,'rb') as f:
+        return f.read(size)
+
+def detect_format(path):
+    '''name of the first registered format whose sniff accepts the file'''
+    header=read_header(path)
+    for name,sniff,loader in formats:
+        if sniff(header,path):
+            return name
+    raise ValueError("Unknown spectrum file format: "+str(path))
+
+def load_array(path,format=None):
+    '''read a spectrum file with the reader picked by detect_format, or by name with format given'''
+    if format is None:
+        format=detect_format(path)
+    for name,sniff,loader in formats:
+        if name==format:
+            return loader(path)
+    raise ValueError("No reader registered for format: "+str(format))
+
+def close_array(array):
+    '''release the file an array from load_array keeps open (h5py dataset), memmaps go when collected'''
+    owner=getattr(array,'file',None)
+    if owner is not None and hasattr(owner,'close'):
+        owner.close()
+
+#---text
+def sniff_text(header,path):
+    return b'\x00' not in header
+
+def load_text(path):
+    try:
+        return np.loadtxt(path,ndmin=1)
+    except ValueError: # missing values or ragged rows
+        return np.genfromtxt(path)
+
+#---numpy
+def sniff_npy(header,path):
+    return header.startswith(b'\x93NUMPY')
+
+def load_npy(path):
+    return np.load(path,mmap_mode='r')
+
+def sniff_npz(header,path):
+    return header.startswith(b'PK\x03\x04') and path.endswith('.npz')
+
+def memmap_npz_member(path,name):
+    '''read-only np.memmap of the .npy member name of an npz archive, None if it is compressed or not mappable'''
+    import zipfile
+    with zipfile.ZipFile(path) as archive:
+        info=archive.getinfo(name+'.npy')
+    if info.compress_type!=zipfile.ZIP_STORED:
+        return None
+    with open(path,'rb') as f:
+        f.seek(info.header_offset)
+        local=f.read(30) # local file header: name and extra field lengths at bytes 26..29
+        if len(local)<30 or local[:4]!=b'PK\x03\x04':
+            return None
+        f.seek(info.header_offset+30+int.from_bytes(local[26:28],'little')+int.from_bytes(local[28:30],'little'))
+        read_header={(1,0):np.lib.format.read_array_header_1_0,
+                     (2,0):np.lib.format.read_array_header_2_0}.get(np.lib.format.read_magic(f))
+        if read_header is None:
+            return None
+        shape,fortran_order,dtype=read_header(f)
+        offset=f.tell()
+    if dtype.hasobject or int(np.prod(shape))==0:
+        return None
+    return np.memmap(path,dtype=dtype,mode='r',offset=offset,shape=shape,order='F' if fortran_order else 'C')
+
+def load_npz(path):
+    '''
+    first array of the archive, or the one named 'spectra'
+    a member stored uncompressed (np.savez, RamanCal_container) is a read-only np.memmap into the archive,
+    a compressed one is read whole
+    '''
+    import zipfile
+    with zipfile.ZipFile(path) as archive:
+        names=[name[:-4] for name in archive.namelist() if name.endswith('.npy')]
+    if not names:
+        raise ValueError("No array in npz file: "+str(path))
+    name='spectra' if 'spectra' in names else names[0]
+    array=memmap_npz_member(path,name)
+    if array is not None:
+        return array
+    with np.load(path) as archive:
+        return archive[name]
+
+#---HDF5, h5py is optional
+def sniff_hdf5(header,path):
+    return header.startswith(b'\x89HDF\r\n\x1a\n')
+
+def load_hdf5(path,dataset=None):
+    '''dataset named 'spectra' or the first dataset found; data is read on indexing'''
+    try:
+        import h5py
+    except ImportError:
+        raise ValueError("h5py is needed to read HDF5 file: "+str(path))
+    f=h5py.File(path,'r')
+    try:
+        if dataset is None:
+            found=[]
+            f.visititems(lambda name,item:found.append(name) if isinstance(item,h5py.Dataset) else None)
+            if not found:
+                raise ValueError("No dataset in HDF5 file: "+str(path))
+            dataset='spectra' if 'spectra' in found else found[0]
+        return f[dataset]
+    except BaseException: # the dataset keeps the file open, nothing does on failure
+        f.close()
+        raise
+
+#---ENVI hyperspectral cube: binary file plus text header '<name>.hdr' starting with 'ENVI'
+envi_dtype={1:'u1',2:'i2',3:'i4',4:'f4',5:'f8',12:'u2',13:'u4',14:'i8',15:'u8'}
+
+def envi_header_path(path):
+    for candidate in [path+'.hdr',os.path.splitext(path)[0]+'.hdr']:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+def sniff_envi(header,path):
+    if path.endswith('.hdr'):
+        return False
+    hdr=envi_header_path(path)
+    return hdr is not None and read_header(hdr,4)==b'ENVI'
+
+def read_envi_header(hdr):
+    '''key = value pairs of an ENVI header, braces may span lines'''
+    with open(hdr) as f:
+        text=f.read()
+    fields={}
+    key=None
+    for line in text.splitlines()[1:]:
+        if key is not None: # inside {...}
+            fields[key]+=' '+line.strip()
+            if '}' in line:
+                key=None
+            continue
+        if '=' not in line:
+            continue
+        name,value=[item.strip() for item in line.split('=',1)]
+        fields[name.lower()]=value
+        if value.startswith('{') and '}' not in value:
+            key=name.lower()
+    return fields
+
+def load_envi(path):
+    '''np.memmap of shape (lines,samples,bands), spectral axis last whatever the interleave'''
+    fields=read_envi_header(envi_header_path(path))
+    samples,lines,bands=[int(fields[name]) for name in ['samples','lines','bands']]
+    dtype=np.dtype(envi_dtype[int(fields['data type'])])
+    dtype=dtype.newbyteorder('>' if int(fields.get('byte order','0'))==1 else '<')
+    interleave=fields.get('interleave','bsq').lower()
+    shape={'bsq':(bands,lines,samples),'bil':(lines,bands,samples),'bip':(lines,samples,bands)}[interleave]
+    cube=np.memmap(path,dtype=dtype,mode='r',offset=int(fields.get('header offset','0')),shape=shape)
+    axes={'bsq':(1,2,0),'bil':(0,2,1),'bip':(0,1,2)}[interleave]
+    return cube.transpose(axes)
+
+# text is the catch-all and stays last
+register_format('text',sniff_text,load_text)
+register_format('envi',sniff_envi,load_envi)
+register_format('npz',sniff_npz,load_npz)
+register_format('npy',sniff_npy,load_npy)
+register_format('hdf5',sniff_hdf5,load_hdf5)
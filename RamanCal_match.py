@@ -0,0 +1,165 @@
+'''
+RamanCal match
+automatic peak detection and reference-line matching, replaces the click-driven
+range/fit/add-to-list workflow of the GUI
+
+    peaks=detect_peaks(xdata,ydata)                     # pixel positions, SNR-thresholded
+    pixel_array,ref_array=match_lines(peaks,ref_values)  # pixel/reference pairs for core.calibrate
+
+Matching works in wavelength (nm) with a linear dispersion hypothesis per pair of
+peaks and pair of reference lines; every hypothesis is scored at once against the
+sorted reference array with np.searchsorted.
+Raman shift references (cm-1) are converted to absolute wavelengths with the pump wavelength first.
+'''
+#----------------
+import numpy as np
+import RamanCal_core as core
+import RamanCal_profile as profile
+#----------------
+def noise_level(ydata):
+    '''robust noise sigma from the median absolute deviation of point-to-point differences'''
+    delta=np.diff(np.asarray(ydata,dtype=float))
+    return 1.4826*np.median(np.abs(delta-np.median(delta)))/np.sqrt(2)
+
+def detect_peaks(xdata,ydata,snr=5.0,prominence=None,max_peaks=None,refine=True):
+    '''
+    find emission peaks whose prominence exceeds snr*noise (and prominence, if given)
+    refine=True replaces the local maxima by Gaussian centers from core.fit_gaussians
+    returns (positions in xdata units,prominences), strongest first
+    '''
+    xdata=np.asarray(xdata,dtype=float)
+    ydata=np.asarray(ydata,dtype=float)
+    threshold=snr*noise_level(ydata)
+    if prominence is not None:
+        threshold=max(threshold,prominence)
+    from scipy.signal import find_peaks # ~1 s to import, only paid when peaks are searched
+    index,properties=find_peaks(ydata,prominence=threshold,width=1)
+    order=np.argsort(properties['prominences'])[::-1]
+    if max_peaks is not None:
+        order=order[:max_peaks]
+    index=index[order]
+    heights=properties['prominences'][order]
+    positions=xdata[index]
+    if refine and index.size:
+        step=np.abs(np.median(np.diff(xdata)))
+        half_width=np.maximum(3,2*properties['widths'][order])*step
+        windows=np.column_stack([positions-half_width,positions+half_width])
+        try:
+            params,stderr,redchi=core.fit_gaussians(xdata,ydata,windows)
+        except ValueError: # peak at the very edge of the detector
+            return positions,heights
+        # keep the local maximum where the fit wandered off
+        good=np.isfinite(params[:,0])&(np.abs(params[:,0]-positions)<half_width)
+        positions=np.where(good,params[:,0],positions)
+    return positions,heights
+
+shift_to_wavelength=core.shift_to_wavelength
+
+def _nearest(sorted_ref,values):
+    '''index of the nearest entry of sorted_ref for every value, any shape'''
+    index=np.clip(np.searchsorted(sorted_ref,values),1,sorted_ref.size-1)
+    left=sorted_ref[index-1]
+    index-=(values-left)<(sorted_ref[index]-values)
+    return index
+
+def score_hypotheses(slope,intercept,peaks,sorted_ref,tol):
+    '''
+    number of distinct reference lines hit by the peaks under each (slope,intercept), and
+    the summed squared miss in pixels; tol is in pixels
+    '''
+    predicted=slope[:,None]*peaks[None,:]+intercept[:,None] # (H,K) wavelength of every peak
+    nearest=_nearest(sorted_ref,predicted)
+    miss=np.abs(sorted_ref[nearest]-predicted)/np.abs(slope)[:,None] # in pixels
+    hit=miss<tol
+    # one reference line can only explain one peak
+    claimed=np.sort(np.where(hit,nearest,-1),axis=1)
+    distinct=(claimed>=0)&np.concatenate([np.ones((claimed.shape[0],1),dtype=bool),np.diff(claimed,axis=1)>0],axis=1)
+    return distinct.sum(axis=1),np.where(hit,miss**2,0).sum(axis=1)
+
+def match_lines(peaks,ref_values,tol=1.0,slope_range=None,max_peaks=15,chunk=200000):
+    '''
+    pair detected peaks (pixels) with reference wavelengths (nm) assuming a linear dispersion
+    every (peak pair,reference pair) gives a hypothesis; hypotheses are scored in chunks of
+    `chunk` and the winner is refined by refitting on all peaks
+    slope_range=(low,high) in nm/pixel restricts the hypotheses, negative slopes are allowed
+    returns pixel_array,ref_array sorted by pixel
+    '''
+    peaks=np.asarray(peaks,dtype=float)
+    sorted_ref=np.unique(np.asarray(ref_values,dtype=float))
+    if peaks.size<2 or sorted_ref.size<2:
+        raise ValueError("Need at least two peaks and two reference lines to match")
+    bright=peaks[:max_peaks] # detect_peaks returns strongest first
+    i,j=np.triu_indices(bright.size,1)
+    a,b=np.nonzero(~np.eye(sorted_ref.size,dtype=bool)) # both orders, so negative dispersion works
+    dp=bright[j]-bright[i]
+    keep=dp!=0
+    i,j,dp=i[keep],j[keep],dp[keep]
+
+    best=(-1,np.inf,0.0,0.0)
+    pair_chunk=max(1,chunk//max(1,i.size))
+    for start in range(0,a.size,pair_chunk):
+        ra=sorted_ref[a[start:start+pair_chunk]]
+        rb=sorted_ref[b[start:start+pair_chunk]]
+        slope=((rb-ra)[:,None]/dp[None,:]).ravel()
+        intercept=(ra[:,None]-slope.reshape(-1,i.size)*bright[i][None,:]).ravel()
+        if slope_range is not None:
+            keep=(slope>=slope_range[0])&(slope<=slope_range[1])
+            slope,intercept=slope[keep],intercept[keep]
+        if slope.size==0:
+            continue
+        count,miss=score_hypotheses(slope,intercept,bright,sorted_ref,tol)
+        top=np.lexsort((miss,-count))[0]
+        if count[top]>best[0] or (count[top]==best[0] and miss[top]<best[1]):
+            best=(count[top],miss[top],slope[top],intercept[top])
+    if best[0]<3:
+        raise ValueError("No consistent match between peaks and reference lines")
+
+    slope,intercept=best[2],best[3]
+    for iteration in range(3): # refine on all peaks, then rematch
+        predicted=slope*peaks+intercept
+        nearest=_nearest(sorted_ref,predicted)
+        hit=np.abs(sorted_ref[nearest]-predicted)/abs(slope)<tol
+        pixel_array,ref_array=_one_to_one(peaks[hit],sorted_ref[nearest[hit]],predicted[hit])
+        slope,intercept=np.polyfit(pixel_array,ref_array,1)
+    order=np.argsort(pixel_array)
+    return pixel_array[order],ref_array[order]
+
+def _one_to_one(pixel_array,ref_array,predicted):
+    '''keep the closest peak when several claim the same reference line'''
+    order=np.lexsort((np.abs(ref_array-predicted),ref_array))
+    pixel_array,ref_array=pixel_array[order],ref_array[order]
+    first=np.concatenate([[True],np.diff(ref_array)>0])
+    return pixel_array[first],ref_array[first]
+
+@profile.timed('match')
+def auto_pairs(xdata,ydata,ref_values,mode='wavelength',laser_wavelength=None,snr=5.0,tol=1.0,
+               slope_range=None,max_peaks=15):
+    '''
+    detect -> match, returns pixel_array and ref_array in the units of ref_values
+    (nm for mode 'wavelength', cm-1 for mode 'shift'), ready for core.calibrate
+    '''
+    ref_values=np.asarray(ref_values,dtype=float)
+    if mode=='shift':
+        if laser_wavelength is None:
+            raise ValueError("Raman pump wavelength is needed to match Raman shift lines")
+        ref_nm=shift_to_wavelength(ref_values,laser_wavelength)
+    else:
+        ref_nm=ref_values
+    peaks,heights=detect_peaks(xdata,ydata,snr)
+    pixel_array,matched_nm=match_lines(peaks,ref_nm,tol,slope_range,max_peaks)
+    if mode=='shift': # back to the listed values, not the rounded-trip ones
+        matched=ref_values[_nearest_unsorted(ref_nm,matched_nm)]
+    else:
+        matched=matched_nm
+    return pixel_array,matched
+
+def _nearest_unsorted(values,targets):
+    return np.argmin(np.abs(values[None,:]-targets[:,None]),axis=1)
+
+def auto_calibrate(xdata,ydata,ref_values,mode='wavelength',laser_wavelength=None,model_options=None,**kwargs):
+    '''
+    detect, match and calibrate in one call, returns core.Calibration
+    model_options are passed to core.calibrate, e.g. {'model':'polynomial','order':3}
+    '''
+    pixel_array,ref_array=auto_pairs(xdata,ydata,ref_values,mode,laser_wavelength,**kwargs)
+    return core.calibrate(pixel_array,ref_array,mode,laser_wavelength,**(model_options or {}))
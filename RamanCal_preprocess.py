@@ -0,0 +1,282 @@
+'''
+RamanCal preprocess
+cleaning of spectra before peak fitting and export: dark/bias subtraction, cosmic-ray removal, baseline
+
+A Pipeline is an ordered list of steps; a step is any callable taking a float (spectra,pixels) stack
+and returning a new one of the same shape, so a batch block goes through every step in one vectorized pass.
+Built-in steps:
+    dark       DarkSubtraction   minus bias and an exposure-scaled dark frame
+    despike    MedianDespike     runs of at most max_width points standing out of the running median by
+                                 threshold x noise are cosmic rays, replaced by the median; wider runs are lines
+    frames     FrameDespike      repeated exposures of one spot: points above the median over the exposures
+    baseline   ALSBaseline       asymmetric least squares (Eilers) with a banded Cholesky; a large stack is solved
+                                 for all spectra at once, pixel by pixel with every spectrum in one vector
+New steps: register_step(name,factory). Pipelines can be written as text, as on the command line:
+
+    pipeline=Pipeline([DarkSubtraction('dark.npy'),MedianDespike(),ALSBaseline(lam=1e5,p=0.01)])
+    pipeline=Pipeline.from_specs(['dark:dark=dark.npy','despike:size=7','baseline:lam=1e6'])
+    clean=pipeline(spectra)                   # (pixels,) or (spectra,pixels)
+'''
+#----------------
+import numpy as np
+import RamanCal_io
+import RamanCal_profile as profile
+#----------------
+steps={} # name -> factory(**options) returning a step
+
+def register_step(name,factory):
+    steps[name]=factory
+
+def _master(frame):
+    '''a path or array of one or several frames -> one (pixels,) frame, the mean of a stack'''
+    if isinstance(frame,str):
+        array=RamanCal_io.load_array(frame)
+        try:
+            frame=np.array(array[:,1] if array.ndim==2 and array.shape[1]==2 else array,dtype=float) # two column text: pixel, intensity
+        finally:
+            RamanCal_io.close_array(array)
+    frame=np.asarray(frame,dtype=float)
+    return frame.reshape(-1,frame.shape[-1]).mean(axis=0)
+
+class DarkSubtraction():
+    '''
+    spectra-bias-scale*(dark-bias); dark and bias are paths or arrays, stacks are averaged first
+    scale is the exposure ratio spectrum/dark
+    '''
+    def __init__(self,dark=None,bias=None,scale=1.0):
+        self.bias=None if bias is None else _master(bias)
+        self.dark=None if dark is None else _master(dark)
+        self.scale=float(scale)
+        self.offset=0.0
+        if self.bias is not None:
+            self.offset=self.offset+self.bias
+        if self.dark is not None:
+            self.offset=self.offset+self.scale*(self.dark-(0.0 if self.bias is None else self.bias))
+
+    def __call__(self,spectra):
+        return spectra-self.offset
+
+def _noise(residual):
+    '''robust standard deviation along the last axis'''
+    return 1.4826*np.median(np.abs(residual),axis=-1,keepdims=True)
+
+def _short_runs(mask,max_width):
+    '''the True runs of mask (along the last axis) no longer than max_width'''
+    rows,npixel=mask.shape
+    padded=np.zeros((rows,npixel+1),dtype=bool) # False column keeps runs from joining across rows
+    padded[:,:npixel]=mask
+    flat=padded.ravel()
+    starts=flat&~np.concatenate([[False],flat[:-1]])
+    run=np.cumsum(starts)*flat # run number of every True point, 0 elsewhere
+    length=np.bincount(run)
+    short=flat&(length[run]<=max_width)
+    return short.reshape(rows,npixel+1)[:,:npixel]
+
+def _grow(mask,grow):
+    grown=mask.copy()
+    for shift in range(1,grow+1):
+        grown[:,shift:]|=mask[:,:-shift]
+        grown[:,:-shift]|=mask[:,shift:]
+    return grown
+
+class MedianDespike():
+    '''
+    cosmic rays of single spectra: points above the running median of size points by more than threshold
+    times the noise, in runs of at most max_width points (narrower than any line), are replaced by the median
+    together with grow points on each side
+    '''
+    def __init__(self,size=7,threshold=8.0,max_width=2,grow=1):
+        self.size=int(size)
+        self.threshold=float(threshold)
+        self.max_width=int(max_width)
+        self.grow=int(grow)
+
+    def __call__(self,spectra):
+        from scipy.ndimage import median_filter
+        median=median_filter(spectra,size=(1,self.size),mode='nearest')
+        residual=spectra-median
+        spikes=_short_runs(residual>self.threshold*_noise(residual),self.max_width)
+        if not spikes.any():
+            return spectra
+        return np.where(_grow(spikes,self.grow),median,spectra)
+
+class FrameDespike():
+    '''
+    cosmic rays of repeated exposures: every group consecutive spectra are exposures of one spot
+    (all of them when group is None, at least 3); points above the median over the group by more than
+    threshold times the spread (MAD over the group, at least the shot noise) are replaced by that median
+    '''
+    def __init__(self,group=None,threshold=6.0):
+        self.group=None if group is None else int(group)
+        self.threshold=float(threshold)
+
+    def __call__(self,spectra):
+        count,npixel=spectra.shape
+        group=count if self.group is None else self.group
+        if group<3 or count%group:
+            raise ValueError("Frame despiking needs groups of 3 or more exposures, got {0} spectra in groups of {1}".format(count,group))
+        frames=spectra.reshape(-1,group,npixel)
+        median=np.median(frames,axis=1,keepdims=True)
+        spread=np.maximum(1.4826*np.median(np.abs(frames-median),axis=1,keepdims=True),np.sqrt(np.abs(median)))
+        spikes=frames-median>self.threshold*np.maximum(spread,np.finfo(float).tiny)
+        return np.where(spikes,median,frames).reshape(count,npixel)
+
+def _difference_bands(npixel,count,lam):
+    '''
+    upper band storage (solveh_banded) of lam*D'D for count spectra of npixel points,
+    D the second difference; the blocks do not couple, so the whole stack is one banded matrix
+    '''
+    diagonal=np.full(npixel,6.0)
+    diagonal[[0,-1]]=1.0
+    diagonal[[1,-2]]=5.0
+    first=np.full(npixel,-4.0)
+    first[[1,-1]]=-2.0
+    first[0]=0.0 # entries coupling to the previous spectrum
+    second=np.ones(npixel)
+    second[:2]=0.0
+    return lam*np.array([np.tile(second,count),np.tile(first,count),np.tile(diagonal,count)])
+
+def solve_pentadiagonal(diagonal,first,second,rhs):
+    '''
+    symmetric positive definite pentadiagonal systems sharing their off-diagonals, one per column:
+    diagonal and rhs (pixels,systems), first[i]=A[i,i+1], second[i]=A[i,i+2];
+    LDL^T without pivoting, every step vectorized over the systems
+    '''
+    npixel=diagonal.shape[0]
+    D=np.empty_like(diagonal)
+    l1=np.zeros_like(diagonal) # L[i+1,i]
+    l2=np.zeros_like(diagonal) # L[i+2,i]
+    z=np.array(rhs,dtype=float)
+    for i in range(npixel):
+        Di=diagonal[i].copy()
+        if i>=1:
+            Di-=l1[i-1]**2*D[i-1]
+            z[i]-=l1[i-1]*z[i-1]
+        if i>=2:
+            Di-=l2[i-2]**2*D[i-2]
+            z[i]-=l2[i-2]*z[i-2]
+        D[i]=Di
+        if i+1<npixel:
+            l1[i]=first[i]/Di if i==0 else (first[i]-l2[i-1]*D[i-1]*l1[i-1])/Di
+        if i+2<npixel:
+            l2[i]=second[i]/Di
+    z/=D
+    for i in range(npixel-2,-1,-1):
+        z[i]-=l1[i]*z[i+1]
+        if i+2<npixel:
+            z[i]-=l2[i]*z[i+2]
+    return z
+
+def _als_banded(spectra,lam,p,niter):
+    '''few spectra: the stack as one banded matrix, one LAPACK Cholesky (solveh_banded) per iteration'''
+    from scipy.linalg import solveh_banded
+    count,npixel=spectra.shape
+    bands=_difference_bands(npixel,count,lam)
+    diagonal=bands[2].copy()
+    y=spectra.ravel()
+    weight=np.ones(y.size)
+    for iteration in range(niter):
+        bands[2]=diagonal+weight
+        baseline=solveh_banded(bands,weight*y,overwrite_ab=False,check_finite=False)
+        new_weight=np.where(y>baseline,p,1.0-p)
+        if np.array_equal(new_weight,weight):
+            break
+        weight=new_weight
+    return baseline.reshape(count,npixel)
+
+def _als_batched(spectra,lam,p,niter):
+    '''many spectra: solve_pentadiagonal across the stack, spectra whose weights settled drop out'''
+    count,npixel=spectra.shape
+    second,first,diagonal=_difference_bands(npixel,1,lam)
+    y=np.ascontiguousarray(spectra.T) # (pixels,spectra), a pixel of all spectra is one vector
+    baseline=np.empty_like(y)
+    weight=np.ones_like(y)
+    active=np.arange(count)
+    for iteration in range(niter):
+        w=np.take(weight,active,axis=1) # C order, indexing would give strided rows
+        ya=np.take(y,active,axis=1)
+        z=solve_pentadiagonal(diagonal[:,None]+w,first[1:],second[2:],w*ya)
+        baseline[:,active]=z
+        new_weight=np.where(ya>z,p,1.0-p)
+        changed=(new_weight!=w).any(axis=0)
+        weight[:,active]=new_weight
+        active=active[changed]
+        if not active.size:
+            break
+    return baseline.T
+
+def als_baseline(spectra,lam=1e5,p=0.01,niter=10,batch_min=32):
+    '''
+    asymmetric least squares baseline of every spectrum of a (spectra,pixels) stack
+    minimises sum w*(y-z)^2+lam*sum (second difference of z)^2, w=p above the baseline, 1-p below
+    stacks of batch_min spectra or more are solved together by solve_pentadiagonal, fewer by LAPACK
+    '''
+    spectra=np.atleast_2d(np.asarray(spectra,dtype=float))
+    count,npixel=spectra.shape
+    if npixel<4:
+        return spectra.copy()
+    if count<batch_min:
+        return _als_banded(spectra,lam,p,niter)
+    return _als_batched(spectra,lam,p,niter)
+
+class ALSBaseline():
+    '''subtract the asymmetric least squares baseline, see als_baseline; lam sets the stiffness, p the asymmetry'''
+    def __init__(self,lam=1e5,p=0.01,niter=10):
+        self.lam=float(lam)
+        self.p=float(p)
+        self.niter=int(niter)
+
+    def __call__(self,spectra):
+        return spectra-als_baseline(spectra,self.lam,self.p,self.niter)
+
+register_step('dark',DarkSubtraction)
+register_step('despike',MedianDespike)
+register_step('frames',FrameDespike)
+register_step('baseline',ALSBaseline)
+
+def _value(text):
+    for kind in (int,float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+def make_step(spec):
+    '''"name" or "name:key=value,key=value" -> step, numbers are converted'''
+    name,_,arguments=spec.partition(':')
+    if name not in steps:
+        raise ValueError("Unknown preprocessing step: {0} (known: {1})".format(name,", ".join(sorted(steps))))
+    options={}
+    for item in filter(None,arguments.split(',')):
+        key,_,value=item.partition('=')
+        options[key.strip().replace('-','_')]=_value(value.strip())
+    return steps[name](**options)
+
+class Pipeline():
+    '''steps applied in order to a spectrum (pixels,) or a stack (spectra,pixels); the input is not modified'''
+    def __init__(self,steps=None):
+        self.steps=list(steps or [])
+
+    @classmethod
+    def from_specs(cls,specs):
+        return cls([make_step(spec) for spec in specs])
+
+    def append(self,step):
+        self.steps.append(step)
+        return self
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __call__(self,spectra):
+        spectra=np.asarray(spectra,dtype=float)
+        stack=np.atleast_2d(spectra)
+        with profile.stage('preprocess'):
+            for step in self.steps:
+                stack=step(stack)
+        return stack[0] if spectra.ndim==1 else stack
+
+def default_pipeline():
+    '''cosmic rays and baseline, the GUI's "clean spectrum" box'''
+    return Pipeline([MedianDespike(),ALSBaseline()])
@@ -0,0 +1,204 @@
+'''
+RamanCal profile
+opt-in instrumentation of the hot paths: per-stage timers, counters, memory watermarks, cProfile
+
+Off by default; a disabled stage costs one flag test. Instrumented in RamanCal_core:
+    load          load_spectrum
+    preprocess    RamanCal_preprocess.Pipeline (dark, despike, baseline)
+    window        range cut of fit_peak, window_stack of the batched fit
+    fit_lmfit     fit_peak (counter lmfit_evaluations)
+    fit_batch     fit_stack, the batched fit of fit_gaussians and RamanCal_ccd (counter peaks)
+    calibrate     calibrate_wavelength/_shift/_polynomial/_grating, the model fits
+    ransac        hypothesis scoring of calibrate_robust
+    export        save_cal
+    match         peak detection and line matching (RamanCal_match.auto_pairs)
+Every stage records calls, total/min/max seconds and the process peak RSS when it ended;
+enable(memory_peaks=True) adds the peak Python allocation inside the stage (tracemalloc, slows everything down).
+
+    import RamanCal_profile as profile
+    profile.enable()
+    ...                                   # GUI or batch work
+    profile.save('profile.json')          # or profile.report(), profile.format_report()
+    with profile.cprofile('run.prof'):    # full cProfile of a block, pstats file
+        ...
+'''
+#----------------
+import sys
+import json
+import time
+import threading
+import functools
+import contextlib
+import tracemalloc
+try:
+    import resource # not on Windows
+except ImportError:
+    resource=None
+#----------------
+enabled=False
+memory=False
+stats={} # stage -> {'calls','total_s','min_s','max_s','rss_peak_MB','alloc_peak_MB'}
+counters={}
+_lock=threading.Lock()
+_local=threading.local() # per-thread stack of open stages for the allocation peaks
+
+def enable(memory_peaks=False):
+    global enabled,memory
+    enabled=True
+    memory=memory_peaks
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    global enabled,memory
+    enabled=False
+    if memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    memory=False
+
+def reset():
+    with _lock:
+        stats.clear()
+        counters.clear()
+
+def rss_peak_MB():
+    '''peak resident memory of the process so far, None where unknown'''
+    if resource is None:
+        return None
+    peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2.0**20 if sys.platform=='darwin' else peak/1024.0 # bytes on macOS, kB elsewhere
+
+def record(name,seconds,alloc_peak=None):
+    with _lock:
+        entry=stats.get(name)
+        if entry is None:
+            entry=stats[name]={'calls':0,'total_s':0.0,'min_s':float('inf'),'max_s':0.0,'rss_peak_MB':None}
+        entry['calls']+=1
+        entry['total_s']+=seconds
+        entry['min_s']=min(entry['min_s'],seconds)
+        entry['max_s']=max(entry['max_s'],seconds)
+        entry['rss_peak_MB']=rss_peak_MB()
+        if alloc_peak is not None:
+            entry['alloc_peak_MB']=max(entry.get('alloc_peak_MB',0.0),alloc_peak/2**20)
+
+def count(name,amount=1):
+    if not enabled:
+        return
+    with _lock:
+        counters[name]=counters.get(name,0)+amount
+
+class _Stage():
+    def __init__(self,name):
+        self.name=name
+
+    def __enter__(self):
+        if memory:
+            stack=getattr(_local,'stack',None)
+            if stack is None:
+                stack=_local.stack=[]
+            current,peak=tracemalloc.get_traced_memory()
+            if stack: # the enclosing stage keeps the peak seen so far
+                stack[-1][1]=max(stack[-1][1],peak)
+            tracemalloc.reset_peak()
+            stack.append([current,0])
+        self.start=time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        seconds=time.perf_counter()-self.start
+        alloc_peak=None
+        if memory:
+            stack=_local.stack
+            base,seen=stack.pop()
+            peak=max(tracemalloc.get_traced_memory()[1],seen)
+            alloc_peak=peak-base
+            if stack:
+                stack[-1][1]=max(stack[-1][1],peak)
+        record(self.name,seconds,alloc_peak)
+        return False
+
+_null=contextlib.nullcontext()
+
+def stage(name):
+    '''context manager timing one stage, a shared no-op while disabled'''
+    return _Stage(name) if enabled else _null
+
+def timed(name):
+    '''decorator: the whole function is one stage'''
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args,**kwargs):
+            if not enabled:
+                return function(*args,**kwargs)
+            with _Stage(name):
+                return function(*args,**kwargs)
+        return wrapper
+    return decorate
+
+def snapshot():
+    '''copy of stats and counters, e.g. to send from a worker process'''
+    with _lock:
+        return {'stages':{name:dict(entry) for name,entry in stats.items()},'counters':dict(counters)}
+
+def merge(other):
+    '''add a snapshot() taken elsewhere (worker process) into this process'''
+    with _lock:
+        for name,theirs in other['stages'].items():
+            entry=stats.setdefault(name,{'calls':0,'total_s':0.0,'min_s':float('inf'),'max_s':0.0,'rss_peak_MB':None})
+            entry['calls']+=theirs['calls']
+            entry['total_s']+=theirs['total_s']
+            entry['min_s']=min(entry['min_s'],theirs['min_s'])
+            entry['max_s']=max(entry['max_s'],theirs['max_s'])
+            for key in ['rss_peak_MB','alloc_peak_MB']:
+                values=[value for value in [entry.get(key),theirs.get(key)] if value is not None]
+                if values:
+                    entry[key]=max(values)
+        for name,amount in other['counters'].items():
+            counters[name]=counters.get(name,0)+amount
+
+def report():
+    '''JSON-able dict: stages with mean_s added, counters, slowest stage by total time'''
+    data=snapshot()
+    for entry in data['stages'].values():
+        entry['mean_s']=entry['total_s']/entry['calls'] if entry['calls'] else 0.0
+    data['slowest']=max(data['stages'],key=lambda name:data['stages'][name]['total_s']) if data['stages'] else None
+    return data
+
+def save(path):
+    with open(path,'w') as f:
+        json.dump(report(),f,indent=1)
+    return path
+
+def format_report():
+    '''text table for logs and the GUI'''
+    data=report()
+    lines=["{0:<12}{1:>8}{2:>12}{3:>12}{4:>12}{5:>10}".format('stage','calls','total s','mean ms','max ms','RSS MB')]
+    for name,entry in sorted(data['stages'].items(),key=lambda item:-item[1]['total_s']):
+        lines.append("{0:<12}{1:>8}{2:>12.4f}{3:>12.3f}{4:>12.3f}{5:>10}".format(name,entry['calls'],entry['total_s'],
+                     entry['mean_s']*1e3,entry['max_s']*1e3,
+                     '-' if entry['rss_peak_MB'] is None else "{0:.1f}".format(entry['rss_peak_MB'])))
+    for name,amount in sorted(data['counters'].items()):
+        lines.append("{0}: {1}".format(name,amount))
+    return '\n'.join(lines)
+
+@contextlib.contextmanager
+def cprofile(path=None,sort='cumulative',limit=30):
+    '''
+    cProfile the block; the pstats file goes to path, the top `limit` lines by `sort`
+    are left in the yielded dict under 'text' once the block is done
+    '''
+    import io
+    import pstats
+    import cProfile
+    profiler=cProfile.Profile()
+    result={}
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
+        text=io.StringIO()
+        pstats.Stats(profiler,stream=text).sort_stats(sort).print_stats(limit)
+        result['text']=text.getvalue()
@@ -0,0 +1,131 @@
+'''
+RamanCal refs
+indexed library of reference lines, parsed once from the Wavelength_*/Wavenumbers_* files
+
+Lines are kept as one record array sorted by value, fields
+    value    nm for wavelength files, cm-1 for Raman shift (Wavenumbers_*) files
+    name     element or species, "Ne", "chx"
+    section  header above the entry, "for 1200g633nm", '' before the first header
+    source   file name
+    path     absolute path of the file, the key a file is replaced by when re-read; a user file named like
+             a bundled one adds its lines next to the bundled ones, under the same source
+    kind     'wavelength' or 'shift'
+Group filters (name/section/source/path/kind) map to index arrays built on first use, range and
+tolerance queries are np.searchsorted on the sorted values of the group, no text on the hot path.
+
+    library=default_library()
+    library.window(630,640,name='Ne')['value']
+    library.within(633.44,0.05,kind='wavelength')
+    library.values(section='for 1200g633nm',source='Wavelength_Ref_Ne.txt')
+'''
+#----------------
+import os
+import glob
+import numpy as np
+import RamanCal_core as core
+#----------------
+here=os.path.dirname(os.path.abspath(__file__))
+bundled_patterns=['Wavelength_*.txt','Wavenumbers_*.txt']
+line_dtype=[('value','f8'),('name','U16'),('section','U64'),('source','U128'),('path','U512'),('kind','U10')]
+
+def file_kind(path):
+    '''Raman shift tables are named Wavenumbers_*, everything else holds wavelengths'''
+    return 'shift' if os.path.basename(path).startswith('Wavenumbers') else 'wavelength'
+
+def read_lines(path,kind=None):
+    '''records of one reference file in file order, plus the file row of each record'''
+    with open(path) as f:
+        rows=list(core.parse_ref_rows(f.readlines()))
+    kind=file_kind(path) if kind is None else kind
+    path=os.path.abspath(path)
+    source=os.path.basename(path)
+    records=np.array([(value,name,section or '',source,path,kind) for row,section,name,value in rows],dtype=line_dtype)
+    return records,np.array([row for row,section,name,value in rows],dtype=int)
+
+class LineLibrary():
+    def __init__(self,paths=(),kind=None):
+        self.lines=np.zeros(0,dtype=line_dtype)
+        self._groups={}
+        self._loaded={} # path -> mtime, files are not parsed twice
+        for path in paths:
+            self.add_file(path,kind)
+
+    def add_file(self,path,kind=None):
+        '''parse a (user supplied) reference file into the library; a file already loaded is re-read only if it changed'''
+        path=os.path.abspath(path)
+        mtime=os.path.getmtime(path)
+        if self._loaded.get(path)==mtime:
+            return self
+        records,rows=read_lines(path,kind)
+        lines=np.concatenate([self.lines[self.lines['path']!=path],records])
+        self.lines=lines[np.argsort(lines['value'],kind='stable')]
+        self._groups={}
+        self._loaded[path]=mtime
+        return self
+
+    def __len__(self):
+        return self.lines.size
+
+    def group(self,name=None,section=None,source=None,kind=None,path=None):
+        '''indices (into the sorted lines) of the entries matching every given field, cached'''
+        key=(name,section,source,kind,None if path is None else os.path.abspath(path))
+        if key not in self._groups:
+            mask=np.ones(self.lines.size,dtype=bool)
+            for field,wanted in zip(['name','section','source','kind','path'],key):
+                if wanted is not None:
+                    mask&=self.lines[field]==wanted
+            index=np.flatnonzero(mask)
+            self._groups[key]=(index,self.lines['value'][index])
+        return self._groups[key]
+
+    def select(self,**filters):
+        '''all lines of a group, sorted by value'''
+        index,values=self.group(**filters)
+        return self.lines[index]
+
+    def values(self,unique=True,**filters):
+        '''sorted values of a group, duplicates (same line listed in several sections) merged by default'''
+        index,values=self.group(**filters)
+        return np.unique(values) if unique else values
+
+    def window(self,low,high,**filters):
+        '''lines with low <= value <= high'''
+        index,values=self.group(**filters)
+        start=np.searchsorted(values,low,side='left')
+        stop=np.searchsorted(values,high,side='right')
+        return self.lines[index[start:stop]]
+
+    def within(self,value,delta,**filters):
+        '''lines within +-delta of value'''
+        return self.window(value-delta,value+delta,**filters)
+
+    def nearest(self,targets,**filters):
+        '''nearest line of the group for every target value, and the distance'''
+        index,values=self.group(**filters)
+        if values.size==0:
+            raise ValueError("No reference line matches "+str(filters))
+        targets=np.asarray(targets,dtype=float)
+        right=np.minimum(np.searchsorted(values,targets),values.size-1)
+        left=np.maximum(right-1,0)
+        pick=np.where(np.abs(values[left]-targets)<=np.abs(values[right]-targets),left,right)
+        return self.lines[index[pick]],np.abs(values[pick]-targets)
+
+    def sections(self,source=None):
+        '''section headers present, optionally of one file'''
+        lines=self.lines if source is None else self.lines[self.lines['source']==source]
+        return sorted(set(str(item) for item in lines['section']))
+
+_default=None
+def default_library():
+    '''library of all bundled reference files, built once per process'''
+    global _default
+    if _default is None:
+        paths=sorted(path for pattern in bundled_patterns for path in glob.glob(os.path.join(here,pattern)))
+        _default=LineLibrary(paths)
+    return _default
+
+def library_values(ref_file_name,section=None):
+    '''sorted values of one reference file, through the default library so the file is parsed once'''
+    library=default_library()
+    library.add_file(ref_file_name)
+    return library.values(unique=False,path=ref_file_name,section=section)
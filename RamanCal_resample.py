@@ -0,0 +1,128 @@
+'''
+RamanCal resample
+calibrated spectra onto a common uniform nm / cm-1 / eV grid, for averaging and stitching
+
+Every method is linear in the spectrum, so it is built once per (calibrated axis, grid) as a sparse
+(grid,pixels) operator and applied to all spectra sharing the calibration by one sparse product:
+    linear   2 neighbours per grid point
+    cubic    4-point Lagrange interpolation on the (non-uniform) calibrated axis
+    flux     overlap of pixel bins with grid bins, counts are conserved (sum over the grid = sum over pixels covered)
+Grid points the axis does not cover come out NaN.
+
+    resampler=Resampler(calibration,xdata,np.arange(100,3000,1.0),'wavenumber','flux')
+    on_grid=resampler(spectra)                          # (spectra,grid)
+    mean=merge([(calibration_a,xdata,frames_a),(calibration_b,xdata,frames_b)],grid,'wavenumber')
+'''
+#----------------
+import numpy as np
+import scipy.sparse
+#----------------
+methods=('linear','cubic','flux')
+
+def _sorted(axis):
+    axis=np.asarray(axis,dtype=float)
+    order=np.argsort(axis,kind='stable') # wavenumber and eV axes can run backwards
+    return order,axis[order]
+
+def linear_matrix(axis,grid):
+    order,sorted_axis=_sorted(axis)
+    right=np.clip(np.searchsorted(sorted_axis,grid),1,sorted_axis.size-1)
+    left=right-1
+    weight=(grid-sorted_axis[left])/(sorted_axis[right]-sorted_axis[left])
+    valid=(grid>=sorted_axis[0])&(grid<=sorted_axis[-1])
+    rows=np.repeat(np.arange(grid.size),2)
+    columns=order[np.column_stack([left,right]).ravel()]
+    values=np.column_stack([1-weight,weight]).ravel()
+    return rows,columns,values,valid
+
+def cubic_matrix(axis,grid):
+    order,sorted_axis=_sorted(axis)
+    if sorted_axis.size<4:
+        return linear_matrix(axis,grid)
+    right=np.searchsorted(sorted_axis,grid)
+    start=np.clip(right-2,0,sorted_axis.size-4) # 2 nodes each side, shifted inward at the ends
+    nodes=start[:,None]+np.arange(4)
+    x=sorted_axis[nodes]
+    weights=np.ones((grid.size,4))
+    for k in range(4):
+        for m in range(4):
+            if m!=k:
+                weights[:,k]*=(grid-x[:,m])/(x[:,k]-x[:,m])
+    valid=(grid>=sorted_axis[0])&(grid<=sorted_axis[-1])
+    rows=np.repeat(np.arange(grid.size),4)
+    return rows,order[nodes].ravel(),weights.ravel(),valid
+
+def edges(centers):
+    '''bin edges halfway between sorted centers, end bins mirrored'''
+    middle=(centers[1:]+centers[:-1])/2
+    return np.concatenate([[2*centers[0]-middle[0]],middle,[2*centers[-1]-middle[-1]]])
+
+def flux_matrix(axis,grid):
+    order,sorted_axis=_sorted(axis)
+    pixel_edges=edges(sorted_axis)
+    grid_edges=edges(grid)
+    low=max(pixel_edges[0],grid_edges[0])
+    high=min(pixel_edges[-1],grid_edges[-1])
+    points=np.union1d(pixel_edges,grid_edges)
+    points=points[(points>=low)&(points<=high)]
+    middle=(points[1:]+points[:-1])/2 # one piece per (pixel bin,grid bin) overlap
+    pixel=np.searchsorted(pixel_edges,middle)-1
+    cell=np.searchsorted(grid_edges,middle)-1
+    width=np.diff(pixel_edges)
+    values=np.diff(points)/width[pixel] # share of the pixel counts falling into the grid bin
+    valid=(grid_edges[:-1]>=pixel_edges[0])&(grid_edges[1:]<=pixel_edges[-1]) # fully covered bins only
+    return cell,order[pixel],values,valid
+
+builders={'linear':linear_matrix,'cubic':cubic_matrix,'flux':flux_matrix}
+
+def resample_matrix(axis,grid,method='linear'):
+    '''sparse (grid,pixels) operator and the mask of grid points covered by axis; grid ascending'''
+    if method not in builders:
+        raise ValueError("Unknown resampling method: "+str(method))
+    grid=np.asarray(grid,dtype=float)
+    rows,columns,values,valid=builders[method](axis,grid)
+    matrix=scipy.sparse.csr_matrix((values,(rows,columns)),shape=(grid.size,np.size(axis)))
+    matrix.sum_duplicates()
+    return matrix,valid
+
+class Resampler():
+    '''operator of one calibration, detector and grid; call it on a spectrum (pixels,) or a stack (spectra,pixels)'''
+    def __init__(self,calibration,xdata,grid,unit='wavenumber',method='linear'):
+        self.grid=np.asarray(grid,dtype=float)
+        self.unit=unit
+        self.method=method
+        self.axis=calibration.axes(xdata).axis(unit)
+        self.matrix,self.valid=resample_matrix(self.axis,self.grid,method)
+
+    def __call__(self,spectra):
+        spectra=np.asarray(spectra,dtype=float)
+        result=self.matrix.dot(spectra.T).T
+        result[...,~self.valid]=np.nan
+        return result
+
+def operator_key(calibration,xdata):
+    '''what a Resampler depends on: the calibration's model, coefficients and settings and the xdata values'''
+    xdata=np.ascontiguousarray(xdata,dtype=float)
+    return (calibration.model,np.asarray(calibration.coefficients,dtype=float).tobytes(),
+            tuple(sorted(calibration.options().items())),calibration.laser_wavelength,xdata.shape,xdata.tobytes())
+
+def merge(frames,grid,unit='wavenumber',method='linear'):
+    '''
+    mean spectrum on grid of frames [(calibration,xdata,spectra (n,pixels) or (pixels,)),...]
+    frames with the same calibration and xdata are summed before their operator is applied, one product per operator_key;
+    every grid point is averaged over the spectra that cover it, NaN where none does
+    '''
+    grid=np.asarray(grid,dtype=float)
+    total=np.zeros(grid.size)
+    count=np.zeros(grid.size)
+    resamplers={}
+    for calibration,xdata,spectra in frames:
+        key=operator_key(calibration,xdata)
+        if key not in resamplers:
+            resamplers[key]=Resampler(calibration,xdata,grid,unit,method)
+        resampler=resamplers[key]
+        spectra=np.atleast_2d(np.asarray(spectra,dtype=float))
+        total[resampler.valid]+=resampler.matrix.dot(spectra.sum(axis=0))[resampler.valid]
+        count[resampler.valid]+=spectra.shape[0]
+    with np.errstate(invalid='ignore',divide='ignore'):
+        return np.where(count>0,total/count,np.nan)
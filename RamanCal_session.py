@@ -0,0 +1,184 @@
+'''
+RamanCal session
+incremental calibration: running normal-equation sums of a weighted polynomial fit
+
+Each pixel/reference pair adds w*phi*phi^T and w*phi*y to the sums, phi=(1,t,...,t^k) with
+t=(pixel-center)/scale; removing or re-weighting a pair subtracts it again. An update costs O(k^2),
+a solve O(k^3) on a (k+1)x(k+1) system, independent of the number of pairs.
+Raman shifts are turned into nm with the pump wavelength, so the fit stays linear in its coefficients.
+
+    session=CalibrationSession(order=1,center=512,scale=512)
+    first=session.add(101.2,626.6495)
+    session.add(523.9,630.47889)
+    session.calibration().slope
+    session.remove(first)
+
+decay(factor) scales down all old pairs at once, for tracking a drifting detector.
+'''
+#----------------
+import numpy as np
+import RamanCal_core as core
+#----------------
+class CalibrationSession():
+    rebuild_every=1000 # downdates before the sums are rebuilt from the pairs, against round-off
+
+    def __init__(self,order=1,center=0.0,scale=1.0,mode='wavelength',laser_wavelength=None):
+        if mode=='shift' and laser_wavelength is None:
+            raise ValueError("Raman pump wavelength is needed to calibrate with Raman shift")
+        self.order=int(order)
+        self.center=float(center)
+        self.scale=float(scale)
+        self.mode=mode
+        self.laser_wavelength=laser_wavelength
+        self.points={} # id -> [pixel,ref as given,nm,weight]
+        self.order_of_ids=[] # insertion order, used by sync()
+        self.next_id=0
+        self.clear()
+
+    def clear(self):
+        size=self.order+1
+        self.normal=np.zeros((size,size)) # sum w phi phi^T
+        self.moment=np.zeros(size) # sum w phi y
+        self.sum_wyy=0.0
+        self.downdates=0
+        self.points={}
+        self.order_of_ids=[]
+        self._calibration=None
+
+    def phi(self,pixel):
+        return ((float(pixel)-self.center)/self.scale)**np.arange(self.order+1)
+
+    def to_nm(self,ref):
+        return core.shift_to_wavelength(ref,self.laser_wavelength) if self.mode=='shift' else float(ref)
+
+    def _accumulate(self,pixel,nm,weight):
+        phi=self.phi(pixel)
+        self.normal+=weight*np.outer(phi,phi)
+        self.moment+=weight*nm*phi
+        self.sum_wyy+=weight*nm*nm
+        self._calibration=None
+
+    def add(self,pixel,ref,weight=1.0):
+        '''add a pair, returns its id'''
+        point_id=self.next_id
+        self.next_id+=1
+        nm=float(self.to_nm(ref))
+        self.points[point_id]=[float(pixel),float(ref),nm,float(weight)]
+        self.order_of_ids.append(point_id)
+        self._accumulate(pixel,nm,weight)
+        return point_id
+
+    def remove(self,point_id):
+        pixel,ref,nm,weight=self.points.pop(point_id)
+        self.order_of_ids.remove(point_id)
+        self._accumulate(pixel,nm,-weight)
+        self._count_downdate()
+
+    def reweight(self,point_id,weight):
+        point=self.points[point_id]
+        self._accumulate(point[0],point[2],float(weight)-point[3])
+        point[3]=float(weight)
+        self._count_downdate()
+
+    def decay(self,factor):
+        '''multiply every weight by factor (0<factor<=1), old pairs fade out'''
+        self.normal*=factor
+        self.moment*=factor
+        self.sum_wyy*=factor
+        for point in self.points.values():
+            point[3]*=factor
+        self._calibration=None
+
+    def _count_downdate(self):
+        self.downdates+=1
+        if self.downdates>=self.rebuild_every:
+            self.rebuild()
+
+    def rebuild(self):
+        '''recompute the sums from the stored pairs'''
+        points=self.points
+        order_of_ids=self.order_of_ids
+        self.clear()
+        self.points=points
+        self.order_of_ids=order_of_ids
+        for pixel,ref,nm,weight in points.values():
+            self._accumulate(pixel,nm,weight)
+
+    def sync(self,pairs):
+        '''
+        make the session hold exactly pairs [(pixel,ref),...] in this order, touching only what changed
+        after the longest common prefix: appending one pair costs one update
+        returns the ids in order
+        '''
+        common=0
+        for point_id,(pixel,ref) in zip(self.order_of_ids,pairs):
+            point=self.points[point_id]
+            if point[0]!=float(pixel) or point[1]!=float(ref):
+                break
+            common+=1
+        for point_id in self.order_of_ids[common:]:
+            self.remove(point_id)
+        for pixel,ref in pairs[common:]:
+            self.add(pixel,ref)
+        return list(self.order_of_ids)
+
+    def __len__(self):
+        return len(self.points)
+
+    def arrays(self):
+        '''pixel, ref, nm and weight arrays in insertion order'''
+        if not self.points:
+            return [np.zeros(0)]*4
+        table=np.array([self.points[point_id] for point_id in self.order_of_ids])
+        return table[:,0],table[:,1],table[:,2],table[:,3]
+
+    def solve(self):
+        '''coefficients, their covariance and the weighted residual variance'''
+        size=self.order+1
+        if len(self.points)<size:
+            raise ValueError("Need at least {0} points for order {1}".format(size,self.order))
+        coefficients=np.linalg.solve(self.normal,self.moment)
+        dof=len(self.points)-size
+        chi2=max(self.sum_wyy-coefficients.dot(self.moment),0.0)
+        variance=chi2/dof if dof>0 else np.nan
+        covariance=variance*np.linalg.inv(self.normal)
+        return coefficients,covariance,variance
+
+    def calibration(self):
+        '''current Calibration (linear for order 1, PolynomialCalibration above), cached until the next change'''
+        if self._calibration is not None:
+            return self._calibration
+        coefficients,covariance,variance=self.solve()
+        pixel_array,ref_array,nm_array,weights=self.arrays()
+        if self.order==1: # back to slope/intercept of the raw pixel
+            slope=coefficients[1]/self.scale
+            intercept=coefficients[0]-slope*self.center
+            jacobian=np.array([[0,1/self.scale],[1,-self.center/self.scale]])
+            self._calibration=core.Calibration(slope,intercept,self.laser_wavelength,pixel_array,ref_array,
+                                               self.report(coefficients,covariance,variance),
+                                               jacobian.dot(covariance).dot(jacobian.T),self.mode)
+        else:
+            self._calibration=core.PolynomialCalibration(coefficients,self.center,self.scale,self.laser_wavelength,
+                                                         pixel_array,ref_array,
+                                                         self.report(coefficients,covariance,variance),
+                                                         covariance,self.mode)
+        return self._calibration
+
+    def residuals(self):
+        '''reference minus fit in nm for every pair, insertion order'''
+        pixel_array,ref_array,nm_array,weights=self.arrays()
+        coefficients,covariance,variance=self.solve()
+        design=((pixel_array[:,None]-self.center)/self.scale)**np.arange(self.order+1)
+        return nm_array-design.dot(coefficients)
+
+    def report(self,coefficients,covariance,variance):
+        cal_res="Preview ({0} points, order {1}):\n".format(len(self.points),self.order)
+        if self.order==1:
+            slope=coefficients[1]/self.scale
+            cal_res=cal_res+"slope: {0} +/- {1}\nintercept: {2}\n".format(slope,np.sqrt(covariance[1,1])/self.scale,
+                                                                          coefficients[0]-slope*self.center)
+        else:
+            cal_res=cal_res+"".join("a{0}: {1} +/- {2}\n".format(k,value,np.sqrt(covariance[k,k]))
+                                    for k,value in enumerate(coefficients))
+        cal_res=cal_res+"rms residual (nm): {0}\n".format(np.sqrt(variance))
+        return cal_res
@@ -0,0 +1,188 @@
+'''
+RamanCal stream
+block-wise calibration of hyperspectral maps and time series in bounded memory
+
+Spectra are read `block` at a time from a memory-mapped stack (RamanCal_io) or from a
+list of spectrum files, put onto the calibrated axis, optionally resampled onto a common
+uniform axis (RamanCal_resample, linear/cubic/flux), and appended to a .npy file.
+Contiguous memory-mapped stacks are read with np.fromfile instead of through the mapping,
+so neither input nor output pages pile up and peak memory is a few blocks whatever the map size.
+
+    python RamanCal_stream.py map.npy --slope 0.05 --intercept 612 --unit wavenumber --grid 100 3000 1 --out map_cal.npy
+    python RamanCal_stream.py "run/*.txt" --lamp lamp.txt --ref Wavelength_Ref_Ne.txt --out run_cal.npy
+    python RamanCal_stream.py map.npy --slope 0.05 --intercept 612 --out map_cal.npz      # one container, RamanCal_container
+'''
+#----------------
+import sys
+import mmap
+import glob
+import argparse
+import numpy as np
+import RamanCal_core as core
+import RamanCal_io
+#----------------
+def spectral_shape(source):
+    '''(number of spectra,number of pixels) of a stack array or list of files'''
+    if isinstance(source,(list,tuple)):
+        xdata,ydata=core.load_spectrum(source[0])
+        return len(source),ydata.size
+    return int(np.prod(source.shape[:-1])),source.shape[-1]
+
+def _leading_slices(shape,block):
+    '''
+    index tuples covering the spectra of a stack with these leading dimensions in order, each an integer or
+    plain slice per axis (no fancy index, which h5py refuses over several axes) holding at most block spectra
+    '''
+    inner=int(np.prod(shape[1:]))
+    if inner<=block:
+        step=block//inner
+        for first in range(0,shape[0],step):
+            yield (slice(first,min(first+step,shape[0])),)
+    else:
+        for first in range(shape[0]):
+            for rest in _leading_slices(shape[1:],block):
+                yield (first,)+rest
+
+def iter_blocks(source,block=4096):
+    '''
+    yield (start,block of spectra as float64 (n,pixels)) from
+    an array-like with the spectral axis last (np.memmap, h5py dataset, ...) or a list of spectrum files
+    maps are read as whole slices along the leading axes, blocks hold at most block spectra
+    '''
+    if isinstance(source,(list,tuple)):
+        for start in range(0,len(source),block):
+            yield start,np.array([core.load_spectrum(path)[1] for path in source[start:start+block]],dtype=float)
+        return
+    total,npixel=spectral_shape(source)
+    # whole-file memmap from RamanCal_io: read the bytes directly, touched pages would stay resident
+    if isinstance(source,np.memmap) and isinstance(source.base,mmap.mmap) and source.flags.c_contiguous:
+        for start in range(0,total,block):
+            stop=min(start+block,total)
+            spectra=np.fromfile(source.filename,dtype=source.dtype,count=(stop-start)*npixel,
+                                offset=source.offset+start*npixel*source.dtype.itemsize)
+            yield start,spectra.reshape(-1,npixel).astype(float)
+        return
+    start=0
+    for index in _leading_slices(source.shape[:-1],block): # plain slicing works for memmap and h5py alike
+        spectra=np.asarray(source[index],dtype=float).reshape(-1,npixel)
+        yield start,spectra
+        start+=spectra.shape[0]
+
+def calibrate_blocks(source,calibration,unit='wavenumber',xdata=None,common_axis=None,block=4096,method='linear',
+                     preprocess=None):
+    '''
+    generator of (start,spectra block) on the calibrated axis
+    preprocess (RamanCal_preprocess.Pipeline) cleans every block as one stack first
+    without common_axis spectra pass through and the axis is the same for all of them,
+    with it every block is resampled by one sparse operator shared by the whole run (RamanCal_resample)
+    '''
+    total,npixel=spectral_shape(source)
+    if xdata is None:
+        xdata=np.arange(npixel)
+    if common_axis is not None:
+        import RamanCal_resample # scipy.sparse, only for --grid
+        resampler=RamanCal_resample.Resampler(calibration,xdata,common_axis,unit,method)
+    for start,spectra in iter_blocks(source,block):
+        if preprocess is not None:
+            spectra=preprocess(spectra)
+        if common_axis is None:
+            yield start,spectra
+        else:
+            yield start,resampler(spectra)
+
+def calibrate_to_npy(source,out_path,calibration,unit='wavenumber',xdata=None,common_axis=None,
+                     block=4096,dtype=np.float32,method='linear',preprocess=None):
+    '''
+    stream the calibrated spectra into out_path (.npy, one row per spectrum)
+    the axis goes to out_path[:-4]+'_axis.npy'; returns (out_path,axis path)
+    '''
+    total,npixel=spectral_shape(source)
+    if xdata is None:
+        xdata=np.arange(npixel)
+    axis=calibration.axes(xdata).axis(unit) if common_axis is None else np.asarray(common_axis,dtype=float)
+    header={'descr':np.lib.format.dtype_to_descr(np.dtype(dtype)),'fortran_order':False,'shape':(total,axis.size)}
+    with open(out_path,'wb') as f:
+        np.lib.format.write_array_header_2_0(f,header)
+        for start,spectra in calibrate_blocks(source,calibration,unit,xdata,common_axis,block,method,preprocess):
+            f.write(spectra.astype(dtype).tobytes())
+    axis_path=out_path[:-4]+'_axis.npy'
+    np.save(axis_path,axis)
+    return out_path,axis_path
+
+def make_parser():
+    parser=argparse.ArgumentParser(description="Calibrate a spectral map or time series block by block")
+    parser.add_argument('source',nargs='+',help="stack file (.npy, HDF5, ENVI, text) or spectrum files/glob")
+    parser.add_argument('--out',required=True,help="output .npy, or .npz for one container with axes and calibration")
+    parser.add_argument('--slope',type=float,default=None)
+    parser.add_argument('--intercept',type=float,default=None)
+    parser.add_argument('--lamp',default=None,help="lamp spectrum calibrated automatically against --ref")
+    parser.add_argument('--ref',default=None,help="reference wavelength/Raman shift file")
+    parser.add_argument('--section',default=None)
+    parser.add_argument('--mode',choices=['wavelength','shift'],default='wavelength')
+    parser.add_argument('--laser',type=float,default=632.82,help="Raman pump wavelength (nm)")
+    parser.add_argument('--unit',choices=['nm','wavenumber','eV'],default='wavenumber')
+    parser.add_argument('--grid',type=float,nargs=3,default=None,metavar=('START','STOP','STEP'),
+                        help="resample onto a uniform axis in --unit")
+    parser.add_argument('--method',choices=['linear','cubic','flux'],default='linear',
+                        help="resampling onto --grid: interpolation, or flux to conserve counts")
+    parser.add_argument('--preprocess',nargs='+',default=None,metavar='STEP',
+                        help="clean every block first, e.g. dark:dark=dark.npy despike baseline (RamanCal_preprocess)")
+    parser.add_argument('--block',type=int,default=4096,help="spectra per block")
+    parser.add_argument('--float64',action='store_true',help="write float64 instead of float32")
+    parser.add_argument('--compress',action='store_true',help="deflate the .npz container (lossless)")
+    return parser
+
+def main(argv=None):
+    args=make_parser().parse_args(argv)
+    if args.slope is not None and args.intercept is not None:
+        calibration=core.Calibration(args.slope,args.intercept,args.laser)
+    elif args.lamp is not None and args.ref is not None:
+        import RamanCal_match
+        import RamanCal_refs
+        ref_array=RamanCal_refs.library_values(args.ref,args.section)
+        xdata,ydata=core.load_spectrum(args.lamp)
+        calibration=RamanCal_match.auto_calibrate(xdata,ydata,ref_array,args.mode,args.laser)
+        calibration.laser_wavelength=args.laser
+    else:
+        print("Need --slope and --intercept, or --lamp and --ref")
+        return 1
+    if len(args.source)==1 and '*' not in args.source[0] and '?' not in args.source[0]:
+        if RamanCal_io.detect_format(args.source[0])=='text': # one spectrum per text file
+            source=[args.source[0]]
+        else:
+            source=RamanCal_io.load_array(args.source[0])
+    else:
+        source=sorted(path for pattern in args.source for path in glob.glob(pattern))
+    common_axis=None
+    if args.grid is not None:
+        common_axis=core.uniform_grid(*args.grid)
+    dtype=np.float64 if args.float64 else np.float32
+    preprocess=None
+    if args.preprocess:
+        import RamanCal_preprocess
+        try:
+            preprocess=RamanCal_preprocess.Pipeline.from_specs(args.preprocess)
+        except (ValueError,TypeError,IOError) as err: # unknown step or option, unreadable dark frame
+            print(err)
+            return 1
+    try:
+        if args.out.endswith('.npz'):
+            import RamanCal_container
+            total,npixel=spectral_shape(source)
+            blocks=calibrate_blocks(source,calibration,args.unit,None,common_axis,args.block,args.method,preprocess)
+            RamanCal_container.save_container(args.out,calibration,np.arange(npixel),blocks,dtype,args.compress,
+                                              metadata={'unit':args.unit,'spectra':total},
+                                              shape=(total,npixel if common_axis is None else common_axis.size),
+                                              grid=common_axis)
+            print("calibrated container:\t"+args.out)
+            return 0
+        out_path,axis_path=calibrate_to_npy(source,args.out,calibration,args.unit,None,common_axis,args.block,dtype,
+                                            args.method,preprocess)
+    finally:
+        RamanCal_io.close_array(source)
+    print("calibrated spectra:\t"+out_path)
+    print("calibrated axis:\t"+axis_path)
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main())
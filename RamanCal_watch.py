@@ -0,0 +1,308 @@
+'''
+RamanCal watch
+service mode: calibrate spectra as the spectrometer writes them
+
+Acquisition directories are watched with inotify (optional inotify_simple package) or by polling.
+A file is taken once its size and mtime have not changed for `debounce` seconds, so files still
+being written are left alone, and only if its outputs are missing or older than it.
+Without --existing, files last modified before the start are left alone too. Complete files go into a bounded asyncio queue; `workers` tasks take
+them out and run RamanCal_batch.calibrate_one in a process pool with the current calibration.
+When the queue is full the watcher waits, files stay on disk and are picked up later (backpressure).
+
+The calibration comes from --slope/--intercept, a lamp spectrum, or a CalibrationStore entry
+(--cache/--config) that is read again every `refresh` seconds, so a new lamp fit stored by
+RamanCal_batch takes over without restarting the service.
+Every file is logged with its latency; --status-port serves queue depth, counts and latency
+percentiles as JSON on http://127.0.0.1:<port>/.
+
+    python RamanCal_watch.py acquisition/ --slope 0.02 --intercept 620 --laser 632.82
+    python RamanCal_watch.py acq1/ acq2/ --cache ~/.ramancal --config 1200g633nm --workers 4 --status-port 8765
+'''
+#----------------
+import os
+import sys
+import json
+import time
+import fnmatch
+import asyncio
+import argparse
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import RamanCal_core as core
+import RamanCal_batch
+#----------------
+output_suffixes=tuple(core.cal_suffix.values())
+
+class WatchFolder():
+    def __init__(self,directories,calibration_source,units=('nm','wavenumber','eV'),pattern='*.txt',
+                 debounce=1.0,poll=0.5,workers=2,queue_size=64,existing=False,uncertainty=None,log=print,
+                 history=10000):
+        '''
+        calibration_source() returns the Calibration to apply now, it is asked once per file
+        existing=True also calibrates files present at start, otherwise only new ones
+        history bounds the failed files remembered so they are not retried until they change
+        '''
+        self.directories=[os.path.abspath(directory) for directory in directories]
+        self.calibration_source=calibration_source
+        self.units=tuple(units)
+        self.pattern=pattern
+        self.debounce=debounce
+        self.poll=poll
+        self.workers=workers
+        self.queue_size=queue_size
+        self.existing=existing
+        self.uncertainty=uncertainty
+        self.log=log
+        self.history=history
+        self.pending={} # path -> (size,mtime,time first seen with them)
+        self.done=collections.OrderedDict() # (path,mtime) queued, in progress or failed; dropped once calibrated
+        self.latency=collections.deque(maxlen=1000) # seconds from file complete to outputs written
+        self.processed=0
+        self.failed=0
+        self.started=time.time()
+
+    def wanted(self,name):
+        return fnmatch.fnmatch(name,self.pattern) and not name.endswith(output_suffixes)
+
+    def list_files(self):
+        for directory in self.directories:
+            try:
+                entries=list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_file() and self.wanted(entry.name):
+                    yield entry.path
+
+    def calibrated(self,path,mtime):
+        '''True when every output of path exists and is not older than it'''
+        for unit in self.units:
+            try:
+                if os.path.getmtime(core.cal_file_path(path,unit))<mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def check(self,path,now):
+        '''True once path has kept its size and mtime for debounce seconds and still needs calibrating'''
+        try:
+            info=os.stat(path)
+        except OSError: # moved away or deleted
+            self.pending.pop(path,None)
+            return False
+        if (path,info.st_mtime) in self.done:
+            return False
+        if (not self.existing and info.st_mtime<self.started) or self.calibrated(path,info.st_mtime):
+            self.pending.pop(path,None)
+            return False
+        previous=self.pending.get(path)
+        if previous is None or previous[:2]!=(info.st_size,info.st_mtime):
+            self.pending[path]=(info.st_size,info.st_mtime,now)
+            return False
+        return now-previous[2]>=self.debounce and info.st_size>0
+
+    async def enqueue_complete(self,queue,candidates):
+        now=time.time()
+        for path in sorted(candidates):
+            if self.check(path,now):
+                size,mtime,since=self.pending.pop(path)
+                self.done[(path,mtime)]=True
+                await queue.put((path,mtime,since+self.debounce)) # waits while the queue is full
+
+    async def watch_polling(self,queue):
+        while True:
+            await self.enqueue_complete(queue,set(self.list_files())|set(self.pending))
+            await asyncio.sleep(self.poll)
+
+    async def watch_inotify(self,queue,inotify_simple):
+        '''events only mark candidates, completeness is still judged by check()'''
+        inotify=inotify_simple.INotify()
+        mask=inotify_simple.flags.CLOSE_WRITE|inotify_simple.flags.MODIFY|inotify_simple.flags.MOVED_TO|inotify_simple.flags.CREATE
+        paths={}
+        for directory in self.directories:
+            paths[inotify.add_watch(directory,mask)]=directory
+        ready=asyncio.Event()
+        loop=asyncio.get_running_loop()
+        loop.add_reader(inotify.fileno(),ready.set)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(ready.wait(),self.poll)
+                except asyncio.TimeoutError:
+                    pass
+                ready.clear()
+                for event in inotify.read(timeout=0):
+                    if event.name and self.wanted(event.name):
+                        path=os.path.join(paths[event.wd],event.name)
+                        self.pending.setdefault(path,(-1,-1,time.time()))
+                await self.enqueue_complete(queue,set(self.pending))
+        finally:
+            loop.remove_reader(inotify.fileno())
+            inotify.close()
+
+    async def worker(self,queue,executor):
+        loop=asyncio.get_running_loop()
+        while True:
+            path,mtime,complete=await queue.get()
+            try:
+                calibration=self.calibration_source()
+                task=(path,None,None,'wavelength',calibration.laser_wavelength,10,self.units,calibration,None,
+                      self.uncertainty)
+                path,cal,written=await loop.run_in_executor(executor,RamanCal_batch.calibrate_one,task)
+                latency=time.time()-complete
+                if cal is None:
+                    self.failed+=1
+                    self.log("failed: {0}\t{1}".format(path,written))
+                    self.forget_failures()
+                else:
+                    self.done.pop((path,mtime),None) # outputs exist now, check() skips the file
+                    self.processed+=1
+                    self.latency.append(latency)
+                    self.log("calibrated: {0}\t{1}\t{2:.3f} s\tqueue {3}".format(path," ".join(written),latency,queue.qsize()))
+            except Exception as err: # the service keeps running
+                self.failed+=1
+                self.log("failed: {0}\t{1}".format(path,err))
+                self.forget_failures()
+            finally:
+                queue.task_done()
+
+    def forget_failures(self):
+        '''failed files stay in done so they are not retried until modified, the oldest beyond history are dropped'''
+        while len(self.done)>self.history:
+            self.done.popitem(last=False)
+
+    def status(self,queue):
+        latency=np.array(self.latency)
+        result={'queue_depth':queue.qsize(),'queue_size':self.queue_size,'pending':len(self.pending),
+                'processed':self.processed,'failed':self.failed,'uptime_s':time.time()-self.started,
+                'directories':self.directories}
+        if latency.size:
+            result.update({'latency_p50_s':float(np.percentile(latency,50)),'latency_p95_s':float(np.percentile(latency,95)),
+                           'latency_max_s':float(latency.max())})
+        return result
+
+    async def serve_status(self,queue,port):
+        '''minimal HTTP: any request gets the status JSON'''
+        async def handle(reader,writer):
+            try:
+                await reader.readline()
+                body=json.dumps(self.status(queue)).encode()
+                writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+                             +str(len(body)).encode()+b"\r\n\r\n"+body)
+                await writer.drain()
+            finally:
+                writer.close()
+        server=await asyncio.start_server(handle,'127.0.0.1',port)
+        async with server:
+            await server.serve_forever()
+
+    async def run(self,status_port=None,use_inotify=True):
+        queue=asyncio.Queue(maxsize=self.queue_size)
+        inotify_simple=None
+        if use_inotify:
+            try:
+                import inotify_simple
+            except ImportError:
+                pass
+        self.log("watching {0} ({1}), {2} workers".format(", ".join(self.directories),
+                 'inotify' if inotify_simple is not None else 'polling',self.workers))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            tasks=[asyncio.ensure_future(self.worker(queue,executor)) for i in range(self.workers)]
+            if inotify_simple is not None:
+                tasks.append(asyncio.ensure_future(self.watch_inotify(queue,inotify_simple)))
+            else:
+                tasks.append(asyncio.ensure_future(self.watch_polling(queue)))
+            if status_port is not None:
+                tasks.append(asyncio.ensure_future(self.serve_status(queue,status_port)))
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+def cached_source(store,key,refresh=10.0):
+    '''calibration_source reading a CalibrationStore entry, re-read every refresh seconds'''
+    state={'time':-np.inf,'calibration':None}
+    def source():
+        if time.time()-state['time']>=refresh or state['calibration'] is None:
+            calibration=store.get(key)
+            if calibration is None and state['calibration'] is None:
+                raise ValueError("No calibration cached under "+key)
+            if calibration is not None:
+                state['calibration']=calibration
+            state['time']=time.time()
+        return state['calibration']
+    return source
+
+def make_parser():
+    parser=argparse.ArgumentParser(description="Watch acquisition directories and calibrate new spectra")
+    parser.add_argument('directories',nargs='+')
+    parser.add_argument('--slope',type=float,default=None)
+    parser.add_argument('--intercept',type=float,default=None)
+    parser.add_argument('--lamp',default=None,help="lamp spectrum calibrated automatically against --ref at start")
+    parser.add_argument('--ref',default=None,help="reference wavelength/Raman shift file for --lamp")
+    parser.add_argument('--section',default=None)
+    parser.add_argument('--mode',choices=['wavelength','shift'],default='wavelength')
+    parser.add_argument('--cache',default=None,help="calibration store directory, read again every --refresh seconds")
+    parser.add_argument('--config',default=None,help="instrument configuration key, e.g. 1200g633nm")
+    parser.add_argument('--refresh',type=float,default=10.0)
+    parser.add_argument('--laser',type=float,default=632.82,help="Raman pump wavelength (nm)")
+    RamanCal_batch.add_model_arguments(parser) # model of the --lamp fit, part of the --cache key
+    parser.add_argument('--units',nargs='+',choices=sorted(core.cal_suffix.keys()-{'fit'}),default=['nm','wavenumber','eV'])
+    parser.add_argument('--uncertainty',choices=['linear','montecarlo'],default=None)
+    parser.add_argument('--pattern',default='*.txt')
+    parser.add_argument('--debounce',type=float,default=1.0,help="seconds a file must stay unchanged")
+    parser.add_argument('--poll',type=float,default=0.5,help="seconds between directory scans")
+    parser.add_argument('--workers',type=int,default=2)
+    parser.add_argument('--queue',type=int,default=64,help="files waiting at most, the watcher pauses beyond")
+    parser.add_argument('--existing',action='store_true',help="also calibrate files present at start")
+    parser.add_argument('--status-port',type=int,default=None,help="serve status JSON on 127.0.0.1:PORT")
+    parser.add_argument('--no-inotify',action='store_true',help="poll even when inotify_simple is installed")
+    return parser
+
+def main(argv=None):
+    args=make_parser().parse_args(argv)
+    try:
+        model_options=RamanCal_batch.model_options_from(args)
+    except ValueError as err:
+        print(err)
+        return 1
+    if args.cache is not None and args.config is not None:
+        import RamanCal_cache
+        try:
+            key=RamanCal_cache.calibration_key(args.config,args.laser,model_options)
+        except ValueError as err:
+            print(err)
+            return 1
+        source=cached_source(RamanCal_cache.CalibrationStore(args.cache),key,args.refresh)
+        try:
+            source() # fail now rather than on the first file
+        except ValueError as err:
+            print(err)
+            return 1
+    else:
+        if args.slope is not None and args.intercept is not None:
+            calibration=core.Calibration(args.slope,args.intercept,args.laser)
+        elif args.lamp is not None and args.ref is not None:
+            import RamanCal_match
+            import RamanCal_refs
+            xdata,ydata=core.load_spectrum(args.lamp)
+            calibration=RamanCal_match.auto_calibrate(xdata,ydata,RamanCal_refs.library_values(args.ref,args.section),
+                                                     args.mode,args.laser,model_options)
+            calibration.laser_wavelength=args.laser
+        else:
+            print("Need --slope and --intercept, --lamp and --ref, or --cache and --config")
+            return 1
+        source=lambda:calibration
+    service=WatchFolder(args.directories,source,args.units,args.pattern,args.debounce,args.poll,args.workers,
+                        args.queue,args.existing,args.uncertainty)
+    try:
+        asyncio.run(service.run(args.status_port,not args.no_inotify))
+    except KeyboardInterrupt:
+        print(json.dumps(service.status(asyncio.Queue())))
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main())
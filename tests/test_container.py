@@ -0,0 +1,30 @@
+'''
+RamanCal container: streamed spectra
+'''
+#----------------
+import os
+import numpy as np
+import pytest
+import RamanCal_core as core
+import RamanCal_container as container
+#----------------
+calibration=core.Calibration(0.02,620.0,632.82)
+spectra=np.arange(6*8,dtype=float).reshape(6,8)
+
+def blocks(stop):
+    for start in range(0,stop,4):
+        yield start,spectra[start:min(start+4,stop)]
+
+def test_blocks_round_trip(tmp_path):
+    path=str(tmp_path/'run_cal.npz')
+    container.save_container(path,calibration,np.arange(8),blocks(6),np.float32,shape=(6,8))
+    run=container.load_container(path)
+    assert np.array_equal(run['spectra'],spectra)
+    assert run['axes'].dtype==np.float64
+
+@pytest.mark.parametrize('shape',[(7,8),(5,8),(6,9)])
+def test_blocks_must_fill_shape(tmp_path,shape):
+    path=str(tmp_path/'run_cal.npz')
+    with pytest.raises(ValueError):
+        container.save_container(path,calibration,np.arange(8),blocks(6),shape=shape)
+    assert not os.path.exists(path)
@@ -0,0 +1,39 @@
+'''
+RamanCal core: robust calibration
+'''
+#----------------
+import numpy as np
+import RamanCal_core as core
+#----------------
+pixels=np.concatenate([np.linspace(350,650,16),[20,80,940,1000]]) # lines crowded in the middle, few at the edges
+
+def test_robust_polynomial_keeps_curved_lines():
+    nm=620+0.02*pixels-3e-5*(pixels-500)**2
+    calibration=core.calibrate_robust(pixels,nm,model='polynomial',order=2)
+    assert not calibration.rejected.any()
+    assert np.allclose(calibration.nanometer(pixels),nm,atol=1e-6)
+
+def test_robust_grating_keeps_curved_lines():
+    nm=core.calibrate_grating(pixels,620+0.02*pixels-3e-5*(pixels-500)**2,1200).nanometer(pixels)
+    calibration=core.calibrate_robust(pixels,nm,model='grating',groove_density=1200)
+    assert not calibration.rejected.any()
+
+def test_robust_polynomial_rejects_outlier():
+    nm=620+0.02*pixels-3e-5*(pixels-500)**2
+    nm[5]+=0.5
+    calibration=core.calibrate_robust(pixels,nm,model='polynomial',order=2)
+    assert np.flatnonzero(calibration.rejected).tolist()==[5]
+
+def test_load_spectrum_one_column(tmp_path):
+    intensity=np.random.default_rng(0).random(512)
+    path=str(tmp_path/'spectrum.txt')
+    np.savetxt(path,intensity)
+    xdata,ydata=core.load_spectrum(path)
+    assert np.array_equal(xdata,np.arange(512))
+    assert np.allclose(ydata,intensity)
+
+def test_load_spectrum_two_columns(tmp_path):
+    path=str(tmp_path/'spectrum.txt')
+    np.savetxt(path,np.column_stack([np.arange(10)+0.5,np.arange(10)*2.0]))
+    xdata,ydata=core.load_spectrum(path)
+    assert np.allclose(xdata,np.arange(10)+0.5) and np.allclose(ydata,np.arange(10)*2.0)
@@ -0,0 +1,16 @@
+'''
+RamanCal resample: merging frames onto a common grid
+'''
+#----------------
+import numpy as np
+import RamanCal_core as core
+import RamanCal_resample as resample
+#----------------
+def test_merge_same_calibration_different_xdata():
+    calibration=core.Calibration(0.02,620.0,632.82)
+    grid=np.linspace(623,629,50) # covered by both frames
+    first=np.arange(100,500,dtype=float)
+    second=first+10 # same length, other pixels
+    spectrum=lambda xdata:calibration.nanometer(xdata) # intensity equal to the wavelength
+    merged=resample.merge([(calibration,first,spectrum(first)),(calibration,second,spectrum(second))],grid,'nm')
+    assert np.allclose(merged,grid)
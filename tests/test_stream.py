@@ -0,0 +1,37 @@
+'''
+RamanCal stream: block reading of stacks
+'''
+#----------------
+import numpy as np
+import RamanCal_stream as stream
+#----------------
+class SlicedDataset():
+    '''array-like taking integers and slices only, like an h5py dataset'''
+    def __init__(self,data):
+        self.data=data
+        self.shape=data.shape
+        self.ndim=data.ndim
+        self.dtype=data.dtype
+
+    def __getitem__(self,index):
+        index=index if isinstance(index,tuple) else (index,)
+        if not all(isinstance(item,(int,slice)) for item in index):
+            raise TypeError("Only integers and slices are supported")
+        return np.array(self.data[index])
+
+def read_all(source,block):
+    blocks=list(stream.iter_blocks(source,block))
+    assert all(spectra.shape[0]<=block for start,spectra in blocks)
+    assert [start for start,spectra in blocks]==list(np.cumsum([0]+[spectra.shape[0] for start,spectra in blocks[:-1]]))
+    return np.concatenate([spectra for start,spectra in blocks])
+
+def test_iter_blocks_3d_stack():
+    data=np.random.default_rng(0).random((5,7,16)).astype(np.float32)
+    for block in [1,3,7,10,35,100]:
+        assert np.array_equal(read_all(data,block),data.reshape(-1,16))
+        assert np.array_equal(read_all(SlicedDataset(data),block),data.reshape(-1,16))
+
+def test_iter_blocks_4d_stack():
+    data=np.arange(2*3*4*5,dtype=float).reshape(2,3,4,5)
+    for block in [1,5,12,13]:
+        assert np.array_equal(read_all(SlicedDataset(data),block),data.reshape(-1,5))